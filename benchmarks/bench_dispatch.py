@@ -0,0 +1,418 @@
+"""
+Dispatch latency benchmark: time spent in logan's own code per command
+
+Every stage of 'Agent.process' is timed on its own, plus the startup of
+a whole logan process, against a generated logan root directory:
+
+    syntax              Agent.check_action_command_syntax
+    inputs              Agent.get_actions_inputs_from_command
+    load_config cold    Agent.load_config, no config cache on disk
+    load_config cached  Agent.load_config by a new agent, config cache on disk
+    load_config warm    Agent.load_config, config already loaded by the agent
+    find_action         Agent.find_action (config)
+    find_action index   Agent.find_action (compiled action index, already mapped)
+    dispatch            Agent.dispatch_command by a warm agent (config)
+    dispatch index      Agent.dispatch_command by a warm agent (compiled action index)
+    build_command       Agent.build_command_from_action
+    performs            Agent.performs
+    show_output         Agent.show_output
+    process             Agent.process, end to end
+    startup             new python process running Agent.process
+    startup cli         new python process running 'bin/logan --version'
+    cli                 'bin/logan <action> <params>', processed in-process
+    cli subprocess      'bin/logan --subprocess <action> <params>', processed by
+                        a second logan process
+    daemon              one request to a running 'bin/logand' (warm dispatch:
+                        fork, CLI parsing and action), sent by this process
+    cli daemon          'bin/logan <action> <params>' forwarded to a running
+                        'bin/logand', client startup included
+
+    Usage:
+        bench_dispatch.py [--actions=<n>] [--repeat=<n>] [--startup-repeat=<n>]
+                          [--save=<file>] [--compare=<file>] [--threshold=<pct>]
+                          [--min-delta=<ms>]
+
+    Options:
+        --actions=<n>           Number of actions in the generated config [default: 200]
+        --repeat=<n>            Number of runs of each in-process stage [default: 200]
+        --startup-repeat=<n>    Number of runs of each startup case [default: 20]
+        --save=<file>           Saves the results as a JSON baseline
+        --compare=<file>        Compares the results with a JSON baseline, exits
+                                with 1 if a stage p50 regressed
+        --threshold=<pct>       Allowed p50 slowdown before a regression [default: 20]
+        --min-delta=<ms>        Smallest p50 slowdown seen as a regression, ignores
+                                the noise of sub-microsecond stages [default: 0.05]
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from os import path
+from StringIO import StringIO
+import subprocess
+import platform
+import tempfile
+import shutil
+import json
+import glob
+import time
+import sys
+import os
+
+LOGAN_PACKAGE_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+sys.path.insert(0, LOGAN_PACKAGE_ROOT)
+
+from lib.docopt import docopt
+from logan import Agent
+from logan.daemon import send_message, recv_message
+import socket
+import yaml
+
+
+# Command dispatched by every case
+BENCH_COMMAND = "run:action0:usr -x"
+
+# Script run in a new process by the 'startup' case
+BENCH_STARTUP_SCRIPT = """
+import sys
+sys.path.insert(0, {package_root!r})
+from logan import Agent
+sys.exit(Agent({root_dir!r}).process({command!r}))
+"""
+
+
+# ================
+# HELPERS
+# ================
+
+def build_logan_root(actions_count):
+    """ Creates a temporary logan root directory with 'actions_count' actions
+        sharing a single no-op script
+
+        Returns:
+            The path of the logan root directory
+    """
+
+    root_dir   = tempfile.mkdtemp()
+    action_dir = path.join(root_dir, "actions", "usr")
+
+    os.makedirs(action_dir)
+
+    with open(path.join(action_dir, "noop"), "w") as action_file:
+        action_file.write("#!/bin/sh\ntrue\n")
+
+    os.chmod(path.join(action_dir, "noop"), 0755)
+
+    config = {
+        "logan"  : {"options": None},
+        "actions": dict(
+            ("run:action{}".format(i), {
+                "scope"  : "run",
+                "context": "usr",
+                "path"   : "noop",
+                "help"   : "NAME\n    action{} - does nothing\n".format(i)
+            })
+            for i in xrange(actions_count)
+        )
+    }
+
+    with open(path.join(root_dir, "loganrc.default"), "w") as default_config:
+        yaml.safe_dump(config, default_config, default_flow_style=False)
+
+    with open(path.join(root_dir, "loganrc"), "w") as user_config:
+        yaml.safe_dump({"logan": {"options": None}}, user_config, default_flow_style=False)
+
+    return root_dir
+
+# ------------------------------------------------------------------------------
+
+def clear_caches(root_dir):
+    """ Removes the config cache and the action index of a logan root
+    """
+
+    for file_path in glob.glob(path.join(root_dir, Agent.LOGAN_CACHE_KEY + "*")) + \
+                     glob.glob(path.join(root_dir, Agent.LOGAN_INDEX_FILENAME + "*")):
+        os.remove(file_path)
+
+# ------------------------------------------------------------------------------
+
+def percentile(durations, rank):
+    """ Nearest-rank percentile of sorted durations
+    """
+
+    index = int(round(rank / 100.0 * len(durations) + 0.5)) - 1
+
+    return durations[max(0, min(index, len(durations) - 1))]
+
+# ------------------------------------------------------------------------------
+
+def measure(function, repeat, setup=None):
+    """ Runs 'function' 'repeat' times, 'setup' (untimed) before each run
+
+        Returns:
+            Dict of durations in milliseconds as
+            {"runs": 200, "p50": 0.1, "p95": 0.2, "p99": 0.3, "max": 0.4}
+    """
+
+    durations = []
+
+    for i in xrange(repeat):
+
+        argument = setup() if setup else None
+
+        start = time.time()
+        function(argument)
+        durations.append((time.time() - start) * 1000)
+
+    durations.sort()
+
+    return {
+        "runs": repeat,
+        "p50" : percentile(durations, 50),
+        "p95" : percentile(durations, 95),
+        "p99" : percentile(durations, 99),
+        "max" : durations[-1]
+    }
+
+# ------------------------------------------------------------------------------
+
+def start_daemon(root_dir, socket_path, timeout=10):
+    """ Starts 'bin/logand' for the logan root, once its socket is listening
+
+        Returns:
+            The daemon process
+    """
+
+    process  = subprocess.Popen([sys.executable, path.join(LOGAN_PACKAGE_ROOT, "bin", "logand"),
+                                 root_dir, socket_path])
+    deadline = time.time() + timeout
+
+    while not path.exists(socket_path):
+        if time.time() >= deadline or process.poll() is not None:
+            process.kill()
+            raise RuntimeError("bin/logand did not start")
+        time.sleep(0.05)
+
+    return process
+
+# ------------------------------------------------------------------------------
+
+def quiet(function):
+    """ Runs 'function' with the standard output discarded
+    """
+
+    stdout, sys.stdout = sys.stdout, StringIO()
+
+    try:
+        return function()
+    finally:
+        sys.stdout = stdout
+
+
+# ================
+# CASES
+# ================
+
+def run_cases(root_dir, repeat, startup_repeat):
+    """ Measures every case
+
+        Returns:
+            List of (name, measure) tuples. @see measure
+    """
+
+    def prepared_agent(resolved=False):
+        """ Agent with a warm config, ready for the stage under test
+        """
+
+        agent = Agent(root_dir)
+        agent.load_config()
+        agent.get_actions_inputs_from_command(BENCH_COMMAND)
+
+        if resolved:
+            agent.output = agent.performs(agent.find_action())
+
+        return agent
+
+    def cold_agent():
+        clear_caches(root_dir)
+        return Agent(root_dir)
+
+    def cached_agent():
+        Agent(root_dir).load_config()
+        return Agent(root_dir)
+
+    def indexed_agent():
+        agent = prepared_agent()
+        agent.compile_index()
+        # Mapped like the config of 'find_action' is loaded
+        agent.get_action_index()
+        return agent
+
+    agent  = prepared_agent()
+    action = agent.find_action()
+
+    # Warm agents dispatching many commands, like the daemon's
+    config_agent = prepared_agent()
+    indexed      = []
+
+    def dispatch_index(a):
+        # Compiled by the first run: the caches are cleared before every case
+        if not indexed:
+            indexed.append(indexed_agent())
+        indexed[0].dispatch_command(BENCH_COMMAND)
+
+    startup = [sys.executable, "-c", BENCH_STARTUP_SCRIPT.format(package_root = LOGAN_PACKAGE_ROOT,
+                                                                 root_dir     = root_dir,
+                                                                 command      = BENCH_COMMAND)]
+    logan_bin   = [sys.executable, path.join(LOGAN_PACKAGE_ROOT, "bin", "logan")]
+    startup_cli = logan_bin + ["--version"]
+    cli_args    = BENCH_COMMAND.replace("-", "").split(" ", 1)
+
+    # No daemon must answer the 'cli' cases
+    environment = dict(os.environ, LOGAN_SOCKET=path.join(root_dir, "no-daemon.sock"), LOGAN_ROOT=root_dir)
+
+    def spawn(command):
+        with open(os.devnull, "w") as devnull:
+            subprocess.call(command, stdout=devnull, stderr=devnull, env=environment)
+
+    daemon_socket      = path.join(root_dir, "logand.sock")
+    daemon_environment = dict(environment, LOGAN_SOCKET=daemon_socket)
+
+    def request_daemon(a):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(daemon_socket)
+        send_message(sock, {"argv": cli_args, "env": daemon_environment, "cwd": root_dir})
+        recv_message(sock)
+        sock.close()
+
+    def spawn_client(a):
+        with open(os.devnull, "w") as devnull:
+            subprocess.call(logan_bin + cli_args, stdout=devnull, stderr=devnull, env=daemon_environment)
+
+    cases = [
+        ("syntax",             lambda a: agent.check_action_command_syntax(BENCH_COMMAND),   None,          repeat),
+        ("inputs",             lambda a: agent.get_actions_inputs_from_command(BENCH_COMMAND), None,        repeat),
+        ("load_config cold",   lambda a: a.load_config(),                                     cold_agent,    repeat),
+        ("load_config cached", lambda a: a.load_config(),                                     cached_agent,  repeat),
+        ("load_config warm",   lambda a: agent.load_config(),                                 None,          repeat),
+        ("find_action",        lambda a: a.find_action(),                                     prepared_agent, repeat),
+        ("find_action index",  lambda a: a.find_action(),                                     indexed_agent, repeat),
+        ("dispatch",           lambda a: config_agent.dispatch_command(BENCH_COMMAND),        None,          repeat),
+        ("dispatch index",     dispatch_index,                                                None,          repeat),
+        ("build_command",      lambda a: agent.build_command_from_action(action),             None,          repeat),
+        ("performs",           lambda a: agent.performs(action),                              None,          repeat),
+        ("show_output",        lambda a: quiet(a.show_output),                                lambda: prepared_agent(True), repeat),
+        ("process",            lambda a: quiet(lambda: a.process(BENCH_COMMAND)),             cached_agent,  repeat),
+        ("startup",            lambda a: spawn(startup),                                      None,          startup_repeat),
+        ("startup cli",        lambda a: spawn(startup_cli),                                  None,          startup_repeat),
+        ("cli",                lambda a: spawn(logan_bin + cli_args),                         None,          startup_repeat),
+        ("cli subprocess",     lambda a: spawn(logan_bin + ["--subprocess"] + cli_args),      None,          startup_repeat),
+        ("daemon",             request_daemon,                                                None,          repeat),
+        ("cli daemon",         spawn_client,                                                  None,          startup_repeat),
+    ]
+
+    results = []
+    daemon  = None
+
+    try:
+        for name, function, setup, runs in cases:
+            clear_caches(root_dir)
+
+            # Started once the caches are cleared, its config stays warm
+            if function in (request_daemon, spawn_client) and daemon is None:
+                daemon = start_daemon(root_dir, daemon_socket)
+
+            results.append((name, measure(function, runs, setup)))
+
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+
+    return results
+
+# ------------------------------------------------------------------------------
+
+def compare(results, baseline, threshold, min_delta):
+    """ Compares the p50 of every case with the baseline one
+
+        Returns:
+            List of the names of the cases slower than the baseline
+            by more than 'threshold' percents and 'min_delta' milliseconds
+    """
+
+    regressions = []
+
+    print
+    print "{:<20} {:>12} {:>12} {:>9}".format("case", "base p50", "p50", "change")
+
+    for name, result in results:
+
+        base = baseline.get("cases", {}).get(name)
+
+        if not base:
+            continue
+
+        change = (result["p50"] - base["p50"]) / base["p50"] * 100 if base["p50"] else 0.0
+        flag   = ""
+
+        if change > threshold and result["p50"] - base["p50"] > min_delta:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        print "{:<20} {:>12.3f} {:>12.3f} {:>8.1f}%{}".format(name, base["p50"], result["p50"], change, flag)
+
+    return regressions
+
+# ------------------------------------------------------------------------------
+
+def main():
+
+    arguments = docopt(__doc__)
+
+    actions_count  = int(arguments["--actions"])
+    repeat         = int(arguments["--repeat"])
+    startup_repeat = int(arguments["--startup-repeat"])
+    threshold      = float(arguments["--threshold"])
+    min_delta      = float(arguments["--min-delta"])
+
+    root_dir = build_logan_root(actions_count)
+
+    try:
+        results = run_cases(root_dir, repeat, startup_repeat)
+    finally:
+        shutil.rmtree(root_dir)
+
+    print "{} actions, {} runs ({} for startup cases), durations in ms".format(actions_count, repeat, startup_repeat)
+    print "{:<20} {:>10} {:>10} {:>10} {:>10}".format("case", "p50", "p95", "p99", "max")
+
+    for name, result in results:
+        print "{:<20} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(name, result["p50"], result["p95"],
+                                                                     result["p99"], result["max"])
+
+    if arguments["--save"]:
+        with open(arguments["--save"], "w") as baseline_file:
+            json.dump({
+                "created" : time.time(),
+                "python"  : platform.python_version(),
+                "platform": platform.platform(),
+                "actions" : actions_count,
+                "cases"   : dict(results)
+            }, baseline_file, indent=2, sort_keys=True)
+
+    if arguments["--compare"]:
+        with open(arguments["--compare"]) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, threshold, min_delta)
+
+        if regressions:
+            print "\n{} regression(s): {}".format(len(regressions), ", ".join(regressions))
+            sys.exit(1)
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Config merge benchmark: 'utils.dict_merge' vs 'layers.LayeredConfig'
+
+    Usage:
+        bench_merge.py [--actions=<n>] [--overrides=<n>] [--repeat=<n>]
+
+    Options:
+        --actions=<n>       Number of actions in the default config [default: 10000]
+        --overrides=<n>     Number of actions overridden by the user config [default: 2]
+        --repeat=<n>        Number of runs of each case [default: 20]
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from os import path
+import time
+import sys
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from lib.docopt import docopt
+from logan.layers import LayeredConfig
+from logan.utils import dict_merge
+
+
+def build_configs(actions_count, overrides_count):
+    """ Builds a default config of 'actions_count' actions and a user
+        config overriding the path of 'overrides_count' of them
+    """
+
+    default_config = {
+        "logan"  : {"options": None},
+        "actions": dict(
+            ("verb{}:object{}".format(i, i), {
+                "scope"  : "verb{}".format(i),
+                "context": "context{}".format(i % 10),
+                "path"   : "action{}".format(i),
+                "help"   : "NAME\n    action{} - does something\n".format(i)
+            })
+            for i in xrange(actions_count)
+        )
+    }
+
+    user_config = {
+        "actions": dict(
+            ("verb{}:object{}".format(i, i), {"path": "user_action{}".format(i)})
+            for i in xrange(overrides_count)
+        )
+    }
+
+    return default_config, user_config
+
+# ------------------------------------------------------------------------------
+
+def measure(function, repeat):
+    """ Runs 'function' 'repeat' times
+
+        Returns:
+            Tuple as (best, median) durations in milliseconds
+    """
+
+    durations = []
+
+    for i in xrange(repeat):
+        start = time.time()
+        function()
+        durations.append((time.time() - start) * 1000)
+
+    durations.sort()
+
+    return durations[0], durations[len(durations) // 2]
+
+# ------------------------------------------------------------------------------
+
+def main():
+
+    arguments = docopt(__doc__)
+
+    actions_count   = int(arguments["--actions"])
+    overrides_count = int(arguments["--overrides"])
+    repeat          = int(arguments["--repeat"])
+
+    default_config, user_config = build_configs(actions_count, overrides_count)
+
+    key = "verb0:object0"
+
+    cases = [
+        ("dict_merge",                  lambda: dict_merge(default_config, user_config)),
+        ("dict_merge + lookup",         lambda: dict_merge(default_config, user_config)["actions"][key]["path"]),
+        ("LayeredConfig",               lambda: LayeredConfig([default_config, user_config])),
+        ("LayeredConfig + lookup",      lambda: LayeredConfig([default_config, user_config])["actions"][key]["path"]),
+        ("LayeredConfig + to_dict",     lambda: LayeredConfig([default_config, user_config]).to_dict()),
+    ]
+
+    print "{} actions, {} overridden, {} runs".format(actions_count, overrides_count, repeat)
+    print "{:<28} {:>12} {:>12}".format("case", "best (ms)", "median (ms)")
+
+    for name, function in cases:
+        best, median = measure(function, repeat)
+        print "{:<28} {:>12.3f} {:>12.3f}".format(name, best, median)
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
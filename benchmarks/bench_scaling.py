@@ -0,0 +1,279 @@
+"""
+Scaling benchmark: logan against catalogs from 10 to 100k actions
+
+For every catalog size, a synthetic logan root is generated (see
+'synthetic.py') and measured in a forked process, so that memory numbers
+are not polluted by the previous sizes:
+
+    load cold       Agent.load_config with no config cache (YAML parsing)
+    load cached     Agent.load_config by a new agent (cache unpickling)
+    cache size      Size of the config cache files
+    rss             Resident memory once the config is loaded
+    lookup          Agent.find_action_by_key on the loaded config
+    dict_merge      utils.dict_merge of the default and user configs
+    deepcopy        copy.deepcopy of the default config
+
+A second table measures dict_merge and the LayeredConfig lookup as the
+override depth grows, for a fixed catalog size. Each metric is plotted
+against the catalog size with a log-scale bar chart.
+
+    Usage:
+        bench_scaling.py [--sizes=<list>] [--depths=<list>] [--depth-size=<n>]
+                         [--overrides=<n>] [--lookups=<n>] [--csv=<file>]
+
+    Options:
+        --sizes=<list>      Catalog sizes [default: 10,100,1000,10000,100000]
+        --depths=<list>     Override depths [default: 1,2,4,8,16]
+        --depth-size=<n>    Catalog size of the depth table [default: 1000]
+        --overrides=<n>     Number of actions overridden by the user config [default: 10]
+        --lookups=<n>       Number of lookups averaged [default: 1000]
+        --csv=<file>        Also writes the size table as CSV
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from os import path
+from copy import deepcopy
+import resource
+import tempfile
+import shutil
+import math
+import json
+import glob
+import time
+import sys
+import os
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from lib.docopt import docopt
+from logan import Agent
+from logan.layers import LayeredConfig
+from logan.utils import dict_merge
+import synthetic
+
+
+# Metrics of the size table: (key, title, unit)
+SCALING_METRICS = [
+    ("load_cold",   "load cold",   "ms"),
+    ("load_cached", "load cached", "ms"),
+    ("cache_size",  "cache size",  "KB"),
+    ("rss",         "rss",         "MB"),
+    ("lookup",      "lookup",      "us"),
+    ("dict_merge",  "dict_merge",  "ms"),
+    ("deepcopy",    "deepcopy",    "ms"),
+]
+
+# Width of the bars of the plots
+SCALING_PLOT_WIDTH = 40
+
+
+# ================
+# HELPERS
+# ================
+
+def timed(function):
+    """ Runs 'function' once
+
+        Returns:
+            Tuple as (result, duration in milliseconds)
+    """
+
+    start  = time.time()
+    result = function()
+
+    return result, (time.time() - start) * 1000
+
+# ------------------------------------------------------------------------------
+
+def resident_memory():
+    """ Current resident memory of the process in MB (peak one when
+        '/proc' is not available)
+    """
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+# ------------------------------------------------------------------------------
+
+def in_child(function, *args):
+    """ Runs 'function(*args)' in a forked process
+
+        Returns:
+            The JSON serializable result of 'function'
+    """
+
+    read_end, write_end = os.pipe()
+
+    pid = os.fork()
+
+    if pid == 0:
+        os.close(read_end)
+        try:
+            data = json.dumps(function(*args))
+        except Exception as e:
+            data = json.dumps({"error": repr(e)})
+        with os.fdopen(write_end, "w") as pipe:
+            pipe.write(data)
+        os._exit(0)
+
+    os.close(write_end)
+
+    with os.fdopen(read_end) as pipe:
+        data = pipe.read()
+
+    os.waitpid(pid, 0)
+
+    result = json.loads(data)
+
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+    return result
+
+
+# ================
+# CASES
+# ================
+
+def measure_size(actions_count, overrides_count, lookups_count):
+    """ Measures every metric of the size table for one catalog size
+    """
+
+    root_dir = synthetic.generate(tempfile.mkdtemp(), actions_count, overrides_count=overrides_count)
+
+    try:
+        config, load_cold = timed(Agent(root_dir).load_config)
+
+        cache_size = sum(path.getsize(file_path)
+                         for file_path in glob.glob(path.join(root_dir, Agent.LOGAN_CACHE_KEY + "*")))
+
+        agent = Agent(root_dir)
+        config, load_cached = timed(agent.load_config)
+
+        rss = resident_memory()
+
+        keys  = [(synthetic.action_key(i % actions_count), synthetic.action_context(i % actions_count, 10))
+                 for i in xrange(0, lookups_count * 7919, 7919)]
+        start = time.time()
+
+        for key, context in keys:
+            agent.action_context = context
+            agent.find_action_by_key(key)
+
+        lookup = (time.time() - start) * 1000000 / len(keys)
+
+        default_config = agent.get_config_from_filepath(agent.default_config_file_path)
+        user_config    = agent.get_config_from_filepath(agent.user_config_file_path)
+
+        merged, merge_duration = timed(lambda: dict_merge(default_config, user_config))
+        copied, copy_duration  = timed(lambda: deepcopy(default_config))
+
+        return {
+            "actions"    : actions_count,
+            "load_cold"  : load_cold,
+            "load_cached": load_cached,
+            "cache_size" : cache_size / 1024.0,
+            "rss"        : rss,
+            "lookup"     : lookup,
+            "dict_merge" : merge_duration,
+            "deepcopy"   : copy_duration
+        }
+    finally:
+        shutil.rmtree(root_dir)
+
+# ------------------------------------------------------------------------------
+
+def measure_depth(actions_count, depth, overrides_count, lookups_count):
+    """ Measures dict_merge and the LayeredConfig lookup for one override depth
+    """
+
+    default_config, user_config = synthetic.build_configs(actions_count, overrides_count=overrides_count, depth=depth)
+
+    merged, merge_duration = timed(lambda: dict_merge(default_config, user_config))
+
+    config = LayeredConfig([default_config, user_config])
+    key    = synthetic.action_key(0)
+    start  = time.time()
+
+    for i in xrange(lookups_count):
+        options = config["actions"][key]["options"]
+        for level in xrange(depth):
+            options = options["level{}".format(level)]
+
+    lookup = (time.time() - start) * 1000000 / lookups_count
+
+    return {"depth": depth, "dict_merge": merge_duration, "lookup": lookup}
+
+# ------------------------------------------------------------------------------
+
+def plot(results, key, title, unit):
+    """ Prints a log-scale bar chart of one metric against the catalog size
+    """
+
+    values = [max(result[key], 1e-9) for result in results]
+    lowest = math.log10(min(values))
+    span   = math.log10(max(values)) - lowest or 1
+
+    print
+    print "{} ({}, log scale)".format(title, unit)
+
+    for result, value in zip(results, values):
+        width = 1 + int((SCALING_PLOT_WIDTH - 1) * (math.log10(value) - lowest) / span)
+        print "{:>8} | {:<{width}} {:.3f}".format(result["actions"], "#" * max(width, 1), value,
+                                                  width=SCALING_PLOT_WIDTH)
+
+# ------------------------------------------------------------------------------
+
+def main():
+
+    arguments = docopt(__doc__)
+
+    sizes           = [int(size) for size in arguments["--sizes"].split(",")]
+    depths          = [int(depth) for depth in arguments["--depths"].split(",")]
+    depth_size      = int(arguments["--depth-size"])
+    overrides_count = int(arguments["--overrides"])
+    lookups_count   = int(arguments["--lookups"])
+
+    results = []
+
+    for size in sizes:
+        results.append(in_child(measure_size, size, overrides_count, lookups_count))
+
+    print "{} overridden actions, durations in ms, lookups in us".format(overrides_count)
+    print "{:>8} ".format("actions") + " ".join("{:>12}".format(title) for key, title, unit in SCALING_METRICS)
+
+    for result in results:
+        print "{:>8} ".format(result["actions"]) + \
+              " ".join("{:>12.3f}".format(result[key]) for key, title, unit in SCALING_METRICS)
+
+    for key, title, unit in SCALING_METRICS:
+        plot(results, key, title, unit)
+
+    print
+    print "{} actions, {} overridden".format(depth_size, overrides_count)
+    print "{:>8} {:>16} {:>16}".format("depth", "dict_merge (ms)", "lookup (us)")
+
+    for depth in depths:
+        result = in_child(measure_depth, depth_size, depth, overrides_count, lookups_count)
+        print "{:>8} {:>16.3f} {:>16.3f}".format(depth, result["dict_merge"], result["lookup"])
+
+    if arguments["--csv"]:
+        with open(arguments["--csv"], "w") as csv_file:
+            csv_file.write(",".join(["actions"] + [key for key, title, unit in SCALING_METRICS]) + "\n")
+            for result in results:
+                csv_file.write(",".join(str(result[key]) for key in ["actions"] + [key for key, title, unit in SCALING_METRICS]) + "\n")
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
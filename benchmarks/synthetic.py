@@ -0,0 +1,174 @@
+"""
+Synthetic logan root generator
+
+Writes a 'loganrc.default' holding 'actions' actions spread over
+'contexts' contexts, a 'loganrc' overriding 'overrides' of them with
+options nested 'depth' levels deep, and one dummy executable per action
+under 'actions/<context>/' (hard links to a single no-op script, so that
+large catalogs stay cheap to generate).
+
+    Usage:
+        synthetic.py <root_dir> [--actions=<n>] [--contexts=<n>]
+                                [--overrides=<n>] [--depth=<n>]
+
+    Options:
+        --actions=<n>       Number of actions [default: 1000]
+        --contexts=<n>      Number of action contexts [default: 10]
+        --overrides=<n>     Number of actions overridden by the user config [default: 10]
+        --depth=<n>         Nesting depth of the overridden options [default: 1]
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from os import path
+import sys
+import os
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from lib.docopt import docopt
+import yaml
+
+
+# Content of every dummy action
+SYNTHETIC_ACTION_SCRIPT = "#!/bin/sh\ntrue\n"
+
+
+# ================
+# HELPERS
+# ================
+
+def action_key(index):
+
+    return "verb{}:object{}".format(index, index)
+
+# ------------------------------------------------------------------------------
+
+def action_context(index, contexts_count):
+
+    return "context{}".format(index % contexts_count)
+
+# ------------------------------------------------------------------------------
+
+def nested_options(index, depth):
+    """ Options nested 'depth' levels deep
+
+        Eg: nested_options(3, 2) => {"level0": {"level1": {"value": 3}}}
+    """
+
+    options = {"value": index}
+
+    for level in reversed(xrange(depth)):
+        options = {"level{}".format(level): options}
+
+    return options
+
+# ------------------------------------------------------------------------------
+
+def build_configs(actions_count, contexts_count=10, overrides_count=10, depth=1):
+    """ Builds the default and user configs of a synthetic logan root
+
+        Returns:
+            Tuple as (default_config, user_config)
+    """
+
+    default_config = {
+        "logan"  : {"options": None},
+        "actions": dict(
+            (action_key(i), {
+                "scope"  : "verb{}".format(i),
+                "context": action_context(i, contexts_count),
+                "path"   : "action{}".format(i),
+                "options": nested_options(0, depth),
+                "help"   : "NAME\n    action{} - does nothing\n".format(i)
+            })
+            for i in xrange(actions_count)
+        )
+    }
+
+    user_config = {
+        "logan"  : {"options": None},
+        "actions": dict(
+            (action_key(i), {"options": nested_options(i + 1, depth)})
+            for i in xrange(min(overrides_count, actions_count))
+        )
+    }
+
+    return default_config, user_config
+
+# ------------------------------------------------------------------------------
+
+def write_actions(root_dir, actions_count, contexts_count=10):
+    """ Writes one dummy executable per action under 'actions/<context>/'
+    """
+
+    actions_dir = path.join(root_dir, "actions")
+    script_path = path.join(actions_dir, ".noop")
+
+    if not path.isdir(actions_dir):
+        os.makedirs(actions_dir)
+
+    with open(script_path, "w") as script_file:
+        script_file.write(SYNTHETIC_ACTION_SCRIPT)
+
+    os.chmod(script_path, 0755)
+
+    for i in xrange(contexts_count):
+        context_dir = path.join(actions_dir, action_context(i, contexts_count))
+        if not path.isdir(context_dir):
+            os.makedirs(context_dir)
+
+    for i in xrange(actions_count):
+
+        action_path = path.join(actions_dir, action_context(i, contexts_count), "action{}".format(i))
+
+        if not path.exists(action_path):
+            os.link(script_path, action_path)
+
+# ------------------------------------------------------------------------------
+
+def generate(root_dir, actions_count, contexts_count=10, overrides_count=10, depth=1):
+    """ Generates a synthetic logan root directory
+
+        Returns:
+            The path of the logan root directory
+    """
+
+    default_config, user_config = build_configs(actions_count, contexts_count, overrides_count, depth)
+
+    if not path.isdir(root_dir):
+        os.makedirs(root_dir)
+
+    write_actions(root_dir, actions_count, contexts_count)
+
+    # The C emitter is much faster on large catalogs when it is available
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    with open(path.join(root_dir, "loganrc.default"), "w") as default_file:
+        yaml.dump(default_config, default_file, Dumper=dumper, default_flow_style=False)
+
+    with open(path.join(root_dir, "loganrc"), "w") as user_file:
+        yaml.dump(user_config, user_file, Dumper=dumper, default_flow_style=False)
+
+    return root_dir
+
+# ------------------------------------------------------------------------------
+
+def main():
+
+    arguments = docopt(__doc__)
+
+    root_dir = generate(arguments["<root_dir>"],
+                        int(arguments["--actions"]),
+                        int(arguments["--contexts"]),
+                        int(arguments["--overrides"]),
+                        int(arguments["--depth"]))
+
+    print "Synthetic logan root generated in {}".format(root_dir)
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,15 @@ Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
 __usage__="""Logan: Command line organizer
 
     Usage:
-        logan <action> <params>
+        logan batch <file> [--jobs=<n>] [--as-completed] [--json] [--listen=<address> [--workers=<n>]]
+        logan worker <address> [--jobs=<n>]
+        logan compile
+        logan help <action>
+        logan jobs
+        logan job <id>
+        logan wait <id>
+        logan drain [--jobs=<n>]
+        logan [--no-cache] [--subprocess] [--background] [--all-contexts] [--first-success | --fail-fast] [--jobs=<n>] <action> <params>
         logan -h | --help
         logan -v | --version
 
@@ -28,13 +36,59 @@ __usage__="""Logan: Command line organizer
 
                             Eg: create:file:windows
 
+                        Quoted, the context can be a list of contexts or '*' for all of
+                        them: the action runs in each one at once
+                            Eg: 'restart:server:{aws,gcp}', 'restart:server:*'
+
         <params>        Used in addition to the actual action to precise the action to perform.
                         A parameter could be (--in /tmp --rename filename.txt.bak)
                         Don't use it a lot 'cause it decreases the meaning of the action
 
-    Options
+                        A quoted '|' argument pipes the output of the action into the
+                        next one, given as <action> [<params>]
+                            Eg: logan list:files:usr /tmp '|' filter:lines foo
+
+    Commands
+        compile         Compiles the actions of the config into a binary index
+                        so that actions are found without loading the whole config,
+                        after scanning every directory of the actions directory again
+        batch           Runs every command of <file> ('-' for stdin), one per line
+                        or one JSON object per line ({"command": "..."})
+                        With '--listen', the commands are run by the workers instead,
+                        the ones sending the token of $LOGAN_CLUSTER_TOKEN (made up
+                        and shown when not set)
+        worker          Runs the batch commands sent by the coordinator listening on
+                        <address> (Eg: 'logan worker host-a:7070'), with the token
+                        of $LOGAN_CLUSTER_TOKEN
+        help            Shows the help of <action> (Eg: 'logan help list:files:usr')
+        jobs            Lists the last background jobs
+        job             Shows the state of the background job <id> and its output so far
+        wait            Shows the output of the background job <id> until it is done
+        drain           Runs the queued background jobs until the queue stays empty
+
+    Options:
         -h --help       Show you how to use Logan.
         -v --version    Show version.
+        --no-cache      Runs the action even if it is 'cacheable' and its result is cached
+        --subprocess    Runs the command in a new logan process
+                        (the command runs in the current process by default)
+        --background    Queues the action, a background worker runs it (see 'logan jobs')
+        --all-contexts  Runs the action in every context, like '<verb>:<object>:*'
+        --first-success
+                        Stops running the action in the other contexts once it succeeds in one
+        --fail-fast     Stops running the action in the other contexts once it fails in one
+        --jobs=<n>      Number of batch, fan-out or background actions running at the same time [default: 4]
+        --as-completed  Shows batch results as soon as each action is done
+        --json          Shows batch results as JSON records, one per line
+        --listen=<address>
+                        Address the batch waits for workers on (Eg: '0.0.0.0:7070',
+                        ':7070' for 127.0.0.1)
+        --workers=<n>   Number of workers the batch waits for before sharding its commands [default: 1]
+
+    The 'logan' client (bin/logan) also takes, before parsing the command line:
+        --profile-imports
+                        Runs the command in-process and reports the time spent importing
+                        every module (on stderr)
     """
 
 from agent import Agent
@@ -42,7 +96,12 @@ from exceptions import  LoganConfigFileNotExistsError, \
                         LoganLoadConfigError,\
                         LoganLoadFileError,\
                         LoganFileNotExistsError,\
-                        LoganActionPathMissingError
+                        LoganActionPathMissingError,\
+                        LoganActionSyntaxError,\
+                        LoganActionNotFoundError,\
+                        LoganActionAmbiguousError,\
+                        LoganCacheError,\
+                        LoganJobNotFoundError
 from cli import run
 
 
@@ -2,14 +2,26 @@
 #    LOGAN AGENT
 # ==========================================================
 
-from os import path
-from utils import dict_merge, load_file, FileTypes
-import shelve
+from os import path, environ, getcwd
+from utils import load_file, file_fingerprint, FileTypes, ReturnCodes
+from layers import LayeredConfig
+from tracing import traced, span
+from contextlib import contextmanager
+import errno
+import sys
 from exceptions import  LoganConfigFileNotExistsError, \
                         LoganLoadConfigError, \
+                        LoganLoadFileError, \
                         LoganActionAttrsMissingError,\
-                        LoganActionPathMissingError
-import say
+                        LoganActionPathMissingError,\
+                        LoganActionSyntaxError,\
+                        LoganActionNotFoundError,\
+                        LoganActionAmbiguousError,\
+                        LoganCacheError
+
+# Modules only needed by some commands (cache, subprocess, streams,
+# pipeline, results, index) are imported where they are used so that
+# 'logan' starts fast
 
 class Agent(object):
 
@@ -19,12 +31,62 @@ class Agent(object):
     LOGAN_DEFAULT_USER_CONFIG_FILENAME = "loganrc"
     LOGAN_DEFAULT_ACTIONS_DIR_NAME     = "actions"
 
+    # Directory of the config shards: one YAML file of actions per verb
+    LOGAN_SHARDS_DIR_NAME              = "loganrc.d"
+
+    # Optional config layers: system wide, per project (looked up in the
+    # project directory, the current one by default) and the one given by
+    # the $LOGAN_CONFIG variable
+    LOGAN_SYSTEM_CONFIG_FILE_PATH      = path.join("/etc", "logan", "loganrc")
+    LOGAN_PROJECT_CONFIG_FILENAME      = ".loganrc"
+    LOGAN_ENV_CONFIG_VARIABLE          = "LOGAN_CONFIG"
+    LOGAN_OPTIONAL_CONFIG_LAYERS       = ("discovered", "system", "project", "env")
+
+    # Lowest config layer: actions discovered from the actions directory
+    LOGAN_DISCOVERED_CONFIG_LAYER      = "discovered"
+    LOGAN_DISCOVER_ACTIONS             = True
+
     # the pattern that validates an action
     LOGAN_ACTION_PATTERN   = r'(\w+):(\w+):?(\w+)? *(.*)'
+    LOGAN_ACTION_REGEX     = None   # compiled on first use
 
     # Cache file path
     LOGAN_CACHE_KEY = 'logan.cache'
 
+    # Cache key of every config layer with the fingerprint of its file
+    LOGAN_CACHE_LAYERS_KEY = 'logan.cache.layers'
+
+    # Cache key of the action dispatcher compiled from the config
+    LOGAN_CACHE_DISPATCHER_KEY = 'logan.cache.dispatcher'
+
+    # Cache key of the table of the action executables
+    LOGAN_CACHE_EXECUTABLES_KEY = 'logan.cache.executables'
+
+    # Cache key of the manifest of the discovered actions
+    LOGAN_CACHE_MANIFEST_KEY = 'logan.cache.manifest'
+
+    # Cache key of the include patterns of every config file
+    LOGAN_CACHE_INCLUDES_KEY = 'logan.cache.includes'
+
+    # Number of processes parsing the included config files (None: one per CPU)
+    LOGAN_INCLUDE_JOBS = None
+
+    # Whether config fingerprints also hash the file contents
+    LOGAN_CACHE_CONTENT_HASH = False
+
+    # Compiled action index file path
+    LOGAN_INDEX_FILENAME = 'logan.index'
+
+    # Directory and maximum size (bytes) of the cached results of 'cacheable' actions
+    LOGAN_RESULTS_DIR_NAME   = 'results'
+    LOGAN_RESULTS_CACHE_SIZE = 32 * 1024 * 1024
+
+    # Unix socket the logan daemon listens on
+    LOGAN_SOCKET_FILENAME = 'logand.sock'
+
+    # Directory of the background job queue and of the output of the jobs
+    LOGAN_JOBS_DIR_NAME = 'jobs'
+
     # Output template
     LOGAN_OUTPUT_TEMPLATE = """
 
@@ -41,13 +103,132 @@ class Agent(object):
 \033[0;30m
 """
 
+    # Output template of streamed actions: their output has already been shown
+    LOGAN_STREAMED_OUTPUT_TEMPLATE = """
+
+\033[1;30mAction\t:\033[0;30m \033[1;36m{} \033[0;30m
+
+\033[1;30mRetcode\t:\033[0;30m {}
+
+\033[1;30mStreamed\t:\033[0;30m {} bytes of output, {} bytes of errors
+
+\033[1;30mLast errors\t: \033[0;30m
+\033[0;31m
+{}\033[0;30m
+"""
+
+    # Summary line of each stage of a pipeline
+    LOGAN_PIPELINE_STAGE_TEMPLATE = "\033[1;30mStage\t:\033[0;30m {command} => {code} ({duration:.3f}s)"
+
+    # Actions of a fan-out running at the same time
+    LOGAN_FANOUT_JOBS = 4
+
+    # Bytes of the action output and errors kept when streaming
+    LOGAN_STREAM_TAIL_SIZE = 4096
+
     # ------------------------------------------------------------------------------
 
-    def __init__(self, logan_dir_path=None):
+    def __init__(self, logan_dir_path=None, no_cache=False):
 
         # Setting configuration file
         self.set_paths(logan_dir_path)
 
+        # Directory of the project config layer (default to the current one)
+        self.project_dir = None
+
+        # Cache of the config and of what is built from it, opened on first use
+        self.config_cache = None
+
+        # Config loaded once per agent (kept warm by the daemon)
+        # and the fingerprints of the files it has been built from
+        self.config              = None
+        self.config_fingerprints = None
+
+        # Fingerprints shared by everything done for the current command,
+        # @see same_fingerprints
+        self.command_fingerprints = None
+
+        # Compiled action index, mapped on first use
+        self.action_index = None
+
+        # Action dispatcher and the config fingerprints it has been compiled from
+        self.dispatcher              = None
+        self.dispatcher_fingerprints = None
+
+        # Table of the action executables, walked on first use
+        self.executables = None
+
+        # Manifest of the actions discovered from the actions directory
+        self.manifest = None
+
+        # Actions of the config shards, read one shard at a time
+        self.shards = None
+
+        # Include patterns of the config files: file path => (fingerprint, patterns)
+        self.include_patterns = None
+
+        # Options read from the environment
+        self.read_environ()
+
+        # '--no-cache' of the command line
+        if no_cache:
+            self.use_result_cache = False
+
+        # Cached results of the 'cacheable' actions, opened on first use
+        self.result_cache = None
+
+        # Queue of the background jobs, opened on first use
+        self.job_queue = None
+
+        # Config cache counters
+        self.cache_stats = {
+            "hits"    : 0,
+            "misses"  : 0,
+            "rebuilds": 0
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def read_environ(self):
+        """ Reads the options given by the environment
+
+            Read again by the agent kept warm by the daemon: every command
+            comes with the environment of its client.
+        """
+
+        # Whether actions output is forwarded as it arrives ($LOGAN_STREAM)
+        # instead of being shown once the action is done
+        self.stream_output = bool(environ.get("LOGAN_STREAM"))
+
+        # Whether results of 'cacheable' actions may be served from the
+        # results cache ('--no-cache' or $LOGAN_NO_CACHE to bypass it)
+        self.use_result_cache = not environ.get("LOGAN_NO_CACHE")
+
+    # ------------------------------------------------------------------------------
+
+    def share_config(self, agent):
+        """ Takes the project directory, the options and the loaded config of another agent
+
+            The config is read-only (@see load_config): agents working for
+            the same command share it instead of loading it again.
+
+            Args:
+                agent: Agent of the same root directory
+        """
+
+        self.project_dir      = agent.project_dir
+        self.stream_output    = agent.stream_output
+        self.use_result_cache = agent.use_result_cache
+
+        self.config               = agent.config
+        self.config_fingerprints  = agent.config_fingerprints
+        self.command_fingerprints = agent.command_fingerprints
+        self.include_patterns     = agent.include_patterns
+
+        self.executables = agent.executables
+        self.manifest    = agent.manifest
+        self.shards      = agent.shards
+
     # ------------------------------------------------------------------------------
 
     def set_paths(self, dir_path):
@@ -66,8 +247,24 @@ class Agent(object):
         # Setting actions path
         self.logan_actions_path         = path.join(self.root_dir, self.LOGAN_DEFAULT_ACTIONS_DIR_NAME)
 
+        # Setting config shards path
+        self.logan_shards_path          = path.join(self.root_dir, self.LOGAN_SHARDS_DIR_NAME)
+
+        # Setting compiled action index path
+        self.logan_index_path           = path.join(self.root_dir, self.LOGAN_INDEX_FILENAME)
+
+        # Setting cached results path
+        self.logan_results_path         = path.join(self.root_dir, self.LOGAN_RESULTS_DIR_NAME)
+
+        # Setting daemon socket path
+        self.logan_socket_path          = path.join(self.root_dir, self.LOGAN_SOCKET_FILENAME)
+
+        # Setting background jobs path
+        self.logan_jobs_path            = path.join(self.root_dir, self.LOGAN_JOBS_DIR_NAME)
+
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.load_default_config", "agent")
     def load_default_config(self):
         """ Loads configuration from the default config file
 
@@ -100,6 +297,7 @@ class Agent(object):
     # ------------------------------------------------------------------------------
 
     @classmethod
+    @traced("Agent.load_config_file", "agent")
     def load_config_file(cls, file_path):
         """ Alias to allow reading config file from outside
         """
@@ -108,6 +306,7 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.get_config_from_filepath", "agent")
     def get_config_from_filepath(self, file_path):
         """ Loads config python Dict from a given file_path
         """
@@ -116,6 +315,7 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.load_user_config", "agent")
     def load_user_config(self):
         """ Get user configuration
         """
@@ -143,36 +343,387 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
+    def get_config_layers(self):
+        """ Lists config layers from the lowest to the highest priority
+
+            Layers listed in LOGAN_OPTIONAL_CONFIG_LAYERS are ignored
+            when their file doesn't exist.
+
+            The 'discovered' layer is read from the actions directory
+            (@see get_discovered_config), the others from YAML files.
+
+            Returns:
+                List of tuples as (layer_name, file_path)
+        """
+
+        layers = [
+            ("system",  self.LOGAN_SYSTEM_CONFIG_FILE_PATH),
+            ("default", self.default_config_file_path),
+            ("user",    self.user_config_file_path),
+            ("project", path.join(self.project_dir or getcwd(), self.LOGAN_PROJECT_CONFIG_FILENAME))
+        ]
+
+        if environ.get(self.LOGAN_ENV_CONFIG_VARIABLE):
+            layers.append(("env", environ[self.LOGAN_ENV_CONFIG_VARIABLE]))
+
+        if self.LOGAN_DISCOVER_ACTIONS:
+            layers.insert(0, (self.LOGAN_DISCOVERED_CONFIG_LAYER, self.logan_actions_path))
+
+        return layers
+
+    # ------------------------------------------------------------------------------
+
+    def get_layer_config(self, name, file_path):
+        """ Loads the config of a layer
+
+            Returns:
+                Dict of the config
+        """
+
+        if name == self.LOGAN_DISCOVERED_CONFIG_LAYER:
+            return self.get_discovered_config()
+
+        return self.get_config_from_filepath(file_path)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_config_fingerprints", "agent")
+    def get_config_fingerprints(self):
+        """ Fingerprints every config layer file (one 'stat' call per file,
+            one per directory of the actions directory), the files they
+            include and the config shards
+
+            Returns:
+                Dict mapping layer names (and 'shards') to file fingerprints
+                and 'includes' to a Dict mapping layer names to the
+                fingerprints of the files they include
+                @see utils.file_fingerprint
+                @see manifest.manifest_fingerprint
+                @see includes.includes_fingerprint
+                @see shards.shards_fingerprint
+        """
+
+        # The files are fingerprinted once per command
+        if self.command_fingerprints is not None:
+            return self.command_fingerprints
+
+        from shards import shards_fingerprint
+        from includes import includes_fingerprint
+
+        fingerprints = {"includes": {}}
+
+        for name, file_path in self.get_config_layers():
+
+            if name == self.LOGAN_DISCOVERED_CONFIG_LAYER:
+                from manifest import manifest_fingerprint
+                fingerprints[name] = manifest_fingerprint(file_path)
+                continue
+
+            fingerprints[name] = file_fingerprint(file_path, self.LOGAN_CACHE_CONTENT_HASH)
+
+            # A missing file includes nothing
+            if fingerprints[name] is None:
+                continue
+
+            patterns = self.get_include_patterns(file_path, fingerprints[name])
+
+            if patterns:
+                fingerprints["includes"][name] = includes_fingerprint(file_path, patterns,
+                                                                      self.LOGAN_CACHE_CONTENT_HASH)
+
+        fingerprints["shards"] = shards_fingerprint(self.logan_shards_path, self.LOGAN_CACHE_CONTENT_HASH)
+
+        return fingerprints
+
+    # ------------------------------------------------------------------------------
+
+    @contextmanager
+    def same_fingerprints(self):
+        """ Fingerprints the config files once for everything done in the
+            block, so that the dispatcher, the action index and the config
+            of a command are checked without walking the files again
+
+            Usage:
+                with agent.same_fingerprints():
+                    action = agent.dispatch_command("list:files:usr -ltr")
+
+            Yields:
+                The fingerprints, @see get_config_fingerprints
+        """
+
+        # Nested in a block of the same command
+        if self.command_fingerprints is not None:
+            yield self.command_fingerprints
+            return
+
+        self.command_fingerprints = self.get_config_fingerprints()
+
+        try:
+            yield self.command_fingerprints
+        finally:
+            self.command_fingerprints = None
+
+    # ------------------------------------------------------------------------------
+
+    def get_include_patterns(self, file_path, fingerprint):
+        """ Gets the include patterns of a config file, as cached when
+            the file has been parsed
+
+            Returns:
+                List of patterns or None when the file has not been
+                parsed with this fingerprint
+        """
+
+        patterns = self.include_patterns or {}
+        entry    = patterns.get(file_path)
+
+        # Maybe parsed by another process since
+        if entry is None or entry[0] != fingerprint:
+            patterns = self.include_patterns = self.read_cache(self.LOGAN_CACHE_INCLUDES_KEY) or {}
+            entry    = patterns.get(file_path)
+
+        if entry is None or entry[0] != fingerprint:
+            return None
+
+        return entry[1]
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.build_layers", "agent")
+    def build_layers(self, names, cached_layers, fingerprints):
+        """ Loads config layers along with the files they include
+
+            Files whose fingerprint didn't change since their layer has been
+            cached are not parsed again. The included files to parse are
+            parsed in parallel, @see includes.parse_files
+
+            Args:
+                names:          Names of the layers to load
+                cached_layers:  @see add_layers_to_cache
+                fingerprints:   @see get_config_fingerprints
+                                Updated with the files the layers include
+
+            Returns:
+                Dict mapping layer names to layers as
+                {
+                    "fingerprint"         : (...),
+                    "config"              : {...},
+                    "includes"            : ((file_path, fingerprint, config), ...),
+                    "includes_fingerprint": ((file_path, fingerprint), ...) or None
+                }
+        """
+
+        from includes import get_include_patterns, expand_includes, parse_files
+
+        layers   = {}
+        patterns = dict(self.read_cache(self.LOGAN_CACHE_INCLUDES_KEY) or {})
+        parsed   = {}   # Included file path => (fingerprint, config) from the cache
+
+        for name, file_path in self.get_config_layers():
+
+            if name not in names:
+                continue
+
+            cached = cached_layers.get(name) or {}
+
+            for include_path, include_fingerprint, include_config in cached.get("includes") or ():
+                parsed[include_path] = (include_fingerprint, include_config)
+
+            missing = fingerprints[name] is None and name in self.LOGAN_OPTIONAL_CONFIG_LAYERS
+
+            if missing:
+                config = None
+            elif "config" in cached and cached.get("fingerprint") == fingerprints[name]:
+                # Only some included files changed
+                config = cached["config"]
+            else:
+                config = self.get_layer_config(name, file_path)
+
+            layer = layers[name] = {"fingerprint": fingerprints[name], "config": config, "includes": ()}
+
+            fingerprints["includes"].pop(name, None)
+
+            if name == self.LOGAN_DISCOVERED_CONFIG_LAYER or missing:
+                continue
+
+            include_patterns    = get_include_patterns(config)
+            patterns[file_path] = (fingerprints[name], include_patterns)
+
+            if include_patterns:
+                layer["includes"] = tuple(
+                    (include_path, file_fingerprint(include_path, self.LOGAN_CACHE_CONTENT_HASH))
+                    for include_path in expand_includes(file_path, include_patterns)
+                )
+                fingerprints["includes"][name] = layer["includes"]
+
+        # Files never parsed or changed since
+        stale   = sorted(set(
+            include_path
+            for layer in layers.itervalues()
+            for include_path, include_fingerprint in layer["includes"]
+            if parsed.get(include_path, (None,))[0] != include_fingerprint
+        ))
+        configs = dict(zip(stale, parse_files(stale, self.LOGAN_INCLUDE_JOBS)))
+
+        for name, layer in layers.iteritems():
+
+            layer["includes_fingerprint"] = fingerprints["includes"].get(name)
+            layer["includes"] = tuple(
+                (include_path, include_fingerprint,
+                 configs[include_path] if include_path in configs else parsed[include_path][1])
+                for include_path, include_fingerprint in layer["includes"]
+            )
+
+        self.include_patterns = patterns
+        self.write_cache(self.LOGAN_CACHE_INCLUDES_KEY, patterns)
+
+        return layers
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.load_config", "agent")
     def load_config(self):
-        """ Returns the final logan config, result of the merging of default and user config
+        """ Returns the final logan config, result of the merging of every config layer
 
             It always return an empty Dict object not None!
 
+            Every layer is cached along with the fingerprint of its file.
+            Each load checks those fingerprints and only reloads the layers
+            whose file changed since they were cached. A single process
+            reloads them at a time, @see cache.ConfigCache.locked
+
+            Config files can include other files ('include: [conf.d/*.yaml]'),
+            which override them. Each one is cached with its own fingerprint
+            and only parsed again when it changes, @see build_layers
+
+            Layers are not copied into a new dict: the config is a
+            read-only LayeredConfig view sharing them.
+
             Returns:
-                Dict derived from the logan configuration file
+                Dict-like LayeredConfig derived from the logan configuration files
         """
 
+        fingerprints = self.get_config_fingerprints()
+
+        # Already loaded by this agent and still up to date
+        if self.config is not None and fingerprints == self.config_fingerprints:
+            self.cache_stats["hits"] += 1
+            return self.config
+
         # Try to retrieve config from cache
-        config = self.get_config_from_cache() or {}
+        cached_layers = self.get_layers_from_cache() or {}
+
+        layers  = cached_layers
+        rebuilt = self.get_stale_layers(cached_layers, fingerprints)
+
+        if rebuilt:
 
-        if not config:
+            # The other processes wait for the one reloading the layers,
+            # then use what it has published
+            with self.get_cache().locked(self.LOGAN_CACHE_LAYERS_KEY):
 
-            default_config = self.load_default_config()
-            user_config    = self.load_user_config()
+                cached_layers = self.get_layers_from_cache() or {}
 
-            # Overrides the default config with user one
-            config = dict_merge(default_config, user_config) or {}
+                layers  = dict(cached_layers)
+                rebuilt = self.get_stale_layers(cached_layers, fingerprints)
 
-            # Save the config to the cache
-            cached = self.add_to_cache(config)
+                # Save the layers to the cache
+                if rebuilt:
+                    layers.update(self.build_layers(rebuilt, cached_layers, fingerprints))
+                    self.add_layers_to_cache(layers)
 
-            if not cached:
-                print "Failed to cache config file"
+        if not rebuilt:
+            self.cache_stats["hits"] += 1
+
+        else:
+            self.cache_stats["rebuilds" if cached_layers else "misses"] += 1
+
+        # Higher layers override lower ones, included files override the including one
+        config = LayeredConfig([
+            layer_config
+            for name, file_path in self.get_config_layers()
+            for layer_config in [layers[name]["config"]] + [
+                include_config for include_path, include_fingerprint, include_config
+                in layers[name].get("includes") or ()
+            ]
+        ])
+
+        self.config              = config
+        self.config_fingerprints = fingerprints
 
         return config
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.get_manifest", "agent")
+    def get_manifest(self, rescan=False):
+        """ Gets the manifest of the actions discovered from the actions
+            directory, refreshed
+
+            Only the directories that changed since the manifest has been
+            cached are scanned again (every one of them when 'rescan' is set).
+
+            Returns:
+                An ActionManifest
+        """
+
+        from manifest import ActionManifest
+
+        manifest = self.manifest
+
+        if manifest is None:
+
+            manifest = self.read_cache(self.LOGAN_CACHE_MANIFEST_KEY)
+
+            if manifest is None or manifest.actions_path != self.logan_actions_path:
+                manifest = ActionManifest(self.logan_actions_path)
+
+        if manifest.refresh(rescan):
+            self.write_cache(self.LOGAN_CACHE_MANIFEST_KEY, manifest)
+
+        self.manifest = manifest
+
+        return manifest
+
+    # ------------------------------------------------------------------------------
+
+    def get_discovered_config(self):
+        """ Config of the actions discovered from the actions directory
+
+            Returns:
+                Dict as {"actions": {...}}
+        """
+
+        return {"actions": self.get_manifest().get_actions()}
+
+    # ------------------------------------------------------------------------------
+
+    def get_stale_layers(self, cached_layers, fingerprints):
+        """ Lists the config layers to reload
+
+            Args:
+                cached_layers:  @see add_layers_to_cache
+                fingerprints:   @see get_config_fingerprints
+
+            Returns:
+                List of the names of the layers missing from 'cached_layers'
+                or cached with another fingerprint
+        """
+
+        stale = []
+
+        for name, file_path in self.get_config_layers():
+
+            layer = cached_layers.get(name)
+
+            if not layer or layer.get("fingerprint") != fingerprints[name] \
+                         or layer.get("includes_fingerprint") != fingerprints["includes"].get(name):
+                stale.append(name)
+
+        return stale
+
+    # ------------------------------------------------------------------------------
+
     def check_action_command_syntax(self, command):
         """ Checks whether or not a given command is valid
 
@@ -256,6 +807,7 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.validates_action_command", "agent")
     def validates_action_command(self, action):
         """ Checks whether or not a given action is valid.
 
@@ -273,14 +825,18 @@ class Agent(object):
                 or not the the action is valid
 
         """
-        import re
+        # Compiled once per process
+        if self.LOGAN_ACTION_REGEX is None:
+            import re
+            type(self).LOGAN_ACTION_REGEX = re.compile(self.LOGAN_ACTION_PATTERN)
 
-        valid_action = re.search(self.LOGAN_ACTION_PATTERN, action)
+        valid_action = self.LOGAN_ACTION_REGEX.search(action)
 
         return valid_action
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.add_to_cache", "agent")
     def add_to_cache(self, config):
         """ Store the config object in cache to avoid reading from a file every time
 
@@ -291,47 +847,91 @@ class Agent(object):
                 Boolean: Whether or not he saving process has succeeded
         """
 
-        cache  = None
-        cached = True
+        return self.write_cache(self.LOGAN_CACHE_KEY, config)
 
-        try:
-            cache = self.get_cache()
-            cache[self.LOGAN_CACHE_KEY] = config
-            cache.close()
-        except Exception as e:
-            print "Saving in cache failed"
-            cached = False
+    # ------------------------------------------------------------------------------
 
-        return cached
+    @traced("Agent.add_layers_to_cache", "agent")
+    def add_layers_to_cache(self, layers):
+        """ Store the config layers in cache with the fingerprint of their file
+
+            Args:
+                layers: Dict of the config layers
+                        Eg: {"user": {"fingerprint": (...), "config": {...}}}
+
+            Returns:
+                Boolean: Whether or not he saving process has succeeded
+        """
+
+        return self.write_cache(self.LOGAN_CACHE_LAYERS_KEY, layers)
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.get_cache", "agent")
     def get_cache(self):
         """ Gets a cache instance
 
             Returns:
-                A cache object
+                A ConfigCache, @see cache
         """
-        return shelve.open(self.logan_cache_path)
+
+        if self.config_cache is None:
+            from cache import ConfigCache
+
+            self.config_cache = ConfigCache(self.root_dir)
+
+        return self.config_cache
 
     # ------------------------------------------------------------------------------
 
-    def get_config_from_cache(self):
+    def read_cache(self, key):
+        """ Reads a key of the cache, never blocks
 
-        cache         = None
-        cached_config = None
+            Returns:
+                The cached value or None when it isn't cached
+        """
+
+        return self.get_cache().get(key)
+
+    # ------------------------------------------------------------------------------
+
+    def write_cache(self, key, value):
+        """ Publishes a key of the cache
+
+            Returns:
+                Boolean: Whether or not the value has been cached
+        """
 
         try:
-            cache = self.get_cache()
-            cached_config = cache[self.LOGAN_CACHE_KEY]
-            cache.close()
-        except Exception as e:
-            print "Saving in cache failed"
+            self.get_cache().put(key, value)
+        except LoganCacheError as e:
+            print e
+            return False
+
+        return True
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_config_from_cache", "agent")
+    def get_config_from_cache(self):
+
+        return self.read_cache(self.LOGAN_CACHE_KEY)
 
-        return cached_config
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_layers_from_cache", "agent")
+    def get_layers_from_cache(self):
+        """ Gets the cached config layers with their fingerprints
+
+            Returns:
+                Dict as saved by 'add_to_cache' or None when nothing is cached
+        """
+
+        return self.read_cache(self.LOGAN_CACHE_LAYERS_KEY)
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.check_cache", "agent")
     def check_cache(self, key):
         """ Checks whether or not it exist the given 'key'
             in the cache as a object key
@@ -344,25 +944,110 @@ class Agent(object):
 
         """
 
-        is_present = False
+        return self.get_cache().has_key(key)
 
-        try:
-            cache = self.get_cache()
-            is_present = cache.has_key(key)
-            cache.close()
-        except Exception as e:
-            print "Checking presence in cache failed"
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.compile_index", "agent")
+    def compile_index(self):
+        """ Compiles the actions of the config into the binary action index
+
+            Returns:
+                The number of indexed actions
+        """
+
+        from index import compile_index
+
+        # Sidecar files edited in place are only seen by a full scan
+        if self.LOGAN_DISCOVER_ACTIONS:
+            self.rescan_actions()
+
+        config = self.load_config()
 
-        return is_present
+        if self.action_index is not None:
+            self.action_index.close()
+            self.action_index = None
+
+        return compile_index(self.get_all_actions(), self.logan_index_path, self.config_fingerprints)
+
+    # ------------------------------------------------------------------------------
+
+    def rescan_actions(self):
+        """ Scans every directory of the actions directory again and
+            updates the cached 'discovered' config layer
+
+            Returns:
+                The number of discovered actions
+        """
+
+        from manifest import manifest_fingerprint
+
+        actions = self.get_manifest(rescan=True).get_actions()
+        layers  = self.get_layers_from_cache() or {}
+
+        layers[self.LOGAN_DISCOVERED_CONFIG_LAYER] = {
+            "fingerprint": manifest_fingerprint(self.logan_actions_path),
+            "config"     : {"actions": actions}
+        }
+
+        self.add_layers_to_cache(layers)
+
+        # Merged again on the next load
+        self.config = None
+
+        return len(actions)
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.get_action_index", "agent")
+    def get_action_index(self):
+        """ Gets the compiled action index if it exists and is up to date
+
+            The index is up to date when it has been compiled from the
+            current config files (same fingerprints).
+
+            Returns:
+                An ActionIndex or None
+        """
+
+        fingerprints = self.get_config_fingerprints()
+
+        # Maps the index again if it has been recompiled in the meantime
+        if self.action_index is not None and self.action_index.fingerprints != fingerprints:
+            self.action_index.close()
+            self.action_index = None
+
+        if self.action_index is None:
+
+            if not path.exists(self.logan_index_path):
+                return None
+
+            from index import ActionIndex
+
+            try:
+                self.action_index = ActionIndex(self.logan_index_path)
+            except (EnvironmentError, ValueError, LoganLoadFileError) as e:
+                return None
+
+        if self.action_index.fingerprints != fingerprints:
+            return None
+
+        return self.action_index
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.find_action_by_key", "agent")
     def find_action_by_key(self, key=None):
         """ Find the action with the given 'key' as an action key
 
             It also checks that the action found for the given 'key'
             has the same context as the one inside the configuration
 
+            When an up to date action index has been compiled, the action
+            is read from it and the config is not loaded at all. Otherwise
+            only the config shard of the action verb is read, along with
+            the config layers.
+
             Args:
                 key: A given action key
 
@@ -371,10 +1056,29 @@ class Agent(object):
                 that as the given 'key' as an action key
         """
 
-        config  = self.load_config()
-        actions = config.get("actions")
+        with self.same_fingerprints():
+
+            action_index = self.get_action_index()
 
-        action_found = actions.get(key)
+            if action_index is not None:
+                from index import action_index_key
+                return action_index.get(action_index_key(key, self.action_context))
+
+            config  = self.load_config()
+            actions = config.get("actions") or {}
+
+            action_found = actions.get(key)
+
+            shard_action = None
+
+            # Without any shard, nothing more to read
+            if self.config_fingerprints.get("shards"):
+                shard_action = self.get_shards().get_action(key, self.config_fingerprints["shards"])
+
+        # The config layers override the shard
+        if shard_action is not None:
+            layers       = action_found.layers if isinstance(action_found, LayeredConfig) else [action_found]
+            action_found = LayeredConfig([shard_action] + layers)
 
         # Check if the action found has the same context of the one in the configuration
         if action_found and (action_found.get("context") != self.action_context):
@@ -395,7 +1099,197 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
-    def performs(self, action):
+    @traced("Agent.resolve_command", "agent")
+    def resolve_command(self, command):
+        """ Resolves a command into the process command of its action
+
+            Args:
+                command: Eg: 'list:files:usr -ltr'
+
+            Returns:
+                Tuple as (action, process_command)
+                @see build_command_from_action
+
+            Raises:
+                LoganActionSyntaxError:         The command syntax is wrong
+                LoganActionNotFoundError:       No action matches the command
+                LoganActionPathMissingError:    The action file doesn't exist
+        """
+
+        action = self.dispatch_command(command)
+
+        return action, self.build_command_from_action(action)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.dispatch_command", "agent")
+    def dispatch_command(self, command):
+        """ Checks the syntax of a command and finds its action in a single
+            pass through the action dispatcher
+
+            Action tokens can be abbreviated as long as a single action
+            matches. Eg: 'cr:fi:usr notes.txt' for 'create:file:usr notes.txt'
+
+            Args:
+                command: Eg: 'create:file:usr notes.txt'
+
+            Returns:
+                Dict containing all information about the action
+
+            Raises:
+                LoganActionSyntaxError:     The command syntax is wrong
+                LoganActionNotFoundError:   No action matches the command
+                LoganActionAmbiguousError:  Several actions match the command
+        """
+
+        # The dispatcher and the action are checked against the same fingerprints
+        with self.same_fingerprints():
+
+            action_verb, action_object, action_context, action_params, action_key = \
+                    self.get_dispatcher().resolve(command)
+
+            # Setting action attributes (with abbreviations expanded)
+            self.command        = command
+            self.action_verb    = action_verb
+            self.action_object  = action_object
+            self.action_context = action_context
+            self.action_params  = action_params
+
+            action = self.find_action_by_key(action_key)
+
+        if not action:
+            raise LoganActionNotFoundError("Logan action [%s] not found" % command)
+
+        return action
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_dispatcher", "agent")
+    def get_dispatcher(self):
+        """ Gets the action dispatcher compiled from the current config
+
+            It is cached alongside the config layers with the fingerprints
+            of the config files it has been compiled from, and compiled
+            again when one of them changes.
+
+            Returns:
+                An ActionDispatcher
+        """
+
+        from dispatch import ActionDispatcher
+
+        fingerprints = self.get_config_fingerprints()
+
+        if self.dispatcher is not None and self.dispatcher_fingerprints == fingerprints:
+            return self.dispatcher
+
+        cached = self.read_cache(self.LOGAN_CACHE_DISPATCHER_KEY)
+
+        if cached and cached.get("fingerprints") == fingerprints:
+            dispatcher = cached.get("dispatcher")
+
+        else:
+            # Compiled by a single process at a time, @see load_config
+            with self.get_cache().locked(self.LOGAN_CACHE_DISPATCHER_KEY):
+
+                cached = self.read_cache(self.LOGAN_CACHE_DISPATCHER_KEY)
+
+                if cached and cached.get("fingerprints") == fingerprints:
+                    dispatcher = cached.get("dispatcher")
+
+                else:
+                    dispatcher = ActionDispatcher(self.get_all_actions())
+
+                    # Also fingerprints the files included by the config files loaded meanwhile
+                    fingerprints = self.config_fingerprints
+
+                    self.write_cache(self.LOGAN_CACHE_DISPATCHER_KEY,
+                                     {"fingerprints": fingerprints, "dispatcher": dispatcher})
+
+        self.dispatcher              = dispatcher
+        self.dispatcher_fingerprints = fingerprints
+
+        return dispatcher
+
+    # ------------------------------------------------------------------------------
+
+    def get_shards(self):
+        """ Gets the actions of the config shards
+
+            Returns:
+                A ShardStore
+        """
+
+        if self.shards is None:
+            from shards import ShardStore
+
+            self.shards = ShardStore(self.logan_shards_path, self.get_cache(), self.LOGAN_CACHE_CONTENT_HASH)
+
+        return self.shards
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_all_actions", "agent")
+    def get_all_actions(self):
+        """ Gets every action of the config layers and of the config shards,
+            without the 'help' of the shards
+
+            Every shard is read: only used to compile the dispatcher and
+            the action index.
+
+            Returns:
+                Dict mapping action keys to actions
+        """
+
+        actions = self.get_shards().get_actions()
+
+        config_actions = self.load_config().get("actions")
+
+        if config_actions:
+            for key, action in config_actions.iteritems():
+
+                # The config layers override the shard
+                if key in actions and isinstance(action, LayeredConfig):
+                    action = LayeredConfig([actions[key]] + action.layers)
+
+                actions[key] = action.to_dict() if isinstance(action, LayeredConfig) else action
+
+        return actions
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.get_action_help", "agent")
+    def get_action_help(self, command):
+        """ Gets the 'help' of an action ('logan help <action>')
+
+            Args:
+                command: Action, possibly abbreviated. Eg: 'li:fi:usr'
+
+            Returns:
+                Tuple as (action_key, help), 'help' is None when the action
+                has none
+
+            Raises:
+                LoganActionSyntaxError:     The action syntax is wrong
+                LoganActionNotFoundError:   No action matches
+        """
+
+        with self.same_fingerprints():
+
+            action_key = self.get_dispatcher().resolve(command)[4]
+
+            action = (self.load_config().get("actions") or {}).get(action_key)
+            help   = action.get("help") if action else None
+
+        if help is None:
+            help = self.get_shards().get_help(action_key)
+
+        return action_key, help
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.performs", "agent")
+    def performs(self, action, stream=None):
         """ Executes command related to the given action
 
             Args:
@@ -409,33 +1303,161 @@ class Agent(object):
                             "path": "/bin/cp"
                         }
 
+                stream: Forwards the action output to sys.stdout and sys.stderr
+                        as it arrives instead of buffering it.
+                        Default to 'self.stream_output'
+
             Returns:
                 Dict as the result of action performing. It is structure
                 like this:
                 output = {
-                    "out" : "...",
-                    "err" : "...",
-                    "code": 0/1
+                    "out"      : "...",
+                    "err"      : "...",
+                    "code"     : 0/1,
+                    "out_bytes": 1234,
+                    "err_bytes": 0
                 }
+                When streamed, "out" and "err" only hold the last bytes of
+                the output and "streamed" is set to True.
+
+                Results of actions declared as 'cacheable' come from the
+                results cache when possible ("cached" is then set to True).
+                Streamed results are never cached.
         """
 
         import subprocess
 
+        stream  = self.stream_output if stream is None else stream
+
         command = self.build_command_from_action(action)
 
-        process = subprocess.Popen(command, shell=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        cache_key = None
+
+        if not stream and self.use_result_cache and action.get("cacheable"):
+
+            cache     = self.get_result_cache()
+            cache_key = cache.make_key(command, action.get("context"), action.get("depends"))
+            output    = cache.get(cache_key, action.get("ttl"))
+
+            if output is not None:
+                output["cached"] = True
+                return output
 
-        out, err = process.communicate()
+        with span("spawn", "process", {"command": command}):
+            try:
+                process = subprocess.Popen(command, shell=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
 
-        return {
-            "out" : out,
-            "err" : err,
-            "code": process.returncode
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.EACCES):
+                    raise
+
+                # The executable table was stale: walks the actions again
+                self.get_executables().forget(command[0])
+
+                command = self.build_command_from_action(action)
+                process = subprocess.Popen(command, shell=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+
+        if stream:
+            from streams import stream_process
+
+            with span("child wait", "process", {"pid": process.pid, "streamed": True}):
+                output = stream_process(process, sys.stdout, sys.stderr, self.LOGAN_STREAM_TAIL_SIZE)
+            output["streamed"] = True
+
+            return output
+
+        with span("child wait", "process", {"pid": process.pid}):
+            out, err = process.communicate()
+
+        output = {
+            "out"      : out,
+            "err"      : err,
+            "code"     : process.returncode,
+            "out_bytes": len(out),
+            "err_bytes": len(err)
         }
 
+        # Only successful results are worth serving again
+        if cache_key is not None and output["code"] == ReturnCodes.OK:
+            self.get_result_cache().put(cache_key, output)
+
+        return output
+
+    # ------------------------------------------------------------------------------
+
+    def get_result_cache(self):
+        """ Gets the cache of action results
+
+            Returns:
+                A ResultCache
+        """
+
+        if self.result_cache is None:
+            from results import ResultCache
+
+            self.result_cache = ResultCache(self.logan_results_path, self.LOGAN_RESULTS_CACHE_SIZE)
+
+        return self.result_cache
+
+    # ------------------------------------------------------------------------------
+
+    def get_job_queue(self):
+        """ Gets the queue of the background jobs
+
+            Returns:
+                A JobQueue
+        """
+
+        if self.job_queue is None:
+            from jobs import JobQueue
+
+            self.job_queue = JobQueue(self.logan_jobs_path)
+
+        return self.job_queue
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.process_background", "agent")
+    def process_background(self, command, jobs=4):
+        """ Queues the command as a background job, starts a worker when
+            none is alive
+
+            Args:
+                command: Eg: 'backup:db:prod nightly'
+                jobs:    Actions the started worker runs at the same time
+
+            Returns:
+                The return code of the queuing (the action runs later)
+        """
+
+        from jobs import spawn_worker
+
+        # Fails now rather than in the background
+        try:
+            self.resolve_command(command)
+
+        except LoganActionSyntaxError:
+            print "Wrong syntax : Unable to run the command"
+            return ReturnCodes.FAIL
+
+        except (LoganActionNotFoundError, LoganActionPathMissingError) as e:
+            print "[LOGAN] : {}".format(e)
+            return ReturnCodes.FAIL
+
+        queue  = self.get_job_queue()
+        job_id = queue.enqueue(command)
+
+        if not queue.get_workers():
+            spawn_worker(self, queue, jobs)
+
+        print "[LOGAN] : Job {} queued (see 'logan job {}')".format(job_id, job_id)
+
+        return ReturnCodes.OK
+
     # ------------------------------------------------------------------------------
 
     # TODO: Write test for this method
+    @traced("Agent.build_command_from_action", "agent")
     def build_command_from_action(self, action):
         """ Build the process command that will be executed.
 
@@ -456,9 +1478,23 @@ class Agent(object):
                                 context_path,
                                 action_file_path)
 
-        # Checks if the action path is correct file
-        if not path.isfile(action_path):
+        executables = self.get_executables()
+        found       = executables.lookup(action_path) is not None
+
+        if executables.changed:
+            self.add_executables_to_cache(executables)
+
+        # Files out of the actions directory (absolute paths) are not in the table
+        if not found and executables.get_relative_path(action_path) is None:
+            found = path.isfile(action_path)
+
+        # Checks if the action path is an executable file
+        if not found:
             print "Agent.build_command_from_action : checks the action path : %s" % action_path
+
+            if not executables.is_executable(action_path):
+                raise LoganActionPathMissingError("Logan action path [%s] is not executable" % action_path)
+
             raise LoganActionPathMissingError("Logan action path [%s] not found" % action_path)
 
         return [
@@ -468,6 +1504,52 @@ class Agent(object):
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.get_executables", "agent")
+    def get_executables(self):
+        """ Gets the table of the action executables
+
+            It is kept by the agent and cached alongside the config, so
+            that finding the file of an action doesn't touch the file
+            system once the table has been built.
+
+            Returns:
+                An ExecutableTable
+        """
+
+        if self.executables is not None:
+            return self.executables
+
+        from executables import ExecutableTable
+
+        executables = self.read_cache(self.LOGAN_CACHE_EXECUTABLES_KEY)
+
+        # The table of another actions directory (eg: a moved root) is useless
+        if executables is None or executables.actions_path != path.abspath(self.logan_actions_path):
+            executables = ExecutableTable(self.logan_actions_path)
+            executables.build()
+
+        self.executables = executables
+
+        return executables
+
+    # ------------------------------------------------------------------------------
+
+    def add_executables_to_cache(self, executables):
+        """ Stores the table of the action executables in cache
+
+            Returns:
+                Boolean: Whether or not he saving process has succeeded
+        """
+
+        cached = self.write_cache(self.LOGAN_CACHE_EXECUTABLES_KEY, executables)
+
+        executables.changed = False
+
+        return cached
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.show_output", "agent")
     def show_output(self):
         """ Show result from command execution
         """
@@ -477,34 +1559,122 @@ class Agent(object):
         errors      = self.output.get("err")
         return_code = self.output.get("code")
 
+        if self.output.get("streamed"):
+            print self.LOGAN_STREAMED_OUTPUT_TEMPLATE.format(action_cmd, return_code,
+                                                             self.output.get("out_bytes"),
+                                                             self.output.get("err_bytes"),
+                                                             errors)
+            return
+
         print self.LOGAN_OUTPUT_TEMPLATE.format(action_cmd, return_code, errors, output)
 
     # ------------------------------------------------------------------------------
 
+    @traced("Agent.process", "agent")
     def process(self, command):
         """ Executes the command entered by the user
+
+            Returns:
+                The return code of the performed action
         """
 
-        # 1. Check command syntax
-        syntax_ok = self.check_action_command_syntax(command)
+        from fanout import is_fanout
 
-        if syntax_ok:
+        # 0. Fan-outs run every context at once (pipelines are split from
+        #    the command line, @see process_pipeline)
+        if is_fanout(command):
+            return self.process_fanout(command)
 
-            # 2.1 Extract action inputs from command
-            self.get_actions_inputs_from_command(command)
+        # 1. Check command syntax, extract action inputs and find the
+        #    action to perform in a single pass (the config is loaded
+        #    only when the dispatcher or the action index are stale)
+        try:
+            action = self.dispatch_command(command)
 
-            # 2.2 Load config
-            cached_config = self.load_config()
+        except LoganActionSyntaxError:
+            # TODO: Writes 'Show_help' method
+            print "Wrong syntax : Unable to run the command"
 
-            # 3. Find the action to perform
-            action = self.find_action()
+            return ReturnCodes.FAIL
 
-            # 4. Perform action
-            self.output = self.performs(action)
+        except LoganActionNotFoundError as e:
+            # Also lists the candidates of an ambiguous action
+            print "[LOGAN] : {}".format(e)
 
-            # 5. show output
-            self.show_output()
+            return ReturnCodes.FAIL
 
-        else:
-            # TODO: Writes 'Show_help' method
-            print "Wrong syntax : Unable to run the command"
\ No newline at end of file
+        # 2. Perform action
+        self.output = self.performs(action)
+
+        # 3. show output
+        self.show_output()
+
+        return self.output.get("code")
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.process_pipeline", "agent")
+    def process_pipeline(self, commands):
+        """ Executes a pipeline of commands entered by the user
+
+            Args:
+                commands: Commands of the stages
+                          Eg: ['list:files:usr /tmp', 'filter:lines foo']
+
+            Returns:
+                The return code of the last stage
+        """
+
+        from pipeline import Pipeline, PIPELINE_SEPARATOR
+
+        command  = " {} ".format(PIPELINE_SEPARATOR).join(commands)
+        pipeline = Pipeline(self, commands)
+
+        try:
+            self.output = pipeline.run()
+        except (LoganActionSyntaxError, LoganActionNotFoundError, LoganActionPathMissingError) as e:
+            print "Wrong pipeline : {}".format(e)
+            return ReturnCodes.FAIL
+
+        self.command = command
+        self.show_output()
+
+        for stage in self.output.get("stages"):
+            print self.LOGAN_PIPELINE_STAGE_TEMPLATE.format(**stage)
+
+        return self.output.get("code")
+
+    # ------------------------------------------------------------------------------
+
+    @traced("Agent.process_fanout", "agent")
+    def process_fanout(self, command, all_contexts=False, mode=None, jobs=None):
+        """ Executes the action of a command in many contexts at once
+
+            Eg: 'restart:server:{aws,gcp} now', 'restart:server:* now'
+
+            Args:
+                command:        @see fanout.FanOut.resolve
+                all_contexts:   Runs the action in every context
+                mode:           @see fanout.FanOut
+                jobs:           Actions running at the same time
+
+            Returns:
+                The return code of the fan-out, @see fanout.FanOut.run
+        """
+
+        from engine import AsyncAgent
+        from fanout import FanOut
+
+        runner = AsyncAgent(self.root_dir, concurrency=jobs or self.LOGAN_FANOUT_JOBS)
+        runner.share_config(self)
+
+        try:
+            return_code, results = FanOut(runner, mode, sys.stdout).run(command, all_contexts)
+        except (LoganActionSyntaxError, LoganActionNotFoundError, LoganActionPathMissingError) as e:
+            print "Wrong fan-out : {}".format(e)
+            return ReturnCodes.FAIL
+
+        self.command = command
+        self.output  = {"results": results, "code": return_code}
+
+        return return_code
\ No newline at end of file
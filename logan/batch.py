@@ -0,0 +1,360 @@
+"""
+BATCH : Runs many logan commands against a single loaded config
+
+'logan batch FILE|-' reads one command per line, either as plain text
+('list:files:usr -ltr') or as a JSON object ('{"command": "..."}', the
+JSONL format). Every command is resolved up front by one Agent, then
+actions run on a bounded pool of concurrent processes.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import ReturnCodes as return_codes
+import subprocess
+import tempfile
+import select
+import signal
+import errno
+import fcntl
+import json
+import time
+import sys
+import os
+
+
+# Seconds between two looks at the running actions, growing while none exits,
+# when they can't be waited for with SIGCHLD (outside of the main thread)
+BATCH_POLL_MIN_INTERVAL = 0.001
+BATCH_POLL_MAX_INTERVAL = 0.05
+
+
+# ================
+# HELPERS
+# ================
+
+def read_batch_commands(lines):
+    """ Extracts the commands of a batch
+
+        Empty lines and lines starting with '#' are ignored.
+
+        Args:
+            lines: Iterable of lines. Eg: a file object
+
+        Returns:
+            List of commands. Eg: ["list:files:usr -ltr", ...]
+
+        Raises:
+            ValueError: A JSON line has neither a 'command' nor an 'argv'
+    """
+
+    commands = []
+
+    for number, line in enumerate(lines, 1):
+
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("{"):
+            entry = json.loads(line)
+            line  = entry.get("command") or " ".join(entry.get("argv") or [])
+
+            if not line:
+                raise ValueError("line {} has neither a 'command' nor an 'argv'".format(number))
+
+        commands.append(line)
+
+    return commands
+
+# ------------------------------------------------------------------------------
+
+def wait_any(processes):
+    """ Waits for one of the given processes to exit
+
+        Only these processes are reaped: the other children of the
+        current process (an AsyncAgent, a pipeline, a background job
+        worker...) are left to their owner. Their exits are not polled
+        for but waited for, @see ChildExits
+
+        Args:
+            processes: Dict mapping pids to Popen objects
+
+        Returns:
+            The pid of an exited process, its Popen has its return code
+            (negative signal number when the process has been killed)
+    """
+
+    with ChildExits() as child_exits:
+
+        while True:
+
+            for pid, process in processes.iteritems():
+                if process.poll() is not None:
+                    return pid
+
+            child_exits.wait()
+
+# ------------------------------------------------------------------------------
+
+def read_and_close(file):
+
+    file.seek(0)
+    data = file.read()
+    file.close()
+
+    return data
+
+
+# ================
+# CLASSES
+# ================
+
+class ChildExits(object):
+    """ Waits for a child process to exit, without reaping it
+
+        A SIGCHLD handler writes to a pipe (signal.set_wakeup_fd) that
+        'wait' selects on. A child exiting between a look at the processes
+        and 'wait' has already written to the pipe: its exit is not missed.
+
+        Signal handlers can only be set from the main thread: elsewhere,
+        'wait' sleeps for a growing interval instead.
+
+        Usage:
+            with ChildExits() as child_exits:
+                while not exited():
+                    child_exits.wait()
+    """
+
+    def __enter__(self):
+
+        self.interval = BATCH_POLL_MIN_INTERVAL
+        self.pipe     = None
+
+        try:
+            self.previous_handler = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        except ValueError:
+            return self
+
+        # Calls interrupted by SIGCHLD are restarted
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+        self.pipe = os.pipe()
+
+        for fd in self.pipe:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        self.previous_fd = signal.set_wakeup_fd(self.pipe[1])
+
+        return self
+
+    # ------------------------------------------------------------------------------
+
+    def __exit__(self, type, value, traceback):
+
+        if self.pipe is None:
+            return
+
+        signal.set_wakeup_fd(self.previous_fd)
+        signal.signal(signal.SIGCHLD, self.previous_handler)
+
+        for fd in self.pipe:
+            os.close(fd)
+
+    # ------------------------------------------------------------------------------
+
+    def wait(self):
+        """ Returns once a child process may have exited
+        """
+
+        if self.pipe is None:
+            time.sleep(self.interval)
+
+            # Long running actions are looked at less often
+            self.interval = min(self.interval * 2, BATCH_POLL_MAX_INTERVAL)
+            return
+
+        try:
+            select.select([self.pipe[0]], [], [])
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+        try:
+            os.read(self.pipe[0], 4096)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+# ------------------------------------------------------------------------------
+
+class BatchRunner(object):
+    """ Runs the commands of a batch on a pool of 'jobs' concurrent processes
+
+        Args:
+            agent:   Agent used to resolve every command
+            jobs:    Maximum number of actions running at the same time
+            ordered: Shows results in the batch order (True) or as soon
+                     as each action is done (False)
+            output:  File object receiving the results (None to hide them)
+            format:  "text" or "json" (one JSON record per line)
+    """
+
+    # Output template of one command result
+    LOGAN_BATCH_OUTPUT_TEMPLATE = "[{index}] {command} => {code} ({duration:.3f}s)\n{err}{out}"
+
+    def __init__(self, agent, jobs=4, ordered=True, output=sys.stdout, format="text"):
+
+        self.agent   = agent
+        self.jobs    = max(1, jobs)
+        self.ordered = ordered
+        self.output  = output
+        self.format  = format
+
+    # ------------------------------------------------------------------------------
+
+    def resolve(self, commands):
+        """ Resolves every command of the batch against the agent config
+
+            Returns:
+                List of result records, one per command:
+                {
+                    "index"  : 0,
+                    "command": "list:files:usr -ltr",
+                    "args"   : ["/.../actions/usr/ls", "-ltr"],
+                    "code"   : None,
+                    "error"  : None
+                }
+        """
+
+        records = []
+
+        for index, command in enumerate(commands):
+
+            record = {
+                "index"   : index,
+                "command" : command,
+                "args"    : None,
+                "code"    : None,
+                "out"     : "",
+                "err"     : "",
+                "duration": 0.0,
+                "error"   : None
+            }
+
+            try:
+                action, record["args"] = self.agent.resolve_command(command)
+            except Exception as e:
+                record["error"] = str(e)
+                record["err"]   = "[LOGAN] : {}\n".format(e)
+                record["code"]  = return_codes.FAIL
+
+            records.append(record)
+
+        return records
+
+    # ------------------------------------------------------------------------------
+
+    def start(self, record):
+        """ Starts the action of a record, its output goes to temporary files
+            so that a chatty action never blocks on a full pipe
+        """
+
+        out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+
+        process = subprocess.Popen(record["args"], shell=False, stdout=out, stderr=err, close_fds=True)
+
+        record["start"] = time.time()
+
+        return process, out, err
+
+    # ------------------------------------------------------------------------------
+
+    def run(self, commands):
+        """ Runs the batch
+
+            Args:
+                commands: List of commands. @see read_batch_commands
+
+            Returns:
+                Tuple as (return_code, records): return_code is OK only if
+                every command succeeded
+        """
+
+        records = self.resolve(commands)
+        pending = [record for record in records if record["error"] is None]
+        running = {}
+
+        self.shown = 0
+
+        # Results of commands that couldn't be resolved are known already
+        for record in records:
+            if record["error"] is not None:
+                self.done(records, record)
+
+        while pending or running:
+
+            while pending and len(running) < self.jobs:
+                record = pending.pop(0)
+                try:
+                    process, out, err = self.start(record)
+                except OSError as e:
+                    record["error"] = str(e)
+                    record["err"]   = "[LOGAN] : {}\n".format(e)
+                    record["code"]  = return_codes.FAIL
+                    self.done(records, record)
+                    continue
+                running[process.pid] = (record, process, out, err)
+
+            if not running:
+                continue
+
+            record, process, out, err = running.pop(wait_any(dict(
+                (pid, process) for pid, (record, process, out, err) in running.iteritems()
+            )))
+
+            record["code"]     = process.returncode
+            record["duration"] = time.time() - record.pop("start")
+            record["out"]      = read_and_close(out)
+            record["err"]      = read_and_close(err)
+
+            self.done(records, record)
+
+        failed = any(record["code"] != return_codes.OK for record in records)
+
+        return (return_codes.FAIL if failed else return_codes.OK), records
+
+    # ------------------------------------------------------------------------------
+
+    def done(self, records, record):
+        """ Shows the result of a finished record, and in ordered mode the
+            following ones that were waiting for it
+        """
+
+        if not self.ordered:
+            self.show(record)
+            return
+
+        while self.shown < len(records) and records[self.shown]["code"] is not None:
+            self.show(records[self.shown])
+            self.shown += 1
+
+    # ------------------------------------------------------------------------------
+
+    def show(self, record):
+
+        if self.output is None:
+            return
+
+        if self.format == "json":
+            result = dict((key, value) for key, value in record.iteritems() if key != "args")
+            result["out"] = record["out"].decode("utf-8", "replace")
+            result["err"] = record["err"].decode("utf-8", "replace")
+
+            self.output.write(json.dumps(result) + "\n")
+        else:
+            self.output.write(self.LOGAN_BATCH_OUTPUT_TEMPLATE.format(**record))
+
+        self.output.flush()
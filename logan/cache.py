@@ -0,0 +1,218 @@
+"""
+CACHE : Concurrency-safe cache of the config and of what is built from it
+
+Each key is stored in its own file next to the config files:
+
+    <root>/logan.cache.layers.db
+    <root>/logan.cache.dispatcher.db
+    ...
+
+Writers pickle the value into a temporary file of the same directory and
+rename it over the entry: the rename is atomic, readers never lock and
+always get either the previous or the new value, never a partial one.
+
+Rebuilding an entry (after the config changed) is serialized by an
+advisory lock on '<root>/<key>.lock': the first process rebuilds while
+the others wait for it, then read what it has published instead of
+rebuilding it again. A process waiting longer than the lock timeout
+rebuilds on its own.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from exceptions import LoganCacheError
+from contextlib import contextmanager
+from tracing import traced, span
+from os import path
+from thread import get_ident
+import cPickle
+import fcntl
+import errno
+import time
+import os
+
+
+# Extensions of the entry and lock files of a key
+CACHE_ENTRY_EXTENSION = ".db"
+CACHE_LOCK_EXTENSION  = ".lock"
+
+# Seconds waited for the lock of a key before rebuilding it anyway
+CACHE_LOCK_TIMEOUT = 10.0
+
+# Seconds between two attempts to get the lock of a key
+CACHE_LOCK_INTERVAL = 0.005
+
+# Errors of an entry that can't be read back (truncated, written by
+# another version of logan, ...): it is just missing
+CACHE_READ_ERRORS = (IOError, OSError, EOFError, ValueError, TypeError, IndexError,
+                     AttributeError, ImportError, cPickle.UnpicklingError)
+
+
+class ConfigCache(object):
+    """ Dict-like cache storing every key in its own file
+
+        Args:
+            cache_dir: Directory of the entry files (the logan root directory)
+    """
+
+    def __init__(self, cache_dir):
+
+        self.cache_dir = cache_dir
+
+    # ------------------------------------------------------------------------------
+
+    def get_entry_path(self, key):
+
+        return path.join(self.cache_dir, key + CACHE_ENTRY_EXTENSION)
+
+    # ------------------------------------------------------------------------------
+
+    def get_lock_path(self, key):
+
+        return path.join(self.cache_dir, key + CACHE_LOCK_EXTENSION)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ConfigCache.get", "cache")
+    def get(self, key, default=None):
+        """ Reads the value of a key, without locking
+
+            Returns:
+                The value or 'default' when the key is missing or its
+                entry can't be read
+        """
+
+        try:
+            with open(self.get_entry_path(key), "rb") as entry_file:
+                return cPickle.load(entry_file)
+        except CACHE_READ_ERRORS:
+            return default
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ConfigCache.put", "cache")
+    def put(self, key, value):
+        """ Publishes the value of a key, atomically
+
+            Raises:
+                LoganCacheError: The value can't be pickled or written
+        """
+
+        # Unique to the writing thread
+        tmp_path = "{}.{}.{}.tmp".format(self.get_entry_path(key), os.getpid(), get_ident())
+
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                cPickle.dump(value, tmp_file, cPickle.HIGHEST_PROTOCOL)
+
+            # Readers see the previous entry until this point
+            os.rename(tmp_path, self.get_entry_path(key))
+
+        except (IOError, OSError, cPickle.PicklingError, TypeError) as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise LoganCacheError("Logan : Unable to cache '%s' in %s (%s)" % (key, self.cache_dir, e))
+
+    # ------------------------------------------------------------------------------
+
+    def delete(self, key):
+        """ Removes a key
+
+            Returns:
+                Boolean: Whether or not the key was present
+        """
+
+        try:
+            os.remove(self.get_entry_path(key))
+        except OSError:
+            return False
+
+        return True
+
+    # ------------------------------------------------------------------------------
+
+    @contextmanager
+    def locked(self, key, timeout=CACHE_LOCK_TIMEOUT):
+        """ Holds the advisory lock of a key, to be the only process
+            rebuilding it
+
+            Usage:
+                with cache.locked("logan.cache.layers"):
+                    value = cache.get("logan.cache.layers")   # maybe rebuilt meanwhile
+                    if not is_fresh(value):
+                        cache.put("logan.cache.layers", rebuild())
+
+            Yields:
+                Boolean: Whether or not the lock has been acquired ('False'
+                when it couldn't be created or after 'timeout' seconds)
+        """
+
+        try:
+            lock_file = open(self.get_lock_path(key), "a")
+        except IOError:
+            yield False
+            return
+
+        acquired = False
+        deadline = time.time() + timeout
+
+        with span("cache lock", "cache", {"key": key}):
+            while True:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except IOError as e:
+                    if e.errno not in (errno.EAGAIN, errno.EACCES) or time.time() >= deadline:
+                        break
+                time.sleep(CACHE_LOCK_INTERVAL)
+
+        try:
+            yield acquired
+        finally:
+            # Closing the file releases the lock
+            lock_file.close()
+
+    # ------------------------------------------------------------------------------
+    # Same interface as the 'shelve' the cache used to be
+
+    def __getitem__(self, key):
+
+        missing = object()
+        value   = self.get(key, missing)
+
+        if value is missing:
+            raise KeyError(key)
+
+        return value
+
+    # ------------------------------------------------------------------------------
+
+    def __setitem__(self, key, value):
+
+        self.put(key, value)
+
+    # ------------------------------------------------------------------------------
+
+    def __delitem__(self, key):
+
+        if not self.delete(key):
+            raise KeyError(key)
+
+    # ------------------------------------------------------------------------------
+
+    def has_key(self, key):
+
+        return path.exists(self.get_entry_path(key))
+
+    __contains__ = has_key
+
+    # ------------------------------------------------------------------------------
+
+    def close(self):
+
+        pass
@@ -8,20 +8,29 @@ Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
 
 from . import __usage__ as __doc__
 from . import __version__
-from lib.docopt import docopt
 from utils import random_string_in, ReturnCodes as return_codes
-from subprocess import check_call as exec_cmd
 from os import path
 import sys
+import os
 
 
 
 # ROOT_DIR = "/"
 __LOGAN_MODULE_PATH     = path.dirname(__file__)                            # '/logan'
 __LOGAN_ROOT__          = path.dirname(__LOGAN_MODULE_PATH)                 # '/'
-__LOGAN_BIN__           = "python {}".format(__LOGAN_MODULE_PATH)           # 'python /logan
+__LOGAN_BIN__           = [sys.executable,                                  # ['python', '/bin/logan']
+                           path.join(path.abspath(__LOGAN_ROOT__), "bin", "logan")]
 __LOGAN_LOG_FILE_PATH__ = path.join(__LOGAN_ROOT__, "logs", "logan.log")    # /logan/logs/logan.log
 
+# Options running the action in many contexts
+FANOUT_OPTIONS = ("--all-contexts", "--first-success", "--fail-fast")
+
+# Options giving a number of actions or workers
+COUNT_OPTIONS = ("--jobs", "--workers")
+
+# Agent processing the commands when it is kept warm by the daemon, @see use_agent
+__LOGAN_AGENT__ = None
+
 
 
 def show_help():
@@ -45,42 +54,276 @@ def apologize():
 
 # ------------------------------------------------------------------------------
 
-def sh(arguments, output=None):
+def use_agent(agent):
+    """ Makes the commands run by an agent already loaded (the warm
+        agent of the daemon) instead of a new one
+    """
+
+    global __LOGAN_AGENT__
+
+    __LOGAN_AGENT__ = agent
+
+# ------------------------------------------------------------------------------
+
+def get_agent(no_cache=False):
+    """ Gets the agent processing the commands: the one given to
+        'use_agent' or a new one for $LOGAN_ROOT
+
+        Args:
+            no_cache: Bypasses the results cache ('--no-cache')
+
+        Returns:
+            An Agent
+    """
+
+    if __LOGAN_AGENT__ is not None:
+        # The environment and the options are the ones of the current command
+        __LOGAN_AGENT__.read_environ()
+        __LOGAN_AGENT__.use_result_cache = __LOGAN_AGENT__.use_result_cache and not no_cache
+        return __LOGAN_AGENT__
+
+    from agent import Agent
+
+    return Agent(os.environ.get("LOGAN_ROOT"), no_cache=no_cache)
+
+# ------------------------------------------------------------------------------
+
+def get_command(arguments):
+    """ Builds the logan command entered by the user
+
+        Eg: {"<action>": "create:file", "<params>": "file.txt"} => 'create:file file.txt'
+    """
+
+    return " ".join(arg for arg in (arguments.get("<action>"), arguments.get("<params>")) if arg)
+
+# ------------------------------------------------------------------------------
+
+def get_stages(argv):
+    """ Splits the command line of a pipeline on its '|' arguments
+
+        Eg: ['say:hello:usr', 'world', '|', 'upper:case:usr'] =>
+            (['say:hello:usr', 'world'], ['upper:case:usr'])
+
+        Returns:
+            Tuple as (argv, stages): the arguments of the first stage,
+            parsed like any command line, and the commands of the next
+            stages (empty when the command line is not a pipeline)
+    """
+
+    from pipeline import is_pipeline, split_pipeline, stage_command
+
+    if not is_pipeline(argv):
+        return argv, []
+
+    stages = split_pipeline(argv)
+
+    return stages[0], [stage_command(args) for args in stages[1:]]
+
+# ------------------------------------------------------------------------------
+
+def sh(arguments, output=None, stages=()):
     """ Helper that run logan command from the terminal
 
-        Eg: running exec_cmd("create:file file.txt") will execute the unix command
-            'python /logan create:file file.txt' equivalent to the logan command
-            'logan create:file file.txt'.
+        The command is processed by an Agent of the current interpreter.
+        With '--subprocess', it is run by a new logan process, as logan
+        used to do.
+
+        Args:
+            arguments: Parsed command line. @see parse
+            output:    File object receiving the output (default to sys.stdout)
+            stages:    Commands of the next stages of a pipeline. @see get_stages
+
+        Returns:
+            The return code of the command
+    """
+
+    command = get_command(arguments)
+
+    if stages and (arguments.get("--background") or any(arguments.get(option) for option in FANOUT_OPTIONS)):
+        print >> (output or sys.stdout), "[LOGAN] : A pipeline runs in the foreground and in a single context"
+        return return_codes.FAIL
+
+    if arguments.get("--background"):
+        return background(command, arguments, output)
+
+    if any(arguments.get(option) for option in FANOUT_OPTIONS):
+        return fanout(command, arguments, output)
+
+    no_cache = bool(arguments.get("--no-cache"))
+
+    if arguments.get("--subprocess"):
+        return spawn(command, output, stages, no_cache)
+
+    if stages:
+        return pipe([command] + list(stages), output)
+
+    return dispatch(command, output, no_cache)
+
+# ------------------------------------------------------------------------------
+
+def dispatch(command, output=None, no_cache=False):
+    """ Processes the command in the current interpreter
 
         Args:
-            cmd: command as string. Eg: 'create:file file.txt'
+            command:  Eg: 'create:file file.txt'
+            output:   File object receiving the output (default to sys.stdout)
+            no_cache: @see get_agent
     """
 
-    args = arguments["command"] # Extract the command from 'arguments'
+    stdout, stderr = sys.stdout, sys.stderr
 
-    # Build command args array in the scope of logan cli.
-    # Eg: For a command 'create:file file.txt'
-    #       => ['python /logan', 'create:file', 'file.txt']
-    command = [__LOGAN_BIN__]
-    command.extend(args.split())
+    if output is not None:
+        sys.stdout = sys.stderr = output
 
-    return_code = try_execute_or_apologize(command, output)
+    try:
+        return_code = get_agent(no_cache).process(command)
+
+    # TODO: Deals with other errors from different use cases
+    except Exception as e:
+        print "[LOGAN] : {}".format(apologize())
+        return_code = return_codes.FAIL
+
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
 
     return return_code
 
 # ------------------------------------------------------------------------------
 
-def try_execute_or_apologize(command, output):
+def pipe(commands, output=None):
+    """ Processes the stages of a pipeline in the current interpreter
+
+        Args:
+            commands: Commands of the stages. Eg: ['say:hello:usr world', 'upper:case:usr']
+            output:   File object receiving the output (default to sys.stdout)
+    """
+
+    stdout, stderr = sys.stdout, sys.stderr
+
+    if output is not None:
+        sys.stdout = sys.stderr = output
+
+    try:
+        return_code = get_agent().process_pipeline(commands)
+
+    except Exception as e:
+        print "[LOGAN] : {}".format(apologize())
+        return_code = return_codes.FAIL
+
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    return return_code
+
+# ------------------------------------------------------------------------------
+
+def fanout(command, arguments, output=None):
+    """ Runs the action in many contexts ('--all-contexts', '--first-success'
+        or '--fail-fast'), always in the current interpreter
+
+        Args:
+            command:    Eg: 'restart:server:{aws,gcp} now'
+            arguments:  Parsed command line. @see parse
+            output:     File object receiving the output (default to sys.stdout)
+    """
+
+    from fanout import FANOUT_FIRST_SUCCESS, FANOUT_FAIL_FAST
+
+    mode = FANOUT_FIRST_SUCCESS if arguments.get("--first-success") else \
+           FANOUT_FAIL_FAST     if arguments.get("--fail-fast")     else None
+
+    stdout, stderr = sys.stdout, sys.stderr
+
+    if output is not None:
+        sys.stdout = sys.stderr = output
+
+    try:
+        return_code = get_agent().process_fanout(
+            command,
+            all_contexts = bool(arguments.get("--all-contexts")),
+            mode         = mode,
+            jobs         = int(arguments.get("--jobs") or 4)
+        )
+
+    except Exception as e:
+        print "[LOGAN] : {}".format(apologize())
+        return_code = return_codes.FAIL
+
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    return return_code
+
+# ------------------------------------------------------------------------------
+
+def background(command, arguments, output=None):
+    """ Queues the command as a background job ('--background')
+    """
+
+    stdout, stderr = sys.stdout, sys.stderr
+
+    if output is not None:
+        sys.stdout = sys.stderr = output
+
+    try:
+        return_code = get_agent().process_background(
+            command, jobs=int(arguments.get("--jobs") or 4)
+        )
+
+    except Exception as e:
+        print "[LOGAN] : {}".format(apologize())
+        return_code = return_codes.FAIL
+
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    return return_code
+
+# ------------------------------------------------------------------------------
+
+def spawn(command, output=None, stages=(), no_cache=False):
+    """ Runs the command in a new logan process ('--subprocess' mode)
+
+        Eg: spawn("create:file file.txt") executes
+            ['python', '/logan/bin/logan', 'create:file', 'file.txt']
+
+        Args:
+            stages:   Commands of the next stages of a pipeline, @see sh
+            no_cache: @see get_agent
+    """
+
+    from pipeline import PIPELINE_SEPARATOR
+
+    args = __LOGAN_BIN__ + (["--no-cache"] if no_cache else [])
+
+    for index, stage in enumerate([command] + list(stages)):
+
+        if index:
+            args.append(PIPELINE_SEPARATOR)
+
+        # The params stay a single argument, like '<params>' in the usage
+        args.extend(stage.split(" ", 1))
+
+    return try_execute_or_apologize(args, output)
+
+# ------------------------------------------------------------------------------
+
+def try_execute_or_apologize(args, output):
     """ Tries to execute the given command and use the given
         output to show the result of the execution.
 
         Args:
-            command: The one the user entered.
-            output:  Something that holds the result of the command execution.
+            args:   Arguments of the process to run, no shell involved.
+            output: Something that holds the result of the command execution.
     """
 
+    from subprocess import check_call as exec_cmd, CalledProcessError
+
     try:
-        return_code = exec_cmd(command, shell=True, stdout=output, stderr=output)
+        return_code = exec_cmd(args, shell=False, stdout=output, stderr=output)
+
+    except CalledProcessError as e:
+        return_code = e.returncode
 
     # TODO: Deals with other return codes from different use cases
     except Exception as e:
@@ -91,15 +334,279 @@ def try_execute_or_apologize(command, output):
 
 # ------------------------------------------------------------------------------
 
-def parse(command=None):
+def compile_index():
+    """ Compiles the action index of the logan agent ('logan compile')
+    """
+
+    agent = get_agent()
+
+    try:
+        count = agent.compile_index()
+    except Exception as e:
+        print "[LOGAN] : Unable to compile the action index ({})".format(e)
+        return return_codes.FAIL
+
+    print "[LOGAN] : {} actions compiled into {}".format(count, agent.logan_index_path)
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def show_action_help(arguments):
+    """ Shows the help of an action ('logan help <action>')
+    """
+
+    from exceptions import LoganActionSyntaxError, LoganActionNotFoundError
+
+    agent = get_agent()
+
+    try:
+        action_key, help = agent.get_action_help(arguments["<action>"])
+
+    except LoganActionSyntaxError:
+        print "Wrong syntax : Unable to find the action"
+        return return_codes.FAIL
+
+    except LoganActionNotFoundError as e:
+        print "[LOGAN] : {}".format(e)
+        return return_codes.FAIL
+
+    if help is None:
+        print "[LOGAN] : No help for {}".format(action_key)
+    else:
+        print help.rstrip("\n")
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def run_batch(arguments):
+    """ Runs every command of a batch file ('logan batch <file>')
+    """
+
+    from batch import BatchRunner, read_batch_commands
+    from socket import error as socket_error
+
+    file_path = arguments["<file>"]
+
+    try:
+        if file_path == "-":
+            commands = read_batch_commands(sys.stdin)
+        else:
+            with open(file_path) as batch_file:
+                commands = read_batch_commands(batch_file)
+    except (IOError, ValueError) as e:
+        print "[LOGAN] : Unable to read the batch ({})".format(e)
+        return return_codes.FAIL
+
+    ordered = not arguments["--as-completed"]
+    format  = "json" if arguments["--json"] else "text"
+
+    # Distributed to the workers connecting to this address
+    if arguments.get("--listen"):
+        from cluster import BatchCoordinator, get_token, CLUSTER_TOKEN_ENV_VARIABLE
+
+        try:
+            runner = BatchCoordinator(arguments["--listen"], int(arguments["--workers"] or 1), ordered, format=format)
+        except (socket_error, ValueError) as e:
+            print "[LOGAN] : Unable to listen on {} ({})".format(arguments["--listen"], e)
+            return return_codes.FAIL
+
+        print >> sys.stderr, "[LOGAN] : Waiting for workers on {}:{}".format(*runner.address)
+
+        # Made up: the workers need it
+        if get_token() is None:
+            print >> sys.stderr, "[LOGAN] : Workers must run with {}={}".format(CLUSTER_TOKEN_ENV_VARIABLE,
+                                                                                runner.token)
+
+    else:
+        runner = BatchRunner(get_agent(), int(arguments["--jobs"] or 4), ordered, format=format)
+
+    return_code, records = runner.run(commands)
+
+    return return_code
+
+# ------------------------------------------------------------------------------
+
+def run_worker(arguments):
+    """ Runs the batch commands sent by a coordinator ('logan worker <address>')
+    """
+
+    from engine import AsyncAgent
+    from cluster import BatchWorker
+    import socket
+
+    agent = AsyncAgent(os.environ.get("LOGAN_ROOT"), concurrency=int(arguments["--jobs"] or 4))
+
+    try:
+        count = BatchWorker(agent, arguments["<address>"]).run()
+    except (socket.error, ValueError) as e:
+        print "[LOGAN] : Unable to reach the coordinator {} ({})".format(arguments["<address>"], e)
+        return return_codes.FAIL
+
+    print "[LOGAN] : {} commands run".format(count)
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def list_jobs():
+    """ Lists the last background jobs ('logan jobs')
+    """
+
+    for job in get_agent().get_job_queue().list():
+        print "{id:>6}  {state:<8} {code:>4}  {command}".format(**dict(
+            job, code="-" if job["code"] is None else job["code"]
+        ))
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def show_job(arguments):
+    """ Shows the state of a background job and its output so far ('logan job <id>')
+    """
+
+    from exceptions import LoganJobNotFoundError
+
+    queue = get_agent().get_job_queue()
+
+    try:
+        job = queue.get(arguments["<id>"])
+    except LoganJobNotFoundError as e:
+        print "[LOGAN] : {}".format(e)
+        return return_codes.FAIL
+
+    print "[LOGAN] : Job {id} {state} (code: {code}, attempts: {attempts}) : {command}".format(**job)
+
+    if job["error"]:
+        print "[LOGAN] : {}".format(job["error"])
+
+    out, err = queue.read_output(job["id"])
+
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def wait_job(arguments):
+    """ Shows the output of a background job as it arrives, until the
+        job is done ('logan wait <id>')
+
+        Returns:
+            The return code of the job
+    """
+
+    from exceptions import LoganJobNotFoundError
+    from jobs import spawn_worker, JOB_QUEUED, JOB_RUNNING, JOB_FINISHED_STATES, JOB_POLL_INTERVAL, \
+                     JOB_SPAWN_GRACE
+    import time
+
+    agent    = get_agent()
+    queue    = agent.get_job_queue()
+    offsets  = [0, 0]
+    attempts = None
+    orphaned = None     # since when the queued job has no worker
+
+    while True:
+
+        try:
+            job = queue.get(arguments["<id>"])
+        except LoganJobNotFoundError as e:
+            print "[LOGAN] : {}".format(e)
+            return return_codes.FAIL
+
+        # Run again: its output files are written from the start. Its
+        # first run may have written some already (claimed since 'get')
+        if attempts and job["attempts"] != attempts:
+            sys.stderr.write("[LOGAN] : Job {} is run again (attempt {})\n".format(job["id"], job["attempts"]))
+            offsets = [0, 0]
+
+        attempts = job["attempts"]
+
+        # Read after the state: the output of a finished job is complete
+        for index, (chunk, stream) in enumerate(zip(queue.read_output(job["id"], offsets), (sys.stdout, sys.stderr))):
+            stream.write(chunk)
+            stream.flush()
+            offsets[index] += len(chunk)
+
+        if job["state"] in JOB_FINISHED_STATES:
+            break
+
+        workers = queue.get_workers()
+
+        # Its worker died: the job is queued again for a new one
+        if job["state"] == JOB_RUNNING and job["worker"] not in workers:
+            queue.recover()
+            spawn_worker(agent, queue)
+
+        # The worker started with the job may not have registered yet
+        elif job["state"] == JOB_QUEUED and not workers:
+            orphaned = orphaned or time.time()
+
+            if time.time() - orphaned >= JOB_SPAWN_GRACE:
+                spawn_worker(agent, queue)
+                orphaned = None
+
+        else:
+            orphaned = None
+
+        time.sleep(JOB_POLL_INTERVAL)
+
+    if job["error"]:
+        print "[LOGAN] : Job {} failed : {}".format(job["id"], job["error"])
+
+    return job["code"] if job["code"] is not None else return_codes.FAIL
+
+# ------------------------------------------------------------------------------
+
+def drain_jobs(arguments):
+    """ Runs the queued background jobs until the queue stays empty ('logan drain')
+    """
+
+    from jobs import JobWorker
+
+    agent = get_agent()
+    count = JobWorker(agent, agent.get_job_queue(), int(arguments["--jobs"] or 4)).run()
+
+    print "[LOGAN] : {} jobs run".format(count)
+
+    return return_codes.OK
+
+# ------------------------------------------------------------------------------
+
+def check_counts(arguments):
+    """ Checks the options giving a number of actions or workers
+
+        Returns:
+            Boolean: Whether or not every given count is a positive number
+    """
+
+    for option in COUNT_OPTIONS:
+
+        value = arguments.get(option)
+
+        if value is not None and not (value.isdigit() and int(value) > 0):
+            print "[LOGAN] : {} must be a positive number, not '{}'".format(option, value)
+            return False
+
+    return True
+
+# ------------------------------------------------------------------------------
+
+def parse(command=None, argv=None):
     """ Execute the command from user inputs
 
-        It uses 'sys.argv' to take inputs from user
+        It uses 'sys.argv' to take inputs from user (or 'argv', the first
+        stage of a pipeline). The usage grammar is precompiled and the
+        common '<action> <params>' form skips docopt. @see grammar.parse
     """
 
-    arguments = docopt(__doc__, version=__version__)
+    import grammar
 
-    print(arguments)
+    arguments = grammar.parse(__doc__, sys.argv[1:] if argv is None else argv, version=__version__)
 
     return arguments
 
@@ -115,10 +622,40 @@ def run(command=None, output=None):
     if command:
         command = sys.argv
 
-    arguments = parse(command)
+    # The stages of a pipeline are split on the real arguments
+    argv, stages = get_stages(sys.argv[1:])
+
+    arguments = parse(command, argv)
+
+    if not check_counts(arguments):
+        exit(return_codes.FAIL)
+
+    if arguments.get("compile"):
+        exit(compile_index())
+
+    if arguments.get("batch"):
+        exit(run_batch(arguments))
+
+    if arguments.get("help"):
+        exit(show_action_help(arguments))
+
+    if arguments.get("jobs"):
+        exit(list_jobs())
+
+    if arguments.get("job"):
+        exit(show_job(arguments))
+
+    if arguments.get("wait"):
+        exit(wait_job(arguments))
+
+    if arguments.get("drain"):
+        exit(drain_jobs(arguments))
+
+    if arguments.get("worker"):
+        exit(run_worker(arguments))
 
-    # Tries to execute user's entered command
-    return_code = sh(arguments, output)
+    # Executes user's entered command
+    return_code = sh(arguments, output, stages)
 
     # Exit with the return code, result of the command execution
     exit(return_code)
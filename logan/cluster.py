@@ -0,0 +1,596 @@
+"""
+CLUSTER : Distributes the commands of a batch to logan workers over TCP
+
+    host-a$ LOGAN_CLUSTER_TOKEN=s3cret logan batch commands.txt --listen=0.0.0.0:7070 --workers=3
+    host-b$ LOGAN_CLUSTER_TOKEN=s3cret logan worker host-a:7070 --jobs=8
+    host-c$ LOGAN_CLUSTER_TOKEN=s3cret logan worker host-a:7070 --jobs=8
+    ...
+
+The coordinator ('batch --listen') shards the commands of the batch
+among the workers once enough of them are connected, then hands each
+worker the commands of its shard as it has free slots. A worker whose
+shard is done steals the last commands of the largest other shard, so
+fast workers keep busy until the end. Workers joining later start by
+stealing.
+
+A worker resolves every command against its own config and actions
+tree, like a local 'logan' does, runs up to 'jobs' actions at once and
+streams each result back as soon as it is done. The coordinator shows
+them like a local batch does.
+
+The coordinator listens on 127.0.0.1 unless given another host. Workers
+must send the shared token of the coordinator ($LOGAN_CLUSTER_TOKEN) in
+their hello, the others are disconnected: they would get the commands
+of the batch and could send back any result. A coordinator started
+without token makes one up, for its workers to use.
+
+Both sides talk with the length-prefixed JSON frames of the daemon
+(@see daemon.send_message):
+
+    worker      => coordinator  {"type": "hello", "name": "host-b:1234", "slots": 8, "token": "..."}
+    coordinator => worker       {"type": "task", "index": 3, "command": "list:files:usr -ltr"}
+    worker      => coordinator  {"type": "result", "index": 3, "code": 0, "out": "...", ...}
+    worker      => coordinator  {"type": "heartbeat"}
+    coordinator => worker       {"type": "done"}
+
+A worker that closes its connection, or doesn't send anything for
+'heartbeat_timeout' seconds, is dropped: the commands it was running
+are given to the other workers.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from batch import BatchRunner
+from daemon import send_message, recv_message
+from utils import ReturnCodes as return_codes
+from collections import deque
+import binascii
+import socket
+import select
+import errno
+import hmac
+import time
+import sys
+import os
+
+
+# Seconds between two heartbeats of a worker
+CLUSTER_HEARTBEAT_INTERVAL = 1.0
+
+# Seconds of silence after which a worker is dropped
+CLUSTER_HEARTBEAT_TIMEOUT = 5.0
+
+# Host the coordinator listens on when the address has none
+CLUSTER_DEFAULT_HOST = "127.0.0.1"
+
+# Environment variable of the token shared by the coordinator and its workers
+CLUSTER_TOKEN_ENV_VARIABLE = "LOGAN_CLUSTER_TOKEN"
+
+
+# ================
+# HELPERS
+# ================
+
+def parse_address(address, default_host=CLUSTER_DEFAULT_HOST):
+    """ Splits a TCP address
+
+        Args:
+            address: Eg: 'host-a:7070', ':7070' or '7070'
+
+        Returns:
+            Tuple as (host, port)
+
+        Raises:
+            ValueError: The port is not a number
+    """
+
+    host, separator, port = address.rpartition(":")
+
+    return host or default_host, int(port)
+
+# ------------------------------------------------------------------------------
+
+def encode_output(output):
+    """ Output of an action as a JSON string (actions may print any byte)
+    """
+
+    return output.decode("utf-8", "replace")
+
+# ------------------------------------------------------------------------------
+
+def get_token():
+    """ Token shared by the coordinator and its workers ($LOGAN_CLUSTER_TOKEN)
+
+        Returns:
+            String or None when there is none
+    """
+
+    return os.environ.get(CLUSTER_TOKEN_ENV_VARIABLE) or None
+
+# ------------------------------------------------------------------------------
+
+def make_token():
+
+    return binascii.hexlify(os.urandom(16))
+
+# ------------------------------------------------------------------------------
+
+def same_token(token, expected):
+    """ Compares a token sent by a peer, in constant time
+    """
+
+    if not isinstance(token, basestring):
+        return False
+
+    if isinstance(token, unicode):
+        token = token.encode("utf-8")
+
+    return hmac.compare_digest(token, expected)
+
+
+# ================
+# CLASSES
+# ================
+
+class ClusterWorker(object):
+    """ Remote state of a worker, kept by the coordinator
+    """
+
+    def __init__(self, sock, name, slots):
+
+        self.sock      = sock
+        self.name      = name
+        self.slots     = max(1, slots)
+        self.shard     = deque()    # indexes of the commands still to send
+        self.running   = set()      # indexes of the commands sent
+        self.last_seen = time.time()
+
+# ------------------------------------------------------------------------------
+
+class BatchCoordinator(BatchRunner):
+    """ Runs the commands of a batch on remote workers
+
+        Args:
+            address:            Address to listen on. Eg: '0.0.0.0:7070', ':7070'
+                                for 127.0.0.1 (port 0 for any free port, @see address)
+            workers:            Number of workers to wait for before sharding
+            ordered:            @see BatchRunner
+            output:             @see BatchRunner
+            format:             @see BatchRunner
+            heartbeat_timeout:  Seconds of silence after which a worker is dropped
+            token:              Token the workers must send (default to
+                                $LOGAN_CLUSTER_TOKEN, else a new one, @see token)
+    """
+
+    def __init__(self, address, workers=1, ordered=True, output=sys.stdout, format="text",
+                 heartbeat_timeout=CLUSTER_HEARTBEAT_TIMEOUT, token=None):
+
+        super(BatchCoordinator, self).__init__(None, 1, ordered, output, format)
+
+        self.min_workers       = max(1, workers)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.token             = token or get_token() or make_token()
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(parse_address(address))
+        self.listener.listen(64)
+
+        # Actual address, when listening on port 0
+        self.address = self.listener.getsockname()
+
+        self.workers  = {}          # socket => ClusterWorker
+        self.greeting = {}          # socket => (address, deadline) of the connections without hello yet
+        self.pending  = deque()     # indexes of the commands not sharded yet
+        self.sharded = False
+
+    # ------------------------------------------------------------------------------
+
+    def close(self):
+
+        for worker in self.workers.values():
+            self.drop(worker)
+
+        for sock in self.greeting.keys():
+            self.refuse(sock)
+
+        self.listener.close()
+
+    # ------------------------------------------------------------------------------
+
+    def accept(self):
+        """ Accepts a worker connection, its hello is read once it arrives
+            (@see greet)
+        """
+
+        try:
+            sock, address = self.listener.accept()
+        except socket.error:
+            return
+
+        self.greeting[sock] = (address, time.time() + self.heartbeat_timeout)
+
+    # ------------------------------------------------------------------------------
+
+    def greet(self, sock):
+        """ Reads the hello of a connection: it becomes a worker when its
+            token is the right one
+        """
+
+        address, deadline = self.greeting.pop(sock)
+
+        # The rest of a started frame doesn't take long
+        sock.settimeout(CLUSTER_HEARTBEAT_INTERVAL)
+
+        try:
+            hello = recv_message(sock)
+        except (socket.error, ValueError):
+            hello = None
+
+        sock.settimeout(None)
+
+        if not isinstance(hello, dict) or hello.get("type") != "hello" \
+                or not same_token(hello.get("token"), self.token):
+            self.refuse(sock)
+            return
+
+        try:
+            slots = int(hello.get("slots") or 1)
+        except (TypeError, ValueError):
+            slots = 1
+
+        worker = ClusterWorker(sock, hello.get("name") or "{}:{}".format(*address), slots)
+
+        self.workers[sock] = worker
+
+    # ------------------------------------------------------------------------------
+
+    def refuse(self, sock):
+
+        self.greeting.pop(sock, None)
+
+        try:
+            sock.close()
+        except socket.error:
+            pass
+
+    # ------------------------------------------------------------------------------
+
+    def drop(self, worker):
+        """ Closes the connection of a worker, its commands go back to the others
+        """
+
+        if self.workers.pop(worker.sock, None) is None:
+            return
+
+        self.pending.extend(sorted(worker.running))
+        self.pending.extend(worker.shard)
+
+        try:
+            worker.sock.close()
+        except socket.error:
+            pass
+
+    # ------------------------------------------------------------------------------
+
+    def shard(self):
+        """ Splits the pending commands into one contiguous shard per worker
+        """
+
+        workers = sorted(self.workers.values(), key=lambda worker: worker.name)
+        indexes = list(self.pending)
+        size    = (len(indexes) + len(workers) - 1) // len(workers)
+
+        for number, worker in enumerate(workers):
+            worker.shard.extend(indexes[number * size:(number + 1) * size])
+
+        self.pending.clear()
+        self.sharded = True
+
+    # ------------------------------------------------------------------------------
+
+    def next_command(self, worker):
+        """ Takes the next command of a worker: from its shard, else stolen
+            from the end of the largest shard
+
+            Returns:
+                The index of the command or None when there is nothing left
+        """
+
+        if worker.shard:
+            return worker.shard.popleft()
+
+        if self.pending:
+            return self.pending.popleft()
+
+        victim = max(self.workers.values(), key=lambda other: len(other.shard))
+
+        if victim.shard:
+            return victim.shard.pop()
+
+        return None
+
+    # ------------------------------------------------------------------------------
+
+    def feed(self, records):
+        """ Sends commands to the workers having free slots
+        """
+
+        for worker in self.workers.values():
+
+            while len(worker.running) < worker.slots:
+
+                index = self.next_command(worker)
+
+                if index is None:
+                    break
+
+                try:
+                    send_message(worker.sock, {"type": "task", "index": index, "command": records[index]["command"]})
+                except socket.error:
+                    worker.running.add(index)
+                    self.drop(worker)
+                    break
+
+                worker.running.add(index)
+
+    # ------------------------------------------------------------------------------
+
+    def receive(self, worker, records):
+        """ Handles a message of a worker
+        """
+
+        try:
+            message = recv_message(worker.sock)
+        except (socket.error, ValueError):
+            message = None
+
+        if message is None:
+            self.drop(worker)
+            return
+
+        worker.last_seen = time.time()
+
+        if message.get("type") != "result":
+            return
+
+        index = message.get("index")
+
+        if index not in worker.running:
+            return
+
+        worker.running.discard(index)
+
+        record = records[index]
+
+        # Already run by another worker meanwhile
+        if record["code"] is not None:
+            return
+
+        record.update(
+            code     = message.get("code"),
+            out      = (message.get("out") or u"").encode("utf-8"),
+            err      = (message.get("err") or u"").encode("utf-8"),
+            duration = message.get("duration") or 0.0,
+            error    = message.get("error"),
+            worker   = worker.name
+        )
+
+        # Every record must have a code once done
+        if record["code"] is None:
+            record["code"] = return_codes.FAIL
+
+        self.done(records, record)
+
+    # ------------------------------------------------------------------------------
+
+    def run(self, commands, timeout=None):
+        """ Runs the batch on the workers
+
+            Args:
+                commands: @see BatchRunner.run
+                timeout:  Seconds to wait for the results (None for no limit)
+
+            Returns:
+                @see BatchRunner.run, records also tell the "worker" that
+                ran their command
+        """
+
+        records = [
+            {
+                "index"   : index,
+                "command" : command,
+                "code"    : None,
+                "out"     : "",
+                "err"     : "",
+                "duration": 0.0,
+                "error"   : None,
+                "worker"  : None
+            }
+            for index, command in enumerate(commands)
+        ]
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        self.shown = 0
+        self.pending.extend(range(len(records)))
+
+        try:
+            while any(record["code"] is None for record in records):
+
+                if deadline is not None and time.time() >= deadline:
+                    break
+
+                if not self.sharded and len(self.workers) >= self.min_workers:
+                    self.shard()
+
+                if self.sharded:
+                    self.feed(records)
+
+                try:
+                    readable, writable, errors = select.select([self.listener] + self.workers.keys()
+                                                               + self.greeting.keys(), [], [],
+                                                               CLUSTER_HEARTBEAT_INTERVAL)
+                except select.error as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    continue
+
+                for sock in readable:
+                    if sock is self.listener:
+                        self.accept()
+                    elif sock in self.greeting:
+                        self.greet(sock)
+                    elif sock in self.workers:
+                        self.receive(self.workers[sock], records)
+
+                now = time.time()
+
+                for sock, (address, hello_deadline) in self.greeting.items():
+                    if now >= hello_deadline:
+                        self.refuse(sock)
+
+                for worker in self.workers.values():
+                    if now - worker.last_seen > self.heartbeat_timeout:
+                        self.drop(worker)
+
+            for worker in self.workers.values():
+                try:
+                    send_message(worker.sock, {"type": "done"})
+                except socket.error:
+                    pass
+
+        finally:
+            self.close()
+
+        # Commands never run
+        for record in records:
+            if record["code"] is None:
+                record["error"] = "no worker ran it"
+                record["code"]  = return_codes.FAIL
+                self.done(records, record)
+
+        failed = any(record["code"] != return_codes.OK for record in records)
+
+        return (return_codes.FAIL if failed else return_codes.OK), records
+
+# ------------------------------------------------------------------------------
+
+class BatchWorker(object):
+    """ Runs the commands a coordinator sends, on an AsyncAgent
+
+        Args:
+            agent:              AsyncAgent resolving the commands against the
+                                local config, its concurrency is the number
+                                of slots of the worker
+            address:            Address of the coordinator. Eg: 'host-a:7070'
+            name:               Name of the worker in the results (default to
+                                '<hostname>:<pid>')
+            heartbeat_interval: Seconds between two heartbeats
+            token:              Token of the coordinator (default to
+                                $LOGAN_CLUSTER_TOKEN)
+
+        Raises:
+            ValueError: There is no token
+    """
+
+    def __init__(self, agent, address, name=None, heartbeat_interval=CLUSTER_HEARTBEAT_INTERVAL, token=None):
+
+        self.agent              = agent
+        self.address            = parse_address(address, "localhost") if isinstance(address, basestring) else address
+        self.name               = name or "{}:{}".format(socket.gethostname(), os.getpid())
+        self.heartbeat_interval = heartbeat_interval
+        self.token              = token or get_token()
+
+        if self.token is None:
+            raise ValueError("Logan : no cluster token, set ${} to the one of the coordinator"
+                             .format(CLUSTER_TOKEN_ENV_VARIABLE))
+
+        self.jobs = {}      # ActionJob => command index
+
+    # ------------------------------------------------------------------------------
+
+    def send_result(self, sock, job):
+
+        result = job.result()
+
+        send_message(sock, {
+            "type"    : "result",
+            "index"   : self.jobs.pop(job),
+            "code"    : result["code"],
+            "out"     : encode_output(result["out"]),
+            "err"     : encode_output(result["err"]),
+            "duration": (job.finished - job.started) if job.started else 0.0,
+            "error"   : job.error
+        })
+
+    # ------------------------------------------------------------------------------
+
+    def run(self):
+        """ Runs commands until the coordinator is done or gone
+
+            Returns:
+                The number of commands run
+
+            Raises:
+                socket.error: The coordinator can't be reached
+        """
+
+        sock = socket.create_connection(self.address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        count = 0
+
+        try:
+            send_message(sock, {"type": "hello", "name": self.name, "slots": self.agent.concurrency,
+                                "token": self.token})
+
+            heartbeat = time.time()
+
+            while True:
+
+                # Also wakes up for the heartbeat and the action timeouts
+                wait = max(0, heartbeat + self.heartbeat_interval - time.time())
+
+                try:
+                    readable, writable, errors = select.select([sock] + self.agent.fds(), [], [], min(wait, 0.05))
+                except select.error as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    continue
+
+                if sock in readable:
+
+                    message = recv_message(sock)
+
+                    if message is None or message.get("type") == "done":
+                        break
+
+                    if message.get("type") == "task":
+                        job = self.agent.submit(message["command"])
+                        self.jobs[job] = message["index"]
+                        count += 1
+
+                self.agent.step(0)
+
+                for job in [job for job in self.jobs if job.done()]:
+                    self.send_result(sock, job)
+                    heartbeat = time.time()
+
+                if time.time() - heartbeat >= self.heartbeat_interval:
+                    send_message(sock, {"type": "heartbeat"})
+                    heartbeat = time.time()
+
+        except socket.error:
+            # The coordinator is gone, it gives the commands to other workers
+            pass
+
+        finally:
+            for job in self.jobs.keys():
+                job.cancel()
+
+            sock.close()
+
+        return count
@@ -0,0 +1,357 @@
+"""
+DAEMON : Resident logan agent listening on a Unix domain socket
+
+The daemon keeps a warm Agent (config already loaded and merged) in
+memory so that a thin client (see 'bin/logan') only has to forward its
+argv, environment and working directory instead of paying the whole
+interpreter and config startup on every call.
+
+Every request is served in a forked child: the child inherits the warm
+agent for free (copy-on-write) and can change its cwd and environment
+without leaking them to the next request. The child reads the request,
+a slow client never holds the daemon. Before forking, the daemon only
+peeks at the request already waiting in the socket: the warm config is
+refreshed for the client directory (project config layer), so that the
+children don't rebuild it on their own. The child parses the command
+line like a local 'logan' does (@see cli.run), with the warm agent.
+
+SIGTERM stops the daemon like an interrupt does: its socket is removed.
+
+The output of the command is sent back base64 encoded: actions may print
+any byte, JSON strings only hold unicode. A command forwarded with
+$LOGAN_TRACE is traced by its child (@see tracing.start_tracing).
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from agent import Agent
+from utils import ReturnCodes as return_codes
+from tracing import start_tracing, write_trace, TRACE_ENV_VARIABLE
+from StringIO import StringIO
+from os import path
+import SocketServer
+import socket
+import signal
+import struct
+import base64
+import json
+import sys
+import os
+
+
+# Wire format shared with the thin client 'bin/logan':
+# a 4 bytes big endian unsigned length followed by a JSON payload
+WIRE_HEADER        = struct.Struct("!I")
+WIRE_MAX_MESSAGE   = 64 * 1024 * 1024
+
+# Seconds a client has to send its request
+DAEMON_REQUEST_TIMEOUT = 5.0
+
+# Bytes of a request the daemon peeks at before forking
+DAEMON_PEEK_SIZE = 64 * 1024
+
+
+# ================
+# WIRE HELPERS
+# ================
+
+def send_message(sock, message):
+    """ Sends a JSON serializable object as a length-prefixed frame
+
+        Args:
+            sock:    A connected socket
+            message: Object to send. Eg: {"argv": ["list:files:usr", "-ltr"]}
+    """
+
+    payload = json.dumps(message)
+
+    sock.sendall(WIRE_HEADER.pack(len(payload)) + payload)
+
+# ------------------------------------------------------------------------------
+
+def recv_exactly(sock, size):
+    """ Reads exactly 'size' bytes from the socket
+
+        Returns:
+            String of 'size' bytes or None when the peer closed the connection
+    """
+
+    chunks = []
+
+    while size:
+        chunk = sock.recv(min(size, 65536))
+
+        if not chunk:
+            return None
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return "".join(chunks)
+
+# ------------------------------------------------------------------------------
+
+def recv_message(sock):
+    """ Reads one length-prefixed frame from the socket
+
+        Returns:
+            The decoded object or None when the peer closed the connection
+    """
+
+    header = recv_exactly(sock, WIRE_HEADER.size)
+
+    if header is None:
+        return None
+
+    size, = WIRE_HEADER.unpack(header)
+
+    if size > WIRE_MAX_MESSAGE:
+        raise ValueError("Logan : message of %d bytes is too large" % size)
+
+    payload = recv_exactly(sock, size)
+
+    return json.loads(payload) if payload is not None else None
+
+# ------------------------------------------------------------------------------
+
+def peek_message(sock, size=DAEMON_PEEK_SIZE):
+    """ Decodes the frame waiting in the socket, without reading it nor
+        waiting for it
+
+        Returns:
+            The decoded object or None when the whole frame (at most 'size'
+            bytes) has not arrived yet
+    """
+
+    try:
+        data = sock.recv(size, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except socket.error:
+        return None
+
+    if len(data) < WIRE_HEADER.size:
+        return None
+
+    length, = WIRE_HEADER.unpack(data[:WIRE_HEADER.size])
+
+    if len(data) < WIRE_HEADER.size + length:
+        return None
+
+    try:
+        return json.loads(data[WIRE_HEADER.size:WIRE_HEADER.size + length])
+    except ValueError:
+        return None
+
+# ------------------------------------------------------------------------------
+
+def exit_code(code):
+    """ Return code of a process exiting with 'sys.exit(code)'
+
+        Returns:
+            Tuple as (return_code, message), 'message' is what the
+            interpreter would print on stderr (None when nothing)
+    """
+
+    if code is None:
+        return return_codes.OK, None
+
+    if isinstance(code, (int, long)):
+        return code, None
+
+    return return_codes.FAIL, code
+
+
+# ================
+# SERVER
+# ================
+
+class LoganRequestHandler(SocketServer.BaseRequestHandler):
+    """ Serves one client request: decode it, dispatch it, send the result back
+    """
+
+    def handle(self):
+
+        # Stopping the daemon doesn't cut the commands being served
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        # A silent client only holds its own child
+        self.request.settimeout(DAEMON_REQUEST_TIMEOUT)
+
+        try:
+            request = recv_message(self.request)
+        except (socket.error, ValueError):
+            request = None
+
+        self.request.settimeout(None)
+
+        if request is None:
+            return
+
+        response = self.server.dispatch(request)
+
+        # The forked child leaves with 'os._exit', written before the
+        # client reads the trace
+        write_trace()
+
+        send_message(self.request, response)
+
+# ------------------------------------------------------------------------------
+
+class LoganDaemon(SocketServer.ForkingMixIn, SocketServer.UnixStreamServer):
+    """ Unix socket server that dispatches commands to a warm logan Agent
+    """
+
+    def __init__(self, agent, socket_path=None):
+
+        self.agent       = agent
+        self.socket_path = socket_path or agent.logan_socket_path
+
+        # Loads the config once, every forked child will inherit it
+        self.agent.load_config()
+
+        # A dead daemon may have left its socket behind
+        if path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        SocketServer.UnixStreamServer.__init__(self, self.socket_path, LoganRequestHandler)
+
+    # ------------------------------------------------------------------------------
+
+    def process_request(self, request, client_address):
+        """ Refreshes the warm config for the client directory (if its
+            files changed) before forking, so that children don't rebuild
+            it on their own. The request is only peeked at: a request not
+            there yet is read by the child, which refreshes the config then
+        """
+
+        pending = peek_message(request)
+
+        if pending is not None:
+            self.agent.project_dir = pending.get("cwd")
+
+        self.agent.load_config()
+
+        SocketServer.ForkingMixIn.process_request(self, request, client_address)
+
+    # ------------------------------------------------------------------------------
+
+    def dispatch(self, request):
+        """ Runs the forwarded command inside the current (forked) process
+
+            Args:
+                request: Dict as sent by the client
+                         {
+                            "argv": ["list:files:usr", "-ltr"],
+                            "env" : {...},
+                            "cwd" : "/tmp"
+                         }
+
+            Returns:
+                Dict as the result of the command, base64 encoded output
+                {
+                    "out" : "...",
+                    "err" : "...",
+                    "code": 0/1
+                }
+        """
+
+        import cli
+
+        out, err = StringIO(), StringIO()
+        stdout, stderr, argv = sys.stdout, sys.stderr, sys.argv
+
+        sys.stdout, sys.stderr = out, err
+
+        try:
+            os.chdir(request.get("cwd") or "/")
+            os.environ.clear()
+            os.environ.update(request.get("env") or {})
+
+            # Already done by the daemon when it has peeked at the request
+            self.agent.project_dir = request.get("cwd")
+            self.agent.load_config()
+
+            # Traced like a local 'logan', @see bin/logand
+            if os.environ.get(TRACE_ENV_VARIABLE):
+                start_tracing(os.environ[TRACE_ENV_VARIABLE])
+
+            sys.argv = ["logan"] + (request.get("argv") or [])
+
+            # The commands are run by the warm agent
+            cli.use_agent(self.agent)
+            cli.run()
+
+            return_code = return_codes.OK
+
+        # The CLI always exits, like a local 'logan' does
+        except SystemExit as e:
+            return_code, message = exit_code(e.code)
+
+            if message is not None:
+                print >> err, message
+
+        except Exception as e:
+            print >> err, "[LOGAN] : {}".format(e)
+            return_code = return_codes.FAIL
+
+        finally:
+            sys.stdout, sys.stderr, sys.argv = stdout, stderr, argv
+
+        return {
+            "out" : base64.b64encode(out.getvalue()),
+            "err" : base64.b64encode(err.getvalue()),
+            "code": return_code if return_code is not None else return_codes.OK
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def server_close(self):
+
+        SocketServer.UnixStreamServer.server_close(self)
+
+        if path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+# ================
+# ENTRY POINT
+# ================
+
+def main(argv=None):
+    """ Starts the daemon: 'logand [<logan_root_dir> [<socket_path>]]'
+
+        $LOGAN_ROOT and $LOGAN_SOCKET are used when no argument is given,
+        just like the thin client does.
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    root_dir    = argv[0] if len(argv) > 0 else os.environ.get("LOGAN_ROOT")
+    socket_path = argv[1] if len(argv) > 1 else os.environ.get("LOGAN_SOCKET")
+
+    daemon = LoganDaemon(Agent(root_dir), socket_path)
+
+    # Leaves 'serve_forever' like an interrupt, its socket is removed
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+
+# ------------------------------------------------------------------------------
+
+def stop(signum, frame):
+    """ Handles SIGTERM: 'shutdown' can't be called from the thread
+        running 'serve_forever'
+    """
+
+    raise KeyboardInterrupt()
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
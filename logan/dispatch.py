@@ -0,0 +1,260 @@
+"""
+DISPATCH : Action dispatcher compiled from the actions of the config
+
+The 'actions' catalog is compiled once into a trie over the tokens of
+the action commands: verb, then object, then context. Resolving a
+command checks its syntax and walks the trie in a single pass, without
+any regular expression.
+
+Each token can be abbreviated by any prefix as long as a single action
+matches:
+
+    cr:fi:usr notes.txt    =>    create:file:usr notes.txt
+
+When several actions match, all of them are given back so that the user
+can pick one.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from exceptions import LoganActionSyntaxError, LoganActionNotFoundError, LoganActionAmbiguousError
+from bisect import bisect_left
+
+
+# Separator of the tokens of an action command
+DISPATCH_TOKEN_SEPARATOR = ":"
+
+# Token of the actions without context
+DISPATCH_NO_CONTEXT = ""
+
+
+# ================
+# HELPERS
+# ================
+
+def is_token(token):
+    """ Whether or not a string is a valid action token (like '\\w+')
+    """
+
+    return bool(token) and token.replace("_", "a").isalnum()
+
+# ------------------------------------------------------------------------------
+
+def split_command(command):
+    """ Splits an action command into its tokens and its params
+
+        Args:
+            command: Eg: 'create:file:usr notes.txt'
+
+        Returns:
+            Tuple as (verb, object, context, params)
+            Eg: ('create', 'file', 'usr', 'notes.txt')
+            'context' is None when the command has none
+
+        Raises:
+            LoganActionSyntaxError: The command is not like 'verb:object[:context] [params]'
+    """
+
+    head, separator, params = command.strip().partition(" ")
+
+    tokens = head.split(DISPATCH_TOKEN_SEPARATOR)
+
+    # 'verb:object:' has no context either
+    if len(tokens) == 3 and not tokens[2]:
+        tokens.pop()
+
+    if len(tokens) not in (2, 3) or not all(is_token(token) for token in tokens):
+        raise LoganActionSyntaxError("Wrong syntax : Unable to run the command [%s]" % command)
+
+    if len(tokens) == 2:
+        tokens.append(None)
+
+    return tokens[0], tokens[1], tokens[2], params.lstrip(" ")
+
+
+# ================
+# CLASSES
+# ================
+
+class ActionDispatcher(object):
+    """ Trie of the actions of the config
+
+        Every node maps a token to the next node, the leaves are action
+        keys. Eg: {"create": {"file": {"usr": "create:file"}}}
+
+        Args:
+            actions: Dict of the actions of the config
+                     Eg: {"create:file": {"context": "usr", ...}, ...}
+    """
+
+    def __init__(self, actions):
+
+        self.root  = {}
+        self.count = 0
+
+        for key, action in actions.iteritems():
+
+            tokens = key.split(DISPATCH_TOKEN_SEPARATOR, 1)
+
+            if len(tokens) != 2:
+                continue
+
+            context = (action or {}).get("context") or DISPATCH_NO_CONTEXT
+
+            self.root.setdefault(tokens[0], {}).setdefault(tokens[1], {})[context] = key
+            self.count += 1
+
+        # Sorted tokens of every node, so that prefixes are found by bisection
+        self.sorted_tokens = {}
+        self.sort_tokens(self.root)
+
+    # ------------------------------------------------------------------------------
+
+    def sort_tokens(self, node):
+
+        self.sorted_tokens[id(node)] = sorted(node)
+
+        for child in node.itervalues():
+            if isinstance(child, dict):
+                self.sort_tokens(child)
+
+    # ------------------------------------------------------------------------------
+
+    def __getstate__(self):
+
+        # Node ids change once unpickled
+        return {"root": self.root, "count": self.count}
+
+    # ------------------------------------------------------------------------------
+
+    def __setstate__(self, state):
+
+        self.root  = state["root"]
+        self.count = state["count"]
+
+        self.sorted_tokens = {}
+        self.sort_tokens(self.root)
+
+    # ------------------------------------------------------------------------------
+
+    def match_token(self, node, token):
+        """ Tokens of a node matching a given token
+
+            An exact match wins over the tokens it is a prefix of.
+
+            Returns:
+                List of tokens
+        """
+
+        if token in node:
+            return [token]
+
+        tokens = self.sorted_tokens[id(node)]
+        start  = bisect_left(tokens, token)
+        end    = start
+
+        while end < len(tokens) and tokens[end].startswith(token):
+            end += 1
+
+        return tokens[start:end]
+
+    # ------------------------------------------------------------------------------
+
+    def candidates(self, action_verb, action_object, action_context=None):
+        """ Actions matching the (possibly abbreviated) tokens of a command
+
+            Returns:
+                List of tuples as (verb, object, context, action_key)
+                'context' is None for actions without context
+        """
+
+        found = []
+
+        for verb_token in self.match_token(self.root, action_verb):
+
+            objects = self.root[verb_token]
+
+            for object_token in self.match_token(objects, action_object):
+
+                contexts = objects[object_token]
+
+                if action_context is None:
+                    context_tokens = [DISPATCH_NO_CONTEXT] if DISPATCH_NO_CONTEXT in contexts else []
+                else:
+                    context_tokens = self.match_token(contexts, action_context)
+
+                for context_token in context_tokens:
+                    found.append((verb_token, object_token, context_token or None, contexts[context_token]))
+
+        return found
+
+    # ------------------------------------------------------------------------------
+
+    def contexts(self, action_verb, action_object):
+        """ Every context of the action matching the (possibly abbreviated)
+            verb and object of a command
+
+            Returns:
+                Tuple as (verb, object, contexts): 'contexts' maps context
+                tokens ('' for no context) to action keys
+                Eg: ('restart', 'server', {'aws': 'restart:server', ...})
+
+            Raises:
+                LoganActionNotFoundError:   No action matches the verb and object
+                LoganActionAmbiguousError:  Several actions match them
+        """
+
+        found = [
+            (verb_token, object_token)
+            for verb_token in self.match_token(self.root, action_verb)
+            for object_token in self.match_token(self.root[verb_token], action_object)
+        ]
+
+        command = DISPATCH_TOKEN_SEPARATOR.join((action_verb, action_object))
+
+        if not found:
+            raise LoganActionNotFoundError("Logan action [%s] not found" % command)
+
+        if len(found) > 1:
+            names = ", ".join(DISPATCH_TOKEN_SEPARATOR.join(candidate) for candidate in found)
+            raise LoganActionAmbiguousError("Logan action [%s] is ambiguous, it could be : %s" % (command, names))
+
+        action_verb, action_object = found[0]
+
+        return action_verb, action_object, dict(self.root[action_verb][action_object])
+
+    # ------------------------------------------------------------------------------
+
+    def resolve(self, command):
+        """ Checks the syntax of a command and finds its action
+
+            Args:
+                command: Eg: 'cr:fi:usr notes.txt'
+
+            Returns:
+                Tuple as (verb, object, context, params, action_key)
+                Eg: ('create', 'file', 'usr', 'notes.txt', 'create:file')
+
+            Raises:
+                LoganActionSyntaxError:     The command syntax is wrong
+                LoganActionNotFoundError:   No action matches the command
+                LoganActionAmbiguousError:  Several actions match the command
+        """
+
+        action_verb, action_object, action_context, action_params = split_command(command)
+
+        found = self.candidates(action_verb, action_object, action_context)
+
+        if not found:
+            raise LoganActionNotFoundError("Logan action [%s] not found" % command)
+
+        if len(found) > 1:
+            names = ", ".join(DISPATCH_TOKEN_SEPARATOR.join(token for token in candidate[:3] if token)
+                              for candidate in found)
+            raise LoganActionAmbiguousError("Logan action [%s] is ambiguous, it could be : %s" % (command, names))
+
+        action_verb, action_object, action_context, action_key = found[0]
+
+        return action_verb, action_object, action_context, action_params, action_key
@@ -0,0 +1,448 @@
+"""
+ENGINE : Non-blocking execution of many actions from a single thread
+
+An AsyncAgent resolves actions like the Agent does, but 'submit' starts
+them without waiting: it returns an ActionJob (a future-like handle) and
+the agent drives every running action from one loop, 'step', which
+multiplexes all their pipes with 'poll'. Thousands of actions can be in
+flight without a thread per action:
+
+    agent = AsyncAgent(concurrency=100)
+    jobs  = [agent.submit(command, timeout=30) for command in commands]
+    agent.run_until_complete(jobs)
+
+An external event loop can drive the agent too: watch the descriptors
+given by 'fds' and call 'step(0)' when one of them is readable or when
+'next_deadline' is reached.
+
+Each action runs in its own process group so that cancelling it (or
+reaching its timeout) also kills the processes it spawned.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from agent import Agent
+from utils import ReturnCodes as return_codes
+from collections import deque
+import subprocess
+import select
+import signal
+import errno
+import time
+import os
+
+
+# ================
+# CLASSES
+# ================
+
+class ActionJob(object):
+    """ Handle on an action submitted to an AsyncAgent
+    """
+
+    PENDING   = "pending"
+    RUNNING   = "running"
+    DONE      = "done"
+    FAILED    = "failed"        # could not be resolved or started
+    CANCELLED = "cancelled"
+    TIMEOUT   = "timeout"
+
+    FINISHED_STATES = (DONE, FAILED, CANCELLED, TIMEOUT)
+
+    def __init__(self, agent, command, args, timeout=None):
+
+        self.agent     = agent
+        self.command   = command
+        self.args      = args
+        self.timeout   = timeout
+        self.state     = self.PENDING
+        self.process   = None
+        self.deadline  = None
+        self.started   = None
+        self.finished  = None
+        self.error     = None
+        self.callbacks = []
+
+        self.out_chunks = []
+        self.err_chunks = []
+        self.code       = None
+
+    # ------------------------------------------------------------------------------
+
+    def done(self):
+
+        return self.state in self.FINISHED_STATES
+
+    # ------------------------------------------------------------------------------
+
+    def result(self):
+        """ Result of the action, like Agent.performs returns it
+
+            Returns:
+                Dict as {"out": "...", "err": "...", "code": 0/1, "state": "done"}
+                or None while the action is not finished
+        """
+
+        if not self.done():
+            return None
+
+        return {
+            "out"  : "".join(self.out_chunks),
+            "err"  : "".join(self.err_chunks),
+            "code" : self.code,
+            "state": self.state
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def cancel(self):
+        """ Cancels the action, kills its process group if it is running
+
+            Returns:
+                False if the action was already finished
+        """
+
+        return self.agent.cancel(self)
+
+    # ------------------------------------------------------------------------------
+
+    def add_done_callback(self, callback):
+        """ Calls 'callback(job)' once the action is finished
+        """
+
+        if self.done():
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    # ------------------------------------------------------------------------------
+
+    def finish(self, state, code):
+
+        self.state    = state
+        self.code     = code
+        self.finished = time.time()
+
+        for callback in self.callbacks:
+            callback(self)
+
+        self.callbacks = []
+
+    # ------------------------------------------------------------------------------
+
+    def __repr__(self):
+
+        return "<ActionJob {!r} {}>".format(self.command, self.state)
+
+# ------------------------------------------------------------------------------
+
+class AsyncAgent(Agent):
+    """ Agent running actions without blocking
+
+        Args:
+            logan_dir_path: @see Agent
+            concurrency:    Maximum number of actions running at the same time,
+                            the next ones wait in a queue
+            timeout:        Default timeout of the actions (seconds, None for none)
+    """
+
+    # Signal sent to the process group of a cancelled action
+    LOGAN_CANCEL_SIGNAL = signal.SIGKILL
+
+    # Bytes read from a pipe at once
+    LOGAN_READ_SIZE = 64 * 1024
+
+    def __init__(self, logan_dir_path=None, concurrency=64, timeout=None):
+
+        super(AsyncAgent, self).__init__(logan_dir_path)
+
+        self.concurrency = max(1, concurrency)
+        self.timeout     = timeout
+
+        self.queue       = deque()
+        self.running     = set()
+        self.pipes       = {}           # fd => (job, pipe, chunks)
+        self.poller      = select.poll()
+
+    # ------------------------------------------------------------------------------
+
+    def submit(self, command, timeout=None):
+        """ Resolves the command and starts its action as soon as a slot is free
+
+            Args:
+                command: Eg: 'list:files:usr -ltr'
+                timeout: Seconds the action may run, default to the agent one
+
+            Returns:
+                ActionJob. A command that can't be resolved gives an already
+                failed job.
+        """
+
+        try:
+            action, args = self.resolve_command(command)
+        except Exception as e:
+            return self.fail(command, e)
+
+        return self.submit_args(command, args, timeout)
+
+    # ------------------------------------------------------------------------------
+
+    def submit_args(self, command, args, timeout=None):
+        """ Starts an already resolved action as soon as a slot is free
+
+            Args:
+                command: Command the action has been resolved from
+                args:    @see Agent.build_command_from_action
+                timeout: @see submit
+
+            Returns:
+                ActionJob
+        """
+
+        job = ActionJob(self, command, args, timeout if timeout is not None else self.timeout)
+
+        self.queue.append(job)
+        self.start_queued()
+
+        return job
+
+    # ------------------------------------------------------------------------------
+
+    def fail(self, command, error):
+        """ Gives an already failed job, for a command that can't be run
+
+            Returns:
+                ActionJob
+        """
+
+        job = ActionJob(self, command, None)
+        job.error = str(error)
+        job.err_chunks.append("[LOGAN] : {}\n".format(error))
+        job.finish(ActionJob.FAILED, return_codes.FAIL)
+
+        return job
+
+    # ------------------------------------------------------------------------------
+
+    def start_queued(self):
+        """ Starts queued actions while there are free slots
+
+            Returns:
+                List of the jobs that failed to start
+        """
+
+        failed = []
+
+        while self.queue and len(self.running) < self.concurrency:
+
+            job = self.queue.popleft()
+
+            try:
+                job.process = subprocess.Popen(job.args, shell=False, close_fds=True,
+                                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                               preexec_fn=os.setsid)
+            except OSError as e:
+                job.error = str(e)
+                job.err_chunks.append("[LOGAN] : {}\n".format(e))
+                job.finish(ActionJob.FAILED, return_codes.FAIL)
+                failed.append(job)
+                continue
+
+            job.state   = ActionJob.RUNNING
+            job.started = time.time()
+
+            if job.timeout is not None:
+                job.deadline = job.started + job.timeout
+
+            for pipe, chunks in ((job.process.stdout, job.out_chunks), (job.process.stderr, job.err_chunks)):
+                self.pipes[pipe.fileno()] = (job, pipe, chunks)
+                self.poller.register(pipe.fileno(), select.POLLIN | select.POLLPRI)
+
+            self.running.add(job)
+
+        return failed
+
+    # ------------------------------------------------------------------------------
+
+    def fds(self):
+        """ Descriptors an external event loop has to watch for reading
+        """
+
+        return self.pipes.keys()
+
+    # ------------------------------------------------------------------------------
+
+    def next_deadline(self):
+        """ Time of the next action timeout, None if no running action has one
+        """
+
+        deadlines = [job.deadline for job in self.running if job.deadline is not None]
+
+        return min(deadlines) if deadlines else None
+
+    # ------------------------------------------------------------------------------
+
+    def cancel(self, job, state=ActionJob.CANCELLED):
+        """ Cancels a job, kills its process group if it is running
+        """
+
+        if job.done():
+            return False
+
+        if job.state == ActionJob.PENDING:
+            self.queue.remove(job)
+            job.finish(state, None)
+            return True
+
+        try:
+            os.killpg(job.process.pid, self.LOGAN_CANCEL_SIGNAL)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+        self.close_pipes(job)
+        self.reap(job, state, block=True)
+
+        return True
+
+    # ------------------------------------------------------------------------------
+
+    def close_pipes(self, job):
+
+        for pipe in (job.process.stdout, job.process.stderr):
+
+            if pipe.closed:
+                continue
+
+            if pipe.fileno() in self.pipes:
+                self.poller.unregister(pipe.fileno())
+                del self.pipes[pipe.fileno()]
+
+            pipe.close()
+
+    # ------------------------------------------------------------------------------
+
+    def reap(self, job, state=ActionJob.DONE, block=False):
+        """ Finishes a job whose process has exited (or waits for it if 'block')
+
+            Returns:
+                Whether or not the job is finished
+        """
+
+        code = job.process.wait() if block else job.process.poll()
+
+        if code is None:
+            return False
+
+        self.running.discard(job)
+        job.finish(state, code)
+
+        return True
+
+    # ------------------------------------------------------------------------------
+
+    def step(self, timeout=None):
+        """ Reads available output, reaps finished actions, enforces timeouts
+            and starts queued actions
+
+            Args:
+                timeout: Seconds to wait for something to happen (None to
+                         wait until an action writes, exits or times out)
+
+            Returns:
+                List of the jobs finished during this step
+        """
+
+        running = list(self.running)
+
+        # Actions that closed their pipes but have not exited yet are polled
+        lingering = [job for job in self.running
+                     if job.process.stdout.closed and job.process.stderr.closed]
+
+        wait = timeout
+        deadline = self.next_deadline()
+
+        if deadline is not None:
+            until_deadline = max(0, deadline - time.time())
+            wait = until_deadline if wait is None else min(wait, until_deadline)
+
+        if lingering:
+            wait = 0.01 if wait is None else min(wait, 0.01)
+
+        try:
+            events = self.poller.poll(None if wait is None else int(wait * 1000)) if self.pipes else []
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            events = []
+
+        if not self.pipes and wait:
+            time.sleep(wait)
+
+        for fd, event in events:
+
+            if fd not in self.pipes:
+                continue
+
+            job, pipe, chunks = self.pipes[fd]
+            chunk = os.read(fd, self.LOGAN_READ_SIZE)
+
+            if chunk:
+                chunks.append(chunk)
+                continue
+
+            # End of file
+            self.poller.unregister(fd)
+            del self.pipes[fd]
+
+            pipe.close()
+
+        now = time.time()
+
+        for job in running:
+
+            if job.deadline is not None and now >= job.deadline:
+                self.cancel(job, ActionJob.TIMEOUT)
+
+            elif job.process.stdout.closed and job.process.stderr.closed:
+                self.reap(job)
+
+        failed = self.start_queued()
+
+        return [job for job in running if job.done()] + failed
+
+    # ------------------------------------------------------------------------------
+
+    def run_until_complete(self, jobs=None, timeout=None):
+        """ Drives the actions until the given jobs (all by default) are finished
+
+            Args:
+                jobs:    ActionJobs to wait for
+                timeout: Maximum number of seconds to wait
+
+            Returns:
+                The list of the jobs still not finished (empty if all are done)
+        """
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while True:
+
+            if jobs is None:
+                waiting = list(self.running) + list(self.queue)
+            else:
+                waiting = [job for job in jobs if not job.done()]
+
+            if not waiting:
+                return []
+
+            remaining = None
+
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return waiting
+
+            self.step(remaining)
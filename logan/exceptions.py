@@ -10,5 +10,10 @@ class LoganLoadConfigError          (LoganLoadFileError):       pass
 class LoganPathNotFound             (Exception):                pass
 class LoganActionAttrsMissingError  (Exception):                pass
 class LoganActionPathMissingError   (Exception):                pass
+class LoganActionSyntaxError        (Exception):                pass
+class LoganActionNotFoundError      (Exception):                pass
+class LoganActionAmbiguousError     (LoganActionNotFoundError): pass
+class LoganCacheError               (Exception):                pass
+class LoganJobNotFoundError         (Exception):                pass
 
 
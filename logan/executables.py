@@ -0,0 +1,218 @@
+"""
+EXECUTABLES : Table of the action executables, like a shell 'hash' table
+
+Finding the file of an action used to cost a 'stat' on every dispatch,
+which is slow when the actions directory is on a network file system.
+The actions tree is walked once instead and every executable file is
+recorded by its path relative to the actions directory:
+
+    {"usr/ls": "/home/me/.logan/actions/usr/ls", ...}
+
+A hit is answered from the table without any file system call. A miss
+checks the modification time of the walked directories (adding, removing
+or renaming an action changes the one of its directory) and walks the
+tree again when one of them has changed, like a shell rehashes its PATH.
+Entries that turn out to be stale when they are run are forgotten by the
+caller (@see forget).
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from tracing import traced
+from os import path
+import stat
+import os
+
+
+# Any of the execute bits
+EXECUTABLE_MODE = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+
+
+class ExecutableTable(object):
+    """ Executable files of an actions directory
+
+        Args:
+            actions_path: Directory holding the actions ('<root>/actions')
+    """
+
+    def __init__(self, actions_path):
+
+        self.actions_path = path.abspath(actions_path)
+
+        # Relative path => absolute path of the executable files
+        self.executables = {}
+
+        # Relative paths of the files lacking an execute bit
+        self.not_executables = set()
+
+        # Directory path => modification time, when walked
+        self.directories = {}
+
+        # Whether the table has been walked again since 'changed' was reset
+        self.changed = False
+
+        self.stats = {
+            "hits"    : 0,
+            "misses"  : 0,
+            "rehashes": 0
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def __getstate__(self):
+
+        # Stats are the ones of the running process
+        state = dict(self.__dict__)
+        state["changed"] = False
+        state["stats"]   = dict.fromkeys(self.stats, 0)
+
+        return state
+
+    # ------------------------------------------------------------------------------
+
+    def get_relative_path(self, file_path):
+        """ Path of a file relative to the actions directory
+
+            Args:
+                file_path: Eg: '/home/me/.logan/actions/usr/ls'
+
+            Returns:
+                String or None when the file is not under the actions directory
+                Eg: 'usr/ls'
+        """
+
+        file_path = path.abspath(file_path)
+
+        if not file_path.startswith(self.actions_path + os.sep):
+            return None
+
+        return file_path[len(self.actions_path) + 1:]
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ExecutableTable.build", "executables")
+    def build(self):
+        """ Walks the actions directory and records its executable files
+
+            Returns:
+                The number of executable files
+        """
+
+        executables     = {}
+        not_executables = set()
+        directories     = {}
+
+        for dir_path, dir_names, file_names in os.walk(self.actions_path):
+
+            try:
+                directories[dir_path] = os.stat(dir_path).st_mtime
+            except OSError:
+                continue
+
+            for file_name in file_names:
+
+                file_path = path.join(dir_path, file_name)
+
+                try:
+                    # Follows links, like exec does
+                    mode = os.stat(file_path).st_mode
+                except OSError:
+                    continue
+
+                if not stat.S_ISREG(mode):
+                    continue
+
+                relative_path = file_path[len(self.actions_path) + 1:]
+
+                if mode & EXECUTABLE_MODE:
+                    executables[relative_path] = file_path
+                else:
+                    not_executables.add(relative_path)
+
+        self.executables     = executables
+        self.not_executables = not_executables
+        self.directories     = directories
+        self.changed         = True
+
+        self.stats["rehashes"] += 1
+
+        return len(executables)
+
+    # ------------------------------------------------------------------------------
+
+    def is_stale(self):
+        """ Whether or not a walked directory has changed (or the actions
+            directory has been created) since the table has been built
+        """
+
+        if not self.directories:
+            return path.isdir(self.actions_path)
+
+        for dir_path, mtime in self.directories.iteritems():
+            try:
+                if os.stat(dir_path).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+
+        return False
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ExecutableTable.lookup", "executables")
+    def lookup(self, file_path):
+        """ Finds an executable file of the actions directory
+
+            Args:
+                file_path: Eg: '/home/me/.logan/actions/usr/ls'
+
+            Returns:
+                The absolute path of the file or None when it is not
+                under the actions directory, doesn't exist or is not executable
+        """
+
+        relative_path = self.get_relative_path(file_path)
+
+        if relative_path is None:
+            return None
+
+        executable = self.executables.get(relative_path)
+
+        if executable is not None:
+            self.stats["hits"] += 1
+            return executable
+
+        self.stats["misses"] += 1
+
+        if self.is_stale():
+            self.build()
+            executable = self.executables.get(relative_path)
+
+        return executable
+
+    # ------------------------------------------------------------------------------
+
+    def is_executable(self, file_path):
+        """ Whether or not a file may be run: False when it has been found
+            in the actions directory without any execute bit
+        """
+
+        return self.get_relative_path(file_path) not in self.not_executables
+
+    # ------------------------------------------------------------------------------
+
+    def forget(self, file_path=None):
+        """ Forgets an executable file so that the next lookup of it walks
+            the actions directory again (any lookup miss when 'file_path' is None)
+
+            Args:
+                file_path: Eg: '/home/me/.logan/actions/usr/ls'
+        """
+
+        if file_path is not None:
+            self.executables.pop(self.get_relative_path(file_path), None)
+
+        # Forces the next miss to walk the tree
+        self.directories = {}
@@ -0,0 +1,353 @@
+"""
+FANOUT : Runs one action in many contexts at once
+
+    logan 'restart:server:{aws,gcp,onprem}' now
+    logan 'restart:server:*' now
+    logan --all-contexts restart:server now
+
+The action is run in every given context ('*' or '--all-contexts' for
+all of them): the contexts of the config having this action and the
+'actions/<context>/' directories holding its executable. The actions run
+concurrently on an AsyncAgent (at most 'jobs' of them at a time) and
+their results are shown per context once all of them are done.
+
+Two modes stop the stragglers early, their actions are cancelled:
+
+    - first success: as soon as an action succeeds
+    - fail fast:     as soon as an action fails
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import ReturnCodes as return_codes
+from exceptions import LoganActionSyntaxError, LoganActionNotFoundError
+from dispatch import split_command, is_token, DISPATCH_TOKEN_SEPARATOR, DISPATCH_NO_CONTEXT
+from layers import LayeredConfig
+from engine import ActionJob
+from os import path
+import os
+
+
+# Context token of every context
+FANOUT_ALL_CONTEXTS = "*"
+
+# Delimiters and separator of a list of contexts. Eg: '{aws,gcp}'
+FANOUT_LIST_START     = "{"
+FANOUT_LIST_END       = "}"
+FANOUT_LIST_SEPARATOR = ","
+
+# Modes stopping the stragglers
+FANOUT_FIRST_SUCCESS = "first-success"
+FANOUT_FAIL_FAST     = "fail-fast"
+
+
+# ================
+# HELPERS
+# ================
+
+def split_fanout(command):
+    """ Splits a fan-out command into its tokens and its params
+
+        Args:
+            command: Eg: 'restart:server:{aws,gcp} now'
+
+        Returns:
+            Tuple as (verb, object, contexts, params) or None when the
+            command is not a fan-out one
+            Eg: ('restart', 'server', ['aws', 'gcp'], 'now')
+            'contexts' is None for every context ('restart:server:*')
+
+        Raises:
+            LoganActionSyntaxError: The list of contexts is wrong
+    """
+
+    head, separator, params = command.strip().partition(" ")
+
+    tokens = head.split(DISPATCH_TOKEN_SEPARATOR)
+
+    if len(tokens) != 3:
+        return None
+
+    action_verb, action_object, context = tokens
+
+    if context == FANOUT_ALL_CONTEXTS:
+        contexts = None
+
+    elif context.startswith(FANOUT_LIST_START) and context.endswith(FANOUT_LIST_END):
+        contexts = [token.strip() for token in context[1:-1].split(FANOUT_LIST_SEPARATOR)]
+
+        if not all(is_token(token) for token in contexts):
+            raise LoganActionSyntaxError("Wrong syntax : Unable to run the command [%s]" % command)
+
+    else:
+        return None
+
+    if not is_token(action_verb) or not is_token(action_object):
+        raise LoganActionSyntaxError("Wrong syntax : Unable to run the command [%s]" % command)
+
+    return action_verb, action_object, contexts, params.lstrip(" ")
+
+# ------------------------------------------------------------------------------
+
+def is_fanout(command):
+
+    try:
+        return split_fanout(command) is not None
+    except LoganActionSyntaxError:
+        return True
+
+
+# ================
+# CLASSES
+# ================
+
+class FanOut(object):
+    """ Runs the action of a command in many contexts
+
+        Args:
+            agent:  AsyncAgent resolving and running the actions, its
+                    concurrency caps the actions running at the same time
+            mode:   None (waits for every action), FANOUT_FIRST_SUCCESS
+                    or FANOUT_FAIL_FAST
+            output: File object receiving the results (None to hide them)
+    """
+
+    # Output template of the result of one context
+    LOGAN_FANOUT_OUTPUT_TEMPLATE = "[{context}] {command} => {code} ({duration:.3f}s)\n{err}{out}"
+
+    def __init__(self, agent, mode=None, output=None):
+
+        self.agent  = agent
+        self.mode   = mode
+        self.output = output
+
+    # ------------------------------------------------------------------------------
+
+    def find_contexts(self, action_path):
+        """ Contexts whose directory holds an executable of the given name
+
+            Args:
+                action_path: Path of the action, relative to its context directory
+
+            Returns:
+                List of contexts
+        """
+
+        executables = self.agent.get_executables()
+
+        # A new context directory may have been added since the table was built
+        if executables.is_stale():
+            executables.build()
+            self.agent.add_executables_to_cache(executables)
+
+        suffix = os.sep + path.normpath(action_path)
+
+        return [
+            relative_path[:-len(suffix)]
+            for relative_path in executables.executables
+            if relative_path.endswith(suffix) and os.sep not in relative_path[:-len(suffix)]
+        ]
+
+    # ------------------------------------------------------------------------------
+
+    def resolve(self, command, all_contexts=False):
+        """ Resolves the action of a command in every context
+
+            Args:
+                command:        Eg: 'restart:server:{aws,gcp} now'
+                all_contexts:   Runs a 'verb:object[:context] [params]'
+                                command in every context
+
+            Returns:
+                List of records, one per context:
+                {
+                    "context": "aws",
+                    "command": "restart:server:aws now",
+                    "args"   : ["/.../actions/aws/restart", "now"],
+                    "error"  : None
+                }
+
+            Raises:
+                LoganActionSyntaxError:     The command syntax is wrong
+                LoganActionNotFoundError:   No action matches the verb and object
+                LoganActionAmbiguousError:  Several actions match them
+        """
+
+        fanout = split_fanout(command)
+
+        if fanout is None:
+            if not all_contexts:
+                raise LoganActionSyntaxError("Wrong syntax : Unable to run the command [%s]" % command)
+
+            action_verb, action_object, context, action_params = split_command(command)
+            requested = None
+        else:
+            action_verb, action_object, requested, action_params = fanout
+
+        action_verb, action_object, config_contexts = \
+                self.agent.get_dispatcher().contexts(action_verb, action_object)
+
+        # Action run from the directories of the contexts the config doesn't have
+        base_context = sorted(config_contexts)[0]
+        base_action  = self.agent.dispatch_command(self.make_command(action_verb, action_object,
+                                                                     base_context, action_params))
+
+        if isinstance(base_action, LayeredConfig):
+            base_action = base_action.to_dict()
+
+        directory_contexts = self.find_contexts(base_action.get("path") or "")
+
+        if requested is None:
+            requested = sorted(set(config_contexts).union(directory_contexts))
+
+        records = []
+
+        for context in requested:
+
+            record = {
+                "context": context or "-",
+                "command": self.make_command(action_verb, action_object, context, action_params),
+                "args"   : None,
+                "error"  : None
+            }
+
+            try:
+                if context in config_contexts:
+                    action, record["args"] = self.agent.resolve_command(record["command"])
+
+                elif context in directory_contexts:
+                    action = dict(base_action, context=context)
+
+                    self.agent.action_params = action_params
+                    record["args"] = self.agent.build_command_from_action(action)
+
+                else:
+                    raise LoganActionNotFoundError("Logan action [%s] not found" % record["command"])
+
+            except Exception as e:
+                record["error"] = e
+
+            records.append(record)
+
+        return records
+
+    # ------------------------------------------------------------------------------
+
+    def make_command(self, action_verb, action_object, context, params):
+
+        tokens = [action_verb, action_object] + ([context] if context != DISPATCH_NO_CONTEXT else [])
+
+        return " ".join(part for part in (DISPATCH_TOKEN_SEPARATOR.join(tokens), params) if part)
+
+    # ------------------------------------------------------------------------------
+
+    def should_stop(self, jobs):
+        """ Whether or not the stragglers have to be cancelled
+        """
+
+        finished = [job for job in jobs if job.done()]
+
+        if self.mode == FANOUT_FIRST_SUCCESS:
+            return any(job.code == return_codes.OK for job in finished)
+
+        if self.mode == FANOUT_FAIL_FAST:
+            return any(job.code != return_codes.OK for job in finished)
+
+        return False
+
+    # ------------------------------------------------------------------------------
+
+    def run(self, command, all_contexts=False, timeout=None):
+        """ Runs the action of a command in every context
+
+            Args:
+                command:        @see resolve
+                all_contexts:   @see resolve
+                timeout:        Seconds each action may run
+
+            Returns:
+                Tuple as (return_code, results). 'return_code' is OK when
+                every action succeeded, or one of them in first success mode.
+                Results are sorted like the contexts:
+                {
+                    "context" : "aws",
+                    "command" : "restart:server:aws now",
+                    "code"    : 0,          (None when cancelled before running)
+                    "state"   : "done",     @see engine.ActionJob
+                    "out"     : "...",
+                    "err"     : "...",
+                    "duration": 0.01
+                }
+
+            Raises:
+                @see resolve
+        """
+
+        records = self.resolve(command, all_contexts)
+        jobs    = []
+
+        # Contexts that can't be run first: a fail fast run doesn't start anything then
+        for record in sorted(records, key=lambda record: record["error"] is None):
+
+            if record["error"] is not None:
+                job = self.agent.fail(record["command"], record["error"])
+
+            elif self.should_stop(jobs):
+                job = ActionJob(self.agent, record["command"], record["args"])
+                job.finish(ActionJob.CANCELLED, None)
+
+            else:
+                job = self.agent.submit_args(record["command"], record["args"], timeout)
+
+            record["job"] = job
+            jobs.append(job)
+
+        while True:
+
+            waiting = [job for job in jobs if not job.done()]
+
+            if not waiting:
+                break
+
+            if self.should_stop(jobs):
+                for job in waiting:
+                    job.cancel()
+                break
+
+            self.agent.step()
+
+        results = []
+
+        for record in records:
+
+            job    = record.pop("job")
+            result = job.result()
+            result.update(
+                context  = record["context"],
+                command  = record["command"],
+                duration = (job.finished - job.started) if job.started else 0.0
+            )
+
+            results.append(result)
+            self.show(result)
+
+        if self.mode == FANOUT_FIRST_SUCCESS:
+            failed = all(result["code"] != return_codes.OK for result in results)
+        else:
+            failed = any(result["code"] != return_codes.OK for result in results)
+
+        return (return_codes.FAIL if failed else return_codes.OK), results
+
+    # ------------------------------------------------------------------------------
+
+    def show(self, result):
+
+        if self.output is None:
+            return
+
+        # Cancelled and timed out actions show their state
+        self.output.write(self.LOGAN_FANOUT_OUTPUT_TEMPLATE.format(**dict(
+            result, code=result["code"] if result["state"] == ActionJob.DONE else result["state"]
+        )))
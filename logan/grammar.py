@@ -0,0 +1,247 @@
+"""
+GRAMMAR : Precompiled usage grammar of the command line
+
+'docopt' parses the usage text (sections, option defaults and usage
+patterns) on every call before looking at argv. That work only depends
+on the usage text: it is done once and its result is pickled into the
+logan root directory ('<root>/logan.grammar', $LOGAN_ROOT or ~/.logan),
+keyed on a checksum of the usage text.
+
+The common 'logan [--no-cache] [--subprocess] <action> <params>' form doesn't even need
+docopt: 'parse_fast' recognizes it and fills the defaults stored in the
+grammar. Anything else goes through the cached docopt pattern.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from os import path
+from zlib import crc32
+import cPickle
+import sys
+import os
+
+
+# Compiled grammar file, stored in the logan root directory
+GRAMMAR_FILENAME = "logan.grammar"
+
+# Logan root directory when $LOGAN_ROOT is not set (@see agent.Agent)
+GRAMMAR_DEFAULT_ROOT_DIR = path.join(path.expanduser("~"), ".logan")
+
+# Changed whenever the stored grammar format changes
+GRAMMAR_FORMAT_VERSION = 1
+
+# Arguments of the form handled by 'parse_fast'
+GRAMMAR_FAST_ARGUMENTS = ("<action>", "<params>")
+GRAMMAR_FAST_OPTIONS   = ("--no-cache", "--subprocess")
+
+
+# ================
+# HELPERS
+# ================
+
+def get_grammar_path():
+    """ Where the compiled grammar is stored: in the logan root directory,
+        the package directory may be read-only
+    """
+
+    return path.join(os.environ.get("LOGAN_ROOT") or GRAMMAR_DEFAULT_ROOT_DIR, GRAMMAR_FILENAME)
+
+# ------------------------------------------------------------------------------
+
+def usage_key(usage):
+    """ Checksum of the usage text the grammar has been compiled from
+    """
+
+    return "{}:{:08x}:{}".format(GRAMMAR_FORMAT_VERSION, crc32(usage) & 0xffffffff, len(usage))
+
+# ------------------------------------------------------------------------------
+
+def compile_grammar(usage):
+    """ Parses the usage text the way 'docopt' does
+
+        Returns:
+            Dict as:
+            {
+                "key"     : "1:1234abcd:2048",      (@see usage_key)
+                "defaults": {"--jobs": "4", ...},   (value of every element when absent)
+                "commands": ["batch", "compile"],
+                "aliases" : {"-v": "--version", ...},
+                "grammar" : "..."                   (pickled (usage section, options, pattern))
+            }
+    """
+
+    from lib.docopt import DocoptLanguageError, Command, \
+                           parse_section, parse_defaults, parse_pattern, formal_usage
+
+    usage_sections = parse_section('usage:', usage)
+
+    if len(usage_sections) != 1:
+        raise DocoptLanguageError('Exactly one "usage:" (case-insensitive) section is needed.')
+
+    options = parse_defaults(usage)
+    pattern = parse_pattern(formal_usage(usage_sections[0]), options)
+
+    grammar = cPickle.dumps((usage_sections[0], options, pattern), cPickle.HIGHEST_PROTOCOL)
+
+    fixed = cPickle.loads(grammar)[2].fix()
+
+    return {
+        "key"     : usage_key(usage),
+        "defaults": dict((element.name, element.value) for element in fixed.flat()),
+        "commands": [command.name for command in fixed.flat(Command)],
+        "aliases" : dict((option.short, option.long) for option in options if option.short and option.long),
+        "grammar" : grammar
+    }
+
+# ------------------------------------------------------------------------------
+
+def save_grammar(grammar, grammar_path=None):
+    """ Stores a compiled grammar, atomically
+
+        Args:
+            grammar:        @see compile_grammar
+            grammar_path:   Default to the one of the logan root, @see get_grammar_path
+
+        Returns:
+            Boolean: Whether or not the grammar has been stored
+    """
+
+    grammar_path = grammar_path or get_grammar_path()
+    tmp_path     = "{}.{}.tmp".format(grammar_path, os.getpid())
+
+    try:
+        with open(tmp_path, "wb") as grammar_file:
+            cPickle.dump(grammar, grammar_file, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, grammar_path)
+    except (IOError, OSError):
+        # Eg: the logan root doesn't exist yet
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+    return True
+
+# ------------------------------------------------------------------------------
+
+def load_grammar(usage, grammar_path=None):
+    """ Gets the compiled grammar of the usage text, compiles and stores it
+        when it is missing or has been compiled from another usage text
+
+        Args:
+            usage:          Usage text
+            grammar_path:   @see save_grammar
+
+        Returns:
+            Dict. @see compile_grammar
+    """
+
+    grammar_path = grammar_path or get_grammar_path()
+
+    try:
+        with open(grammar_path, "rb") as grammar_file:
+            grammar = cPickle.load(grammar_file)
+    except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+        grammar = None
+
+    if not isinstance(grammar, dict) or grammar.get("key") != usage_key(usage):
+        grammar = compile_grammar(usage)
+        save_grammar(grammar, grammar_path)
+
+    return grammar
+
+# ------------------------------------------------------------------------------
+
+def parse_fast(argv, grammar):
+    """ Parses the common 'logan [--no-cache] [--subprocess] <action> <params>' form without docopt
+
+        Returns:
+            Dict of arguments, like docopt returns them, or None when argv
+            has another form
+    """
+
+    defaults = grammar["defaults"]
+    argv     = list(argv)
+    options  = []
+
+    while argv and argv[0] in GRAMMAR_FAST_OPTIONS:
+        options.append(argv.pop(0))
+
+    if len(argv) != len(GRAMMAR_FAST_ARGUMENTS):
+        return None
+
+    # Options, '--' and commands need docopt
+    if any(arg.startswith("-") for arg in argv) or argv[0] in grammar["commands"]:
+        return None
+
+    if any(name not in defaults for name in GRAMMAR_FAST_ARGUMENTS + tuple(options)):
+        return None
+
+    arguments = dict(defaults)
+    arguments.update(zip(GRAMMAR_FAST_ARGUMENTS, argv))
+
+    for option in options:
+        if arguments[option] is not False:
+            # Repeated or valued options need docopt
+            return None
+        arguments[option] = True
+
+    return arguments
+
+# ------------------------------------------------------------------------------
+
+def parse(usage, argv, version=None, help=True, grammar_path=None):
+    """ Parses argv against the usage text, like 'docopt(usage, argv, help, version)'
+
+        Args:
+            grammar_path: @see save_grammar
+
+        Raises:
+            DocoptExit: argv doesn't match the usage
+            SystemExit: help or version has been shown
+    """
+
+    grammar = load_grammar(usage, grammar_path)
+
+    # Shown without docopt, like its 'extras' do
+    if len(argv) == 1:
+
+        option = grammar["aliases"].get(argv[0], argv[0])
+
+        if help and option == "--help":
+            print usage.strip("\n")
+            sys.exit()
+
+        if version and option == "--version":
+            print version
+            sys.exit()
+
+    arguments = parse_fast(argv, grammar)
+
+    if arguments is not None:
+        return arguments
+
+    from lib.docopt import DocoptExit, Dict, Tokens, Option, OptionsShortcut, parse_argv, extras
+
+    usage_section, options, pattern = cPickle.loads(grammar["grammar"])
+
+    DocoptExit.usage = usage_section
+
+    parsed = parse_argv(Tokens(argv), list(options), False)
+
+    pattern_options = set(pattern.flat(Option))
+
+    for options_shortcut in pattern.flat(OptionsShortcut):
+        options_shortcut.children = list(set(options) - pattern_options)
+
+    extras(help, version, parsed, usage)
+
+    matched, left, collected = pattern.fix().match(parsed)
+
+    if matched and left == []:
+        return Dict((element.name, element.value) for element in (pattern.flat() + collected))
+
+    raise DocoptExit()
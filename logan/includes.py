@@ -0,0 +1,152 @@
+"""
+INCLUDES : Config files including other config files
+
+A config file can include other YAML files with glob patterns, relative
+to its own directory:
+
+    include: ["conf.d/*.yaml"]
+
+Included files are drop-ins: they override the file including them, in
+the order of the patterns, then of their names. They can't include
+other files themselves.
+
+Each file is parsed on its own and kept with its fingerprint in the
+cached config layer it belongs to, so that only the files that changed
+are parsed again. When many of them did, they are parsed in parallel by
+a pool of processes.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import load_file, file_fingerprint, FileTypes
+from tracing import traced
+from os import path
+import glob
+
+
+# Config key of the include patterns
+INCLUDE_KEY = "include"
+
+# Number of files from which they are parsed in parallel
+INCLUDE_PARALLEL_MIN_FILES = 4
+
+
+# ================
+# HELPERS
+# ================
+
+def get_include_patterns(config):
+    """ Include patterns of a config
+
+        Returns:
+            List of glob patterns. Eg: ["conf.d/*.yaml"]
+    """
+
+    patterns = config.get(INCLUDE_KEY) if isinstance(config, dict) else None
+
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+
+    if not isinstance(patterns, list):
+        return []
+
+    return [pattern for pattern in patterns if isinstance(pattern, basestring)]
+
+# ------------------------------------------------------------------------------
+
+def expand_includes(file_path, patterns):
+    """ Lists the files included by a config file
+
+        Args:
+            file_path:  The including config file
+            patterns:   @see get_include_patterns
+
+        Returns:
+            List of file paths, in the order they override each other
+    """
+
+    base_dir  = path.dirname(path.abspath(file_path))
+    own_path  = path.abspath(file_path)
+    included  = []
+    seen      = set([own_path])
+
+    for pattern in patterns:
+        for include_path in sorted(glob.glob(path.join(base_dir, path.expanduser(pattern)))):
+
+            if include_path in seen or not path.isfile(include_path):
+                continue
+
+            seen.add(include_path)
+            included.append(include_path)
+
+    return included
+
+# ------------------------------------------------------------------------------
+
+def includes_fingerprint(file_path, patterns, content_hash=False):
+    """ Fingerprints the files included by a config file (one 'stat'
+        call per file)
+
+        Returns:
+            Tuple of (file path, file fingerprint)
+    """
+
+    return tuple(
+        (include_path, file_fingerprint(include_path, content_hash))
+        for include_path in expand_includes(file_path, patterns)
+    )
+
+# ------------------------------------------------------------------------------
+
+def parse_file(file_path):
+    """ Parses one YAML config file (run by the processes of the pool)
+    """
+
+    return load_file(file_path, type=FileTypes.YAML)
+
+# ------------------------------------------------------------------------------
+
+@traced("includes.parse_files", "config")
+def parse_files(file_paths, jobs=None):
+    """ Parses YAML config files, in parallel when there are many of them
+
+        Args:
+            file_paths: Files to parse
+            jobs:       Number of processes (default to the number of CPUs)
+
+        Returns:
+            List of the configs, in the order of 'file_paths'
+
+        Raises:
+            LoganLoadFileError:         A file isn't valid YAML
+            LoganFileNotExistsError:    A file doesn't exist (anymore)
+    """
+
+    import multiprocessing
+
+    if jobs is None:
+        try:
+            jobs = multiprocessing.cpu_count()
+        except NotImplementedError:
+            jobs = 1
+
+    jobs = min(jobs, len(file_paths))
+
+    if jobs < 2 or len(file_paths) < INCLUDE_PARALLEL_MIN_FILES:
+        return [parse_file(file_path) for file_path in file_paths]
+
+    pool = multiprocessing.Pool(jobs)
+
+    try:
+        configs = pool.map(parse_file, file_paths)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    return configs
@@ -0,0 +1,247 @@
+"""
+INDEX : Compiled, memory-mapped action index
+
+'logan compile' writes every action of the merged config into a read-only
+binary file laid out like a CDB (constant database):
+
+    +--------------------+
+    | header             |  magic, version, slots count, table offset,
+    |                    |  fingerprints offset and size
+    +--------------------+
+    | records            |  key size, data size, key, serialized action
+    | ...                |
+    +--------------------+
+    | hash table         |  'slots' entries of (hash, record offset),
+    |                    |  open addressing with linear probing
+    +--------------------+
+    | fingerprints       |  marshaled fingerprints of the config files
+    +--------------------+
+
+Keys are '<verb>:<object>[:<context>]'. A lookup hashes the key, reads one
+slot of the table and one record: only that record gets deserialized.
+
+Actions are marshaled, which is the fastest to load. Actions holding values
+marshal does not know (dates, custom YAML tags...) are pickled instead: the
+first byte of the serialized action tells which one was used.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from exceptions import LoganLoadFileError
+import cPickle
+import marshal
+import struct
+import mmap
+import os
+
+
+INDEX_MAGIC   = "LOGANIDX"
+INDEX_VERSION = 2
+
+INDEX_HEADER  = struct.Struct("<8sIIQQI")   # magic, version, slots, table offset, fingerprints offset/size
+INDEX_SLOT    = struct.Struct("<IQ")        # key hash, record offset (0 means empty)
+INDEX_RECORD  = struct.Struct("<II")        # key size, data size
+
+# First byte of a serialized action
+INDEX_MARSHALED = "m"
+INDEX_PICKLED   = "p"
+
+
+# ================
+# HELPERS
+# ================
+
+def hash_key(key):
+    """ CDB hash function (djb2 with xor) truncated to 32 bits
+    """
+
+    h = 5381
+
+    for c in key:
+        h = (((h << 5) + h) ^ ord(c)) & 0xffffffff
+
+    return h
+
+# ------------------------------------------------------------------------------
+
+def action_index_key(key, context=None):
+    """ Builds the index key of an action
+
+        Args:
+            key:     Action key as found in the config. Eg: 'list:files'
+            context: Action context. Eg: 'usr'
+
+        Returns:
+            String as '<verb>:<object>[:<context>]'. Eg: 'list:files:usr'
+    """
+
+    index_key = "{}:{}".format(key, context) if context else key
+
+    if isinstance(index_key, unicode):
+        index_key = index_key.encode("utf-8")
+
+    return index_key
+
+# ------------------------------------------------------------------------------
+
+def dump_action(action):
+    """ Serializes an action for the index
+
+        Args:
+            action: Dict of the action attributes
+
+        Returns:
+            String of the marshaled action, or of the pickled action
+            when it holds values marshal can not serialize
+    """
+
+    try:
+        return INDEX_MARSHALED + marshal.dumps(action)
+    except ValueError:
+        return INDEX_PICKLED + cPickle.dumps(action, cPickle.HIGHEST_PROTOCOL)
+
+# ------------------------------------------------------------------------------
+
+def load_action(data):
+    """ Deserializes an action written by dump_action
+    """
+
+    if data[0] == INDEX_PICKLED:
+        return cPickle.loads(data[1:])
+
+    return marshal.loads(data[1:])
+
+# ------------------------------------------------------------------------------
+
+def compile_index(actions, index_path, fingerprints=None):
+    """ Writes the binary index of the given actions
+
+        The index is built in a temporary file then renamed, so that
+        readers always map a complete index.
+
+        Args:
+            actions:        Dict of actions as found in the config 'actions' entry
+            index_path:     Where to write the index
+            fingerprints:   Fingerprints of the config files the actions come from
+
+        Returns:
+            The number of indexed actions
+    """
+
+    actions = actions or {}
+
+    # At most half full, and a power of 2 to mask hashes
+    slots = 1
+    while slots < 2 * len(actions):
+        slots <<= 1
+
+    table    = [(0, 0)] * slots
+    tmp_path = "{}.{}.tmp".format(index_path, os.getpid())
+
+    with open(tmp_path, "wb") as index_file:
+
+        offset = INDEX_HEADER.size
+        index_file.write("\0" * offset)
+
+        for key, action in actions.iteritems():
+
+            index_key = action_index_key(key, (action or {}).get("context"))
+            data      = dump_action(action)
+
+            index_file.write(INDEX_RECORD.pack(len(index_key), len(data)))
+            index_file.write(index_key)
+            index_file.write(data)
+
+            # Linear probing from the hashed slot
+            key_hash = hash_key(index_key)
+            slot     = key_hash & (slots - 1)
+            while table[slot][1]:
+                slot = (slot + 1) & (slots - 1)
+            table[slot] = (key_hash, offset)
+
+            offset += INDEX_RECORD.size + len(index_key) + len(data)
+
+        table_offset = offset
+
+        for key_hash, record_offset in table:
+            index_file.write(INDEX_SLOT.pack(key_hash, record_offset))
+
+        fingerprints_offset = table_offset + slots * INDEX_SLOT.size
+        fingerprints_data   = marshal.dumps(fingerprints)
+
+        index_file.write(fingerprints_data)
+
+        index_file.seek(0)
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, slots,
+                                           table_offset, fingerprints_offset, len(fingerprints_data)))
+
+    os.rename(tmp_path, index_path)
+
+    return len(actions)
+
+
+# ================
+# CLASSES
+# ================
+
+class ActionIndex(object):
+    """ Read-only view over a compiled index file
+    """
+
+    def __init__(self, index_path):
+
+        with open(index_path, "rb") as index_file:
+            self.map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.slots, self.table_offset, fingerprints_offset, fingerprints_size = \
+                INDEX_HEADER.unpack_from(self.map, 0)
+
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise LoganLoadFileError("Logan : %s is not a valid action index" % index_path)
+
+        self.fingerprints = marshal.loads(
+                self.map[fingerprints_offset:fingerprints_offset + fingerprints_size])
+
+    # ------------------------------------------------------------------------------
+
+    def get(self, key, default=None):
+        """ Finds the action stored for the given index key
+
+            Args:
+                key: Index key. Eg: 'list:files:usr'
+                     @see action_index_key
+
+            Returns:
+                Dict of the action attributes or 'default' if not found
+        """
+
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+
+        key_hash = hash_key(key)
+        slot     = key_hash & (self.slots - 1)
+
+        while True:
+            slot_hash, offset = INDEX_SLOT.unpack_from(self.map, self.table_offset + slot * INDEX_SLOT.size)
+
+            if not offset:
+                return default
+
+            if slot_hash == key_hash:
+                key_size, data_size = INDEX_RECORD.unpack_from(self.map, offset)
+                key_start = offset + INDEX_RECORD.size
+
+                if self.map[key_start:key_start + key_size] == key:
+                    data_start = key_start + key_size
+                    return load_action(self.map[data_start:data_start + data_size])
+
+            slot = (slot + 1) & (self.slots - 1)
+
+    # ------------------------------------------------------------------------------
+
+    def close(self):
+
+        self.map.close()
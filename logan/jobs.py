@@ -0,0 +1,607 @@
+"""
+JOBS : Persistent queue of the actions run in the background
+
+    logan --background backup:db:prod nightly     =>  [LOGAN] : Job 12 queued
+    logan jobs                                    (lists the jobs)
+    logan job 12                                  (state and output so far)
+    logan wait 12                                 (streams the output until done)
+
+Background jobs are stored in a SQLite database of the logan root
+('<root>/jobs/jobs.db') and drained by worker processes ('logan drain'),
+running at most 'jobs' actions at a time. Queuing a job starts a worker
+when none is alive; a worker exits once the queue has been empty for a
+while. The output of every job is written by the action itself into
+'<root>/jobs/<id>.out' and '<root>/jobs/<id>.err', so that it can be
+read while the job is running.
+
+Workers claim jobs in a transaction, a job is run by a single worker.
+A worker is dead once its process is gone or its heartbeat is stale (a
+pid reused after a reboot). The jobs it was running are queued again by
+the next worker, or marked failed once they have been tried
+'max_attempts' times. A job whose action outlived its worker is marked
+failed: it is never run twice at the same time.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import ReturnCodes as return_codes
+from exceptions import LoganJobNotFoundError
+from tracing import traced, write_trace
+from os import path
+import sqlite3
+import errno
+import stat
+import time
+import os
+
+
+# States of a job
+JOB_QUEUED  = "queued"
+JOB_RUNNING = "running"
+JOB_DONE    = "done"
+JOB_FAILED  = "failed"      # could not be resolved or started, or its workers died
+
+JOB_FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+# Extensions of the output files of a job
+JOB_OUT_EXTENSION = ".out"
+JOB_ERR_EXTENSION = ".err"
+
+# Seconds a worker waits between two looks at the queue and its jobs
+JOB_POLL_INTERVAL = 0.05
+
+# Seconds of empty queue after which a worker exits
+JOB_IDLE_TIMEOUT = 2.0
+
+# Seconds without heartbeat after which a worker is dead
+JOB_HEARTBEAT_TIMEOUT = 10.0
+
+# Seconds a queued job waits for a worker before another one is started
+JOB_SPAWN_GRACE = 2.0
+
+# Times a job is tried before being marked failed
+JOB_MAX_ATTEMPTS = 2
+
+JOB_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        command     TEXT    NOT NULL,
+        cwd         TEXT,
+        state       TEXT    NOT NULL,
+        code        INTEGER,
+        error       TEXT,
+        worker      INTEGER,
+        pid         INTEGER,
+        attempts    INTEGER NOT NULL DEFAULT 0,
+        queued      REAL    NOT NULL,
+        started     REAL,
+        finished    REAL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+    CREATE TABLE IF NOT EXISTS workers (
+        pid         INTEGER PRIMARY KEY,
+        started     REAL    NOT NULL,
+        heartbeat   REAL    NOT NULL
+    );
+"""
+
+
+# ================
+# HELPERS
+# ================
+
+def is_alive(pid):
+    """ Whether or not a process of this host is running
+    """
+
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+
+    return True
+
+# ------------------------------------------------------------------------------
+
+def close_sockets():
+    """ Closes the sockets inherited by a detached process (Eg: the
+        listening socket of the daemon and the one of its client)
+
+        Other files stay open: SQLite tracks the locks of the databases
+        of the process, closing them under it breaks the next connections.
+    """
+
+    try:
+        max_fd = os.sysconf("SC_OPEN_MAX")
+    except (AttributeError, ValueError):
+        max_fd = 256
+
+    for fd in xrange(3, max_fd):
+        try:
+            if stat.S_ISSOCK(os.fstat(fd).st_mode):
+                os.close(fd)
+        except OSError:
+            pass
+
+# ------------------------------------------------------------------------------
+
+def spawn_worker(agent, queue, concurrency=4):
+    """ Starts a worker draining the queue in a detached process, which
+        outlives the calling one (double fork)
+
+        Args:
+            agent:          Agent resolving the commands, inherited warm
+            queue:          JobQueue
+            concurrency:    @see JobWorker
+    """
+
+    pid = os.fork()
+
+    if pid:
+        # The intermediate child exits right away
+        os.waitpid(pid, 0)
+        return
+
+    try:
+        os.setsid()
+
+        if os.fork():
+            os._exit(0)
+
+        null = os.open(os.devnull, os.O_RDWR)
+
+        for fd in (0, 1, 2):
+            os.dup2(null, fd)
+
+        close_sockets()
+
+        # A SQLite connection must not be used across a fork
+        JobWorker(agent, JobQueue(queue.jobs_dir, queue.max_attempts), concurrency).run()
+
+    finally:
+        # Exit handlers are skipped
+        write_trace()
+        os._exit(0)
+
+
+# ================
+# CLASSES
+# ================
+
+class JobQueue(object):
+    """ Jobs of a logan root, stored in a SQLite database
+
+        Args:
+            jobs_dir:       Directory of the database and of the output files
+            max_attempts:   Times a job is tried before being marked failed
+    """
+
+    DB_FILENAME = "jobs.db"
+
+    def __init__(self, jobs_dir, max_attempts=JOB_MAX_ATTEMPTS):
+
+        self.jobs_dir     = jobs_dir
+        self.max_attempts = max_attempts
+        self.connection   = None
+
+    # ------------------------------------------------------------------------------
+
+    def connect(self):
+        """ Opens the database (created on first use)
+
+            Returns:
+                A sqlite3 connection, in autocommit mode: transactions
+                are explicit
+        """
+
+        if self.connection is not None:
+            return self.connection
+
+        if not path.isdir(self.jobs_dir):
+            try:
+                os.makedirs(self.jobs_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        connection = sqlite3.connect(path.join(self.jobs_dir, self.DB_FILENAME),
+                                     timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+
+        # Readers don't wait for the writers
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(JOB_SCHEMA)
+
+        self.connection = connection
+
+        return connection
+
+    # ------------------------------------------------------------------------------
+
+    def close(self):
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # ------------------------------------------------------------------------------
+
+    def get_output_path(self, job_id, extension=JOB_OUT_EXTENSION):
+
+        return path.join(self.jobs_dir, "{}{}".format(job_id, extension))
+
+    # ------------------------------------------------------------------------------
+
+    def enqueue(self, command, cwd=None):
+        """ Queues a job
+
+            Args:
+                command: Eg: 'backup:db:prod nightly'
+                cwd:     Directory the action runs in (default to the current one)
+
+            Returns:
+                The id of the job
+        """
+
+        cursor = self.connect().execute(
+            "INSERT INTO jobs (command, cwd, state, queued) VALUES (?, ?, ?, ?)",
+            (command, cwd or os.getcwd(), JOB_QUEUED, time.time())
+        )
+
+        return cursor.lastrowid
+
+    # ------------------------------------------------------------------------------
+
+    def get(self, job_id):
+        """ Gets a job
+
+            Returns:
+                Dict with the columns of the job
+
+            Raises:
+                LoganJobNotFoundError: There is no such job
+        """
+
+        row = self.connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            raise LoganJobNotFoundError("Logan job [%s] not found" % job_id)
+
+        return dict(row)
+
+    # ------------------------------------------------------------------------------
+
+    def list(self, limit=20):
+        """ Lists the last jobs, most recent first
+
+            Returns:
+                List of Dicts. @see get
+        """
+
+        rows = self.connect().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+
+        return [dict(row) for row in rows]
+
+    # ------------------------------------------------------------------------------
+
+    def read_output(self, job_id, offsets=(0, 0)):
+        """ Reads the output a job has written so far
+
+            Args:
+                offsets: Bytes of the output and of the errors already read
+
+            Returns:
+                Tuple as (out, err)
+        """
+
+        output = []
+
+        for extension, offset in zip((JOB_OUT_EXTENSION, JOB_ERR_EXTENSION), offsets):
+            try:
+                with open(self.get_output_path(job_id, extension), "rb") as output_file:
+                    output_file.seek(offset)
+                    output.append(output_file.read())
+            except IOError:
+                output.append("")
+
+        return tuple(output)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("JobQueue.claim", "jobs")
+    def claim(self, worker):
+        """ Takes the oldest queued job for a worker
+
+            Args:
+                worker: Pid of the worker
+
+            Returns:
+                Dict of the job (@see get) or None when the queue is empty
+        """
+
+        connection = self.connect()
+
+        # Taken by a single worker
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            row = connection.execute("SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                                     (JOB_QUEUED,)).fetchone()
+
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, pid = NULL, attempts = attempts + 1, started = ? "
+                    "WHERE id = ?",
+                    (JOB_RUNNING, worker, time.time(), row["id"])
+                )
+
+            connection.execute("COMMIT")
+
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+        return self.get(row["id"]) if row is not None else None
+
+    # ------------------------------------------------------------------------------
+
+    def set_pid(self, job_id, pid):
+        """ Records the pid of the action of a running job
+        """
+
+        self.connect().execute("UPDATE jobs SET pid = ? WHERE id = ?", (pid, job_id))
+
+    # ------------------------------------------------------------------------------
+
+    def has_queued(self):
+
+        return self.connect().execute("SELECT 1 FROM jobs WHERE state = ? LIMIT 1",
+                                      (JOB_QUEUED,)).fetchone() is not None
+
+    # ------------------------------------------------------------------------------
+
+    def finish(self, job_id, code, error=None):
+        """ Records the end of a job
+
+            Args:
+                code:  Return code of the action
+                error: Why the job couldn't be run (the job is then failed)
+        """
+
+        self.connect().execute(
+            "UPDATE jobs SET state = ?, code = ?, error = ?, finished = ? WHERE id = ?",
+            (JOB_FAILED if error is not None else JOB_DONE, code, error, time.time(), job_id)
+        )
+
+    # ------------------------------------------------------------------------------
+
+    def register(self, worker):
+
+        now = time.time()
+
+        self.connect().execute("INSERT OR REPLACE INTO workers (pid, started, heartbeat) VALUES (?, ?, ?)",
+                               (worker, now, now))
+
+    # ------------------------------------------------------------------------------
+
+    def heartbeat(self, worker):
+
+        self.connect().execute("UPDATE workers SET heartbeat = ? WHERE pid = ?", (time.time(), worker))
+
+    # ------------------------------------------------------------------------------
+
+    def unregister(self, worker):
+
+        self.connect().execute("DELETE FROM workers WHERE pid = ?", (worker,))
+
+    # ------------------------------------------------------------------------------
+
+    def get_workers(self):
+        """ Pids of the workers alive, forgets the dead ones: gone or
+            without heartbeat for 'JOB_HEARTBEAT_TIMEOUT' seconds
+        """
+
+        connection = self.connect()
+        workers    = []
+        stale      = time.time() - JOB_HEARTBEAT_TIMEOUT
+
+        for row in connection.execute("SELECT pid, heartbeat FROM workers").fetchall():
+            if row["heartbeat"] >= stale and is_alive(row["pid"]):
+                workers.append(row["pid"])
+            else:
+                self.unregister(row["pid"])
+
+        return workers
+
+    # ------------------------------------------------------------------------------
+
+    @traced("JobQueue.recover", "jobs")
+    def recover(self):
+        """ Queues again the jobs of the dead workers (@see get_workers),
+            or marks them failed once they have been tried 'max_attempts'
+            times or when their action is still running
+
+            Returns:
+                Tuple as (requeued, failed): the ids of the jobs
+        """
+
+        workers    = self.get_workers()
+        connection = self.connect()
+        requeued   = []
+        failed     = []
+
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            rows = connection.execute("SELECT id, worker, pid, attempts FROM jobs WHERE state = ?",
+                                      (JOB_RUNNING,)).fetchall()
+
+            for row in rows:
+
+                if row["worker"] in workers:
+                    continue
+
+                # Nobody waits for it anymore, running it again would run the action twice
+                if row["pid"] is not None and is_alive(row["pid"]):
+                    connection.execute("UPDATE jobs SET state = ?, code = ?, error = ?, finished = ? WHERE id = ?",
+                                       (JOB_FAILED, return_codes.FAIL,
+                                        "its worker died, its action (pid {}) is left running".format(row["pid"]),
+                                        time.time(), row["id"]))
+                    failed.append(row["id"])
+
+                elif row["attempts"] < self.max_attempts:
+                    connection.execute("UPDATE jobs SET state = ?, worker = NULL, started = NULL WHERE id = ?",
+                                       (JOB_QUEUED, row["id"]))
+                    requeued.append(row["id"])
+                else:
+                    connection.execute("UPDATE jobs SET state = ?, code = ?, error = ?, finished = ? WHERE id = ?",
+                                       (JOB_FAILED, return_codes.FAIL, "its worker died", time.time(), row["id"]))
+                    failed.append(row["id"])
+
+            connection.execute("COMMIT")
+
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+        return requeued, failed
+
+# ------------------------------------------------------------------------------
+
+class JobWorker(object):
+    """ Drains a job queue, running at most 'concurrency' actions at a time
+
+        Args:
+            agent:          Agent resolving the commands of the jobs
+            queue:          JobQueue
+            concurrency:    Maximum number of actions running at the same time
+            idle_timeout:   Seconds of empty queue after which 'run' returns
+                            (None to run forever)
+    """
+
+    def __init__(self, agent, queue, concurrency=4, idle_timeout=JOB_IDLE_TIMEOUT):
+
+        self.agent        = agent
+        self.queue        = queue
+        self.concurrency  = max(1, concurrency)
+        self.idle_timeout = idle_timeout
+        self.pid          = os.getpid()
+
+        self.running = {}       # job id => process
+
+    # ------------------------------------------------------------------------------
+
+    def start(self, job):
+        """ Starts the action of a job, its output goes to the output files
+            of the job
+
+            Returns:
+                The process or None when the job failed to start
+        """
+
+        import subprocess
+
+        try:
+            action, args = self.agent.resolve_command(job["command"])
+        except Exception as e:
+            self.queue.finish(job["id"], return_codes.FAIL, str(e))
+            return None
+
+        cwd = job["cwd"] if job["cwd"] and path.isdir(job["cwd"]) else None
+
+        with open(os.devnull, "rb") as null, \
+             open(self.queue.get_output_path(job["id"], JOB_OUT_EXTENSION), "wb") as out, \
+             open(self.queue.get_output_path(job["id"], JOB_ERR_EXTENSION), "wb") as err:
+
+            try:
+                return subprocess.Popen(args, shell=False, close_fds=True, cwd=cwd,
+                                        stdin=null, stdout=out, stderr=err)
+            except OSError as e:
+                self.queue.finish(job["id"], return_codes.FAIL, str(e))
+                return None
+
+    # ------------------------------------------------------------------------------
+
+    def reap(self):
+        """ Records the jobs whose action has exited
+
+            Returns:
+                The number of finished jobs
+        """
+
+        finished = 0
+
+        for job_id, process in self.running.items():
+
+            code = process.poll()
+
+            if code is None:
+                continue
+
+            del self.running[job_id]
+            self.queue.finish(job_id, code)
+
+            finished += 1
+
+        return finished
+
+    # ------------------------------------------------------------------------------
+
+    @traced("JobWorker.run", "jobs")
+    def run(self):
+        """ Runs the queued jobs until the queue stays empty 'idle_timeout'
+            seconds
+
+            Returns:
+                The number of jobs run
+        """
+
+        self.queue.register(self.pid)
+        self.queue.recover()
+
+        count = 0
+        idle  = time.time()
+
+        try:
+            while True:
+
+                while len(self.running) < self.concurrency:
+
+                    job = self.queue.claim(self.pid)
+
+                    if job is None:
+                        break
+
+                    count += 1
+                    process = self.start(job)
+
+                    if process is not None:
+                        self.running[job["id"]] = process
+                        self.queue.set_pid(job["id"], process.pid)
+
+                if self.running:
+                    idle = time.time()
+
+                elif self.idle_timeout is not None and time.time() - idle >= self.idle_timeout:
+
+                    # A job queued meanwhile either is seen here or sees no worker alive
+                    self.queue.unregister(self.pid)
+
+                    if not self.queue.has_queued():
+                        break
+
+                    self.queue.register(self.pid)
+
+                time.sleep(JOB_POLL_INTERVAL)
+
+                self.reap()
+                self.queue.heartbeat(self.pid)
+
+        finally:
+            # Running actions are left behind: their jobs are recovered
+            # by a next worker once this one is gone (@see recover)
+            self.queue.unregister(self.pid)
+
+        return count
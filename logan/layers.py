@@ -0,0 +1,217 @@
+"""
+LAYERS : Merged, read-only view over several config layers
+
+Instead of deep-copying the default config and every user value (see
+'utils.dict_merge'), a LayeredConfig keeps a reference to each layer and
+resolves keys on access, from the highest priority layer to the lowest:
+
+    - a value that is not a dict hides the same key in lower layers
+    - dicts found under the same key are merged, lazily, by a child view
+
+Nothing is copied: a sub-dict defined by a single layer is shared with it
+and only the nodes overridden by several layers get their own (cheap)
+view. Writes never touch the layers: they go to an overlay dict owned by
+the view (copy-on-write).
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+
+class LayeredConfig(object):
+    """ Dict-like view merging the given layers
+
+        Args:
+            layers: List of dicts from the lowest to the highest priority.
+                    Eg: [system, default, user, project, env]
+                    Layers that are not dicts (empty config files) are ignored.
+    """
+
+    def __init__(self, layers, parent=None, key=None):
+
+        self.layers  = [layer for layer in layers if isinstance(layer, dict)]
+        self.overlay = None
+
+        # Where to create the overlay of a child view on first write
+        self.parent  = parent
+        self.key     = key
+
+        # Child views already built, by key
+        self.views   = {}
+
+    # ------------------------------------------------------------------------------
+
+    def search_path(self):
+        """ Layers from the highest to the lowest priority
+        """
+
+        return reversed(self.layers)
+
+    # ------------------------------------------------------------------------------
+
+    def __getitem__(self, key):
+
+        view = self.views.get(key)
+
+        if view is not None:
+            return view
+
+        dicts = []
+
+        for layer in self.search_path():
+
+            if key not in layer:
+                continue
+
+            value = layer[key]
+
+            # A plain value overrides everything below it
+            if not isinstance(value, dict):
+                if not dicts:
+                    return value
+                break
+
+            dicts.append(value)
+
+        if not dicts:
+            raise KeyError(key)
+
+        view = LayeredConfig(reversed(dicts), self, key)
+        self.views[key] = view
+
+        return view
+
+    # ------------------------------------------------------------------------------
+
+    def get(self, key, default=None):
+
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    # ------------------------------------------------------------------------------
+
+    def __contains__(self, key):
+
+        return any(key in layer for layer in self.layers)
+
+    has_key = __contains__
+
+    # ------------------------------------------------------------------------------
+
+    def keys(self):
+
+        keys = []
+        seen = set()
+
+        for layer in self.layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+
+        return keys
+
+    # ------------------------------------------------------------------------------
+
+    def __iter__(self):
+
+        return iter(self.keys())
+
+    iterkeys = __iter__
+
+    # ------------------------------------------------------------------------------
+
+    def __len__(self):
+
+        return len(self.keys())
+
+    # ------------------------------------------------------------------------------
+
+    def iteritems(self):
+
+        for key in self.keys():
+            yield key, self[key]
+
+    # ------------------------------------------------------------------------------
+
+    def items(self):
+
+        return list(self.iteritems())
+
+    # ------------------------------------------------------------------------------
+
+    def values(self):
+
+        return [value for key, value in self.iteritems()]
+
+    # ------------------------------------------------------------------------------
+
+    def writable(self):
+        """ Gets the overlay dict of this view, creates it on first write
+
+            The overlay of a child view lives in the overlay of its parent,
+            so that the parent sees what has been written through the child.
+        """
+
+        if self.overlay is None:
+
+            if self.parent is None:
+                self.overlay = {}
+            else:
+                self.overlay = self.parent.writable().setdefault(self.key, {})
+
+            if not self.layers or self.layers[-1] is not self.overlay:
+                self.layers.append(self.overlay)
+
+        return self.overlay
+
+    # ------------------------------------------------------------------------------
+
+    def __setitem__(self, key, value):
+
+        if isinstance(value, dict):
+            value = dict(value)
+
+        self.writable()[key] = value
+        self.views.pop(key, None)
+
+    # ------------------------------------------------------------------------------
+
+    def to_dict(self):
+        """ Materializes the merged view into plain (new) dicts
+        """
+
+        return dict(
+            (key, value.to_dict() if isinstance(value, LayeredConfig) else value)
+            for key, value in self.iteritems()
+        )
+
+    # ------------------------------------------------------------------------------
+
+    def __eq__(self, other):
+
+        if isinstance(other, LayeredConfig):
+            other = other.to_dict()
+
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+
+        return not self == other
+
+    # ------------------------------------------------------------------------------
+
+    def __reduce__(self):
+        """ Pickles the view as its layers, the views are rebuilt on demand
+        """
+
+        return LayeredConfig, (self.layers,)
+
+    # ------------------------------------------------------------------------------
+
+    def __repr__(self):
+
+        return "LayeredConfig({!r})".format(self.layers)
@@ -0,0 +1,378 @@
+"""
+MANIFEST : Actions discovered from the actions directory
+
+Every executable of 'actions/<context>/' (or of 'actions/' itself for
+actions without context) is an action. Its attributes come from, in
+that order:
+
+    - a sidecar YAML file next to it, named after it: 'ls.logan'
+
+        key: "list:files"
+        help: |
+            NAME
+                ls - list directory contents
+
+    - the YAML printed by '<executable> --logan-describe', for scripts
+      that mention '--logan-describe' in their first bytes (nothing else
+      is ever run). A script still running after a short delay is killed
+      and gives nothing
+
+    - its name, when it is like '<verb>-<object>': 'list-files'
+
+Executables giving no action key are ignored. The discovered actions are
+the lowest config layer: the YAML config files override them.
+
+The manifest keeps the actions found in each directory along with the
+modification time of the directory. Refreshing it only scans again the
+directories whose modification time has changed (an action has been
+added, removed or renamed), so its cost follows the changes, not the
+size of the catalog. Editing a sidecar in place doesn't change the
+modification time of its directory: 'logan compile' scans everything.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import load_file, FileTypes
+from exceptions import LoganLoadFileError, LoganFileNotExistsError
+from dispatch import is_token, DISPATCH_TOKEN_SEPARATOR
+from tracing import traced
+from os import path
+import stat
+import os
+
+
+# Extension of the sidecar file describing an action
+MANIFEST_SIDECAR_EXTENSION = ".logan"
+
+# Option asking an executable to describe itself
+MANIFEST_DESCRIBE_OPTION = "--logan-describe"
+
+# Bytes of an executable searched for the describe option
+MANIFEST_DESCRIBE_MARKER_SIZE = 1024
+
+# Seconds an executable has to describe itself
+MANIFEST_DESCRIBE_TIMEOUT = 2.0
+
+# Seconds between two looks at a describing executable
+MANIFEST_DESCRIBE_INTERVAL = 0.005
+
+# Separator of the verb and the object in an executable name
+MANIFEST_NAME_SEPARATOR = "-"
+
+# Directory key of the actions without context
+MANIFEST_NO_CONTEXT = ""
+
+
+# ================
+# HELPERS
+# ================
+
+def action_key_from_name(name):
+    """ Action key of an executable named like '<verb>-<object>'
+
+        Returns:
+            String or None. Eg: 'list-files.sh' => 'list:files'
+    """
+
+    tokens = path.splitext(name)[0].split(MANIFEST_NAME_SEPARATOR)
+
+    if len(tokens) != 2 or not all(is_token(token) for token in tokens):
+        return None
+
+    return DISPATCH_TOKEN_SEPARATOR.join(tokens)
+
+# ------------------------------------------------------------------------------
+
+def read_sidecar(file_path):
+    """ Attributes of an action read from its sidecar file
+
+        Returns:
+            Dict or None when there is no (valid) sidecar file
+    """
+
+    try:
+        attributes = load_file(file_path + MANIFEST_SIDECAR_EXTENSION, type=FileTypes.YAML)
+    except (LoganLoadFileError, LoganFileNotExistsError, IOError):
+        return None
+
+    return attributes if isinstance(attributes, dict) else None
+
+# ------------------------------------------------------------------------------
+
+def can_describe(file_path):
+    """ Whether or not an executable handles the describe option
+    """
+
+    try:
+        with open(file_path, "rb") as executable:
+            return MANIFEST_DESCRIBE_OPTION in executable.read(MANIFEST_DESCRIBE_MARKER_SIZE)
+    except IOError:
+        return False
+
+# ------------------------------------------------------------------------------
+
+def describe(file_path, timeout=MANIFEST_DESCRIBE_TIMEOUT):
+    """ Attributes of an action printed by '<executable> --logan-describe'
+
+        The config is being loaded (other logan processes may wait for
+        it): an executable still running after 'timeout' seconds is
+        killed, along with the processes it started.
+
+        Returns:
+            Dict or None when the executable fails to describe itself
+    """
+
+    import subprocess
+    import tempfile
+    import signal
+    import time
+    import yaml
+
+    from utils import get_yaml_loader
+
+    # A file never fills up, unlike a pipe nobody reads while waiting
+    with tempfile.TemporaryFile() as out, open(os.devnull, "w") as devnull:
+
+        try:
+            process = subprocess.Popen([file_path, MANIFEST_DESCRIBE_OPTION], stdout=out, stderr=devnull,
+                                       close_fds=True, preexec_fn=os.setsid)
+        except OSError:
+            return None
+
+        deadline = time.time() + timeout
+
+        while process.poll() is None:
+
+            if time.time() >= deadline:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                process.wait()
+                return None
+
+            time.sleep(MANIFEST_DESCRIBE_INTERVAL)
+
+        if process.returncode != 0:
+            return None
+
+        out.seek(0)
+        out = out.read()
+
+    try:
+        attributes = yaml.load(out, Loader=get_yaml_loader()[0])
+    except yaml.YAMLError:
+        return None
+
+    return attributes if isinstance(attributes, dict) else None
+
+# ------------------------------------------------------------------------------
+
+def list_directories(actions_path):
+    """ Lists the directories holding actions with their modification time
+
+        Returns:
+            Dict mapping directory keys ('' for 'actions/' itself, the
+            context otherwise) to modification times, None when the actions
+            directory doesn't exist
+    """
+
+    try:
+        directories = {MANIFEST_NO_CONTEXT: os.stat(actions_path).st_mtime}
+        names       = os.listdir(actions_path)
+    except OSError:
+        return None
+
+    for name in names:
+
+        if name.startswith("."):
+            continue
+
+        try:
+            status = os.stat(path.join(actions_path, name))
+        except OSError:
+            continue
+
+        if stat.S_ISDIR(status.st_mode):
+            directories[name] = status.st_mtime
+
+    return directories
+
+# ------------------------------------------------------------------------------
+
+def manifest_fingerprint(actions_path):
+    """ Fingerprints the actions directory: one 'stat' call per directory
+
+        Returns:
+            Tuple of (directory key, modification time) or None when the
+            actions directory doesn't exist
+    """
+
+    directories = list_directories(actions_path)
+
+    if directories is None:
+        return None
+
+    return tuple(sorted(directories.iteritems()))
+
+
+# ================
+# CLASSES
+# ================
+
+class ActionManifest(object):
+    """ Actions discovered from an actions directory, by directory
+
+        Args:
+            actions_path: Directory holding the actions ('<root>/actions')
+    """
+
+    def __init__(self, actions_path):
+
+        self.actions_path = actions_path
+
+        # Directory key => {"mtime": ..., "actions": {action key: action}}
+        self.directories = {}
+
+        self.stats = {
+            "scanned": 0,
+            "reused" : 0
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def __getstate__(self):
+
+        # Stats are the ones of the running process
+        state = dict(self.__dict__)
+        state["stats"] = dict.fromkeys(self.stats, 0)
+
+        return state
+
+    # ------------------------------------------------------------------------------
+
+    def describe_action(self, context, name):
+        """ Builds the action of an executable
+
+            Returns:
+                Tuple as (action_key, action) or None when the file is not
+                an executable or gives no action key
+        """
+
+        dir_path  = path.join(self.actions_path, context)
+        file_path = path.join(dir_path, name)
+
+        try:
+            mode = os.stat(file_path).st_mode
+        except OSError:
+            return None
+
+        if not stat.S_ISREG(mode) or not mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+            return None
+
+        attributes = read_sidecar(file_path)
+
+        if attributes is None and can_describe(file_path):
+            attributes = describe(file_path)
+
+        attributes = dict(attributes or {})
+        key        = attributes.pop("key", None) or action_key_from_name(name)
+
+        if not key:
+            return None
+
+        action = {
+            "scope"  : key.split(DISPATCH_TOKEN_SEPARATOR)[0],
+            "context": context or None,
+            "path"   : name,
+            "help"   : None
+        }
+        action.update(attributes)
+
+        return key, action
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ActionManifest.scan_directory", "manifest")
+    def scan_directory(self, context):
+        """ Finds the actions of one directory
+
+            Returns:
+                Dict mapping action keys to actions
+        """
+
+        actions = {}
+
+        try:
+            names = sorted(os.listdir(path.join(self.actions_path, context)))
+        except OSError:
+            return actions
+
+        for name in names:
+
+            if name.startswith(".") or name.endswith(MANIFEST_SIDECAR_EXTENSION):
+                continue
+
+            described = self.describe_action(context, name)
+
+            if described is not None:
+                actions.setdefault(*described)
+
+        return actions
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ActionManifest.refresh", "manifest")
+    def refresh(self, rescan=False):
+        """ Scans the directories that changed since the last refresh
+
+            Args:
+                rescan: Scans every directory again
+
+            Returns:
+                The number of scanned directories
+        """
+
+        directories = list_directories(self.actions_path) or {}
+        scanned     = 0
+
+        for context in self.directories.keys():
+            if context not in directories:
+                del self.directories[context]
+
+        for context, mtime in directories.iteritems():
+
+            known = self.directories.get(context)
+
+            if not rescan and known is not None and known["mtime"] == mtime:
+                self.stats["reused"] += 1
+                continue
+
+            self.directories[context] = {"mtime": mtime, "actions": self.scan_directory(context)}
+            self.stats["scanned"] += 1
+
+            scanned += 1
+
+        return scanned
+
+    # ------------------------------------------------------------------------------
+
+    def get_actions(self):
+        """ Gets every discovered action
+
+            A key found in several directories is given to the first one
+            (actions without context first, then by context name).
+
+            Returns:
+                Dict mapping action keys to actions
+        """
+
+        actions = {}
+
+        for context in sorted(self.directories):
+            for key, action in self.directories[context]["actions"].iteritems():
+                actions.setdefault(key, action)
+
+        return actions
@@ -0,0 +1,201 @@
+"""
+PIPELINE : Runs several actions connected by pipes
+
+    logan list:files:usr /tmp '|' filter:lines foo
+
+The stages are split on the '|' arguments of the command line, before
+it is parsed: a '|' inside a quoted argument is a param like any other.
+The first stage is parsed like any command (options included), the
+arguments of a next stage are its action followed by its params.
+
+Every stage is resolved by the same Agent (so the config is loaded once)
+and the stages are connected with 'os.pipe': the data flows from one
+action to the next one in the kernel, never through python. Only the
+output of the last stage and the errors of every stage are collected.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+import time
+import os
+
+
+# Token separating the stages of a pipeline
+PIPELINE_SEPARATOR = "|"
+
+
+# ================
+# HELPERS
+# ================
+
+def split_pipeline(argv):
+    """ Splits a command line into the arguments of its stages
+
+        Args:
+            argv: Eg: ['list:files:usr', '/tmp', '|', 'filter:lines', 'foo  bar']
+
+        Returns:
+            List of argument lists, one per stage
+            Eg: [['list:files:usr', '/tmp'], ['filter:lines', 'foo  bar']]
+    """
+
+    stages = [[]]
+
+    for arg in argv:
+        if arg == PIPELINE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+
+    return stages
+
+# ------------------------------------------------------------------------------
+
+def is_pipeline(argv):
+
+    return PIPELINE_SEPARATOR in argv
+
+# ------------------------------------------------------------------------------
+
+def stage_command(args):
+    """ Command of a stage from its arguments
+
+        Eg: ['filter:lines', 'foo  bar'] => 'filter:lines foo  bar'
+    """
+
+    return " ".join(args)
+
+
+# ================
+# CLASSES
+# ================
+
+class Pipeline(object):
+    """ Actions of several commands connected by pipes
+
+        Args:
+            agent:    Agent used to resolve every stage
+            commands: Commands of the stages. @see stage_command
+    """
+
+    def __init__(self, agent, commands):
+
+        self.agent    = agent
+        self.commands = commands
+
+    # ------------------------------------------------------------------------------
+
+    def resolve(self):
+        """ Resolves every stage
+
+            Returns:
+                List of process commands. @see Agent.build_command_from_action
+
+            Raises:
+                @see Agent.resolve_command
+        """
+
+        return [self.agent.resolve_command(command)[1] for command in self.commands]
+
+    # ------------------------------------------------------------------------------
+
+    def run(self):
+        """ Runs every stage and waits for all of them
+
+            Returns:
+                Dict as the result of action performing:
+                output = {
+                    "out"   : "...",    (output of the last stage)
+                    "err"   : "...",    (errors of every stage)
+                    "code"  : 0/1,      (return code of the last stage)
+                    "stages": [
+                        {"command": "...", "code": 0, "duration": 0.01},
+                        ...
+                    ]
+                }
+        """
+
+        from batch import read_and_close
+        import subprocess
+        import tempfile
+
+        stages_args = self.resolve()
+
+        stages  = []
+        running = {}
+        stdin   = None
+        out     = tempfile.TemporaryFile()
+
+        try:
+            for index, (command, args) in enumerate(zip(self.commands, stages_args)):
+
+                last = index == len(stages_args) - 1
+
+                read_end, write_end = (None, None) if last else os.pipe()
+
+                err = tempfile.TemporaryFile()
+
+                try:
+                    process = subprocess.Popen(args, shell=False, close_fds=True,
+                                               stdin  = stdin,
+                                               stdout = out if last else write_end,
+                                               stderr = err)
+                except OSError:
+                    if read_end is not None:
+                        os.close(read_end)
+                    raise
+                finally:
+                    # The children own their copies of the pipe ends
+                    if stdin is not None:
+                        os.close(stdin)
+                    if write_end is not None:
+                        os.close(write_end)
+
+                stdin = read_end
+
+                stage = {
+                    "command" : command,
+                    "code"    : None,
+                    "duration": None,
+                    "start"   : time.time(),
+                    "err"     : err
+                }
+                stages.append(stage)
+                running[process.pid] = (stage, process)
+
+        except OSError:
+            # Stages already started get EOF and end by themselves
+            self.wait(running)
+            raise
+
+        self.wait(running)
+
+        for stage in stages:
+            del stage["start"]
+            stage["err"] = read_and_close(stage["err"])
+
+        return {
+            "out"   : read_and_close(out),
+            "err"   : "".join(stage["err"] for stage in stages),
+            "code"  : stages[-1]["code"],
+            "stages": stages
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def wait(self, running):
+        """ Reaps every stage and records its return code and duration
+        """
+
+        from batch import wait_any
+
+        while running:
+
+            stage, process = running.pop(wait_any(dict(
+                (pid, process) for pid, (stage, process) in running.iteritems()
+            )))
+
+            stage["code"]     = process.returncode
+            stage["duration"] = time.time() - stage["start"]
@@ -0,0 +1,229 @@
+"""
+RESULTS : On-disk cache of action results
+
+Read-only actions can declare themselves as cacheable in the config:
+
+    "list:files":
+        context: usr
+        path: ls
+        cacheable: true
+        ttl: 60                         (seconds, default: no expiry)
+        depends: ["~/data/files.csv"]   (files whose change invalidates results)
+
+Their result ({out, err, code}) is stored under a key made of the action
+path, its params, its context and the fingerprints of its dependencies.
+Each entry is one file, written atomically. The cache is bounded in size:
+the least recently used entries are evicted first. The size is counted as
+entries are stored, the directory is only listed when the count passes the
+limit (and every 'RESCAN_PUTS' stores, to see other processes' entries).
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import file_fingerprint
+from tracing import traced
+from os import path
+from hashlib import sha1
+import cPickle
+import time
+import os
+
+
+class ResultCache(object):
+    """ Size-bounded LRU cache of action results with a TTL per entry
+
+        Args:
+            cache_dir: Directory holding one file per entry
+            max_size:  Maximum size of the cache in bytes
+    """
+
+    ENTRY_EXTENSION = ".result"
+
+    # Stores after which the size is counted again from the directory
+    RESCAN_PUTS = 256
+
+    def __init__(self, cache_dir, max_size=32 * 1024 * 1024):
+
+        self.cache_dir = cache_dir
+        self.max_size  = max_size
+
+        # Size of the entries in bytes, None until the directory is listed
+        self.size = None
+        self.puts = 0
+
+        self.stats = {
+            "hits"     : 0,
+            "misses"   : 0,
+            "evictions": 0
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def make_key(self, command, context=None, dependencies=None):
+        """ Builds the key of an action result
+
+            Args:
+                command:        Process command of the action (path and params)
+                                @see Agent.build_command_from_action
+                context:        Action context
+                dependencies:   Paths of the files the result depends on
+
+            Returns:
+                String key
+        """
+
+        fingerprints = [
+            (dependency, file_fingerprint(path.expanduser(dependency)))
+            for dependency in dependencies or []
+        ]
+
+        return sha1(repr((list(command), context, fingerprints))).hexdigest()
+
+    # ------------------------------------------------------------------------------
+
+    def get_entry_path(self, key):
+
+        return path.join(self.cache_dir, key + self.ENTRY_EXTENSION)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ResultCache.get", "cache")
+    def get(self, key, ttl=None):
+        """ Gets a stored result
+
+            Args:
+                key: @see make_key
+                ttl: Seconds a result stays valid (None: until evicted)
+
+            Returns:
+                Dict as {"out": "...", "err": "...", "code": 0} or None
+        """
+
+        entry_path = self.get_entry_path(key)
+
+        try:
+            with open(entry_path, "rb") as entry_file:
+                entry = cPickle.load(entry_file)
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            self.stats["misses"] += 1
+            return None
+
+        if ttl is not None and time.time() - entry.get("created", 0) > ttl:
+            self.stats["misses"] += 1
+            return None
+
+        # Marks the entry as recently used
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+
+        self.stats["hits"] += 1
+
+        return entry.get("result")
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ResultCache.put", "cache")
+    def put(self, key, result):
+        """ Stores a result, then evicts old entries if the cache is too big
+
+            Returns:
+                Boolean: Whether or not the result has been stored
+        """
+
+        if not path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                if not path.isdir(self.cache_dir):
+                    return False
+
+        entry_path = self.get_entry_path(key)
+        tmp_path   = "{}.{}.tmp".format(entry_path, os.getpid())
+
+        try:
+            replaced_size = path.getsize(entry_path)
+        except OSError:
+            replaced_size = 0
+
+        try:
+            with open(tmp_path, "wb") as entry_file:
+                cPickle.dump({"created": time.time(), "result": result}, entry_file, cPickle.HIGHEST_PROTOCOL)
+                entry_size = entry_file.tell()
+            os.rename(tmp_path, entry_path)
+        except (IOError, OSError):
+            return False
+        finally:
+            if path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        self.puts += 1
+
+        if self.size is not None:
+            self.size += entry_size - replaced_size
+
+        if self.size is None or self.size > self.max_size or self.puts % self.RESCAN_PUTS == 0:
+            self.evict()
+
+        return True
+
+    # ------------------------------------------------------------------------------
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits 'max_size'
+
+            Lists the whole directory: called by 'put' only when needed.
+        """
+
+        entries = []
+        size    = 0
+
+        for name in os.listdir(self.cache_dir):
+
+            if not name.endswith(self.ENTRY_EXTENSION):
+                continue
+
+            entry_path = path.join(self.cache_dir, name)
+
+            try:
+                stats = os.stat(entry_path)
+            except OSError:
+                continue
+
+            entries.append((stats.st_mtime, stats.st_size, entry_path))
+            size += stats.st_size
+
+        entries.sort()
+
+        while entries and size > self.max_size:
+
+            mtime, entry_size, entry_path = entries.pop(0)
+
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+
+            size -= entry_size
+            self.stats["evictions"] += 1
+
+        self.size = size
+
+    # ------------------------------------------------------------------------------
+
+    def clear(self):
+
+        if not path.isdir(self.cache_dir):
+            return
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.ENTRY_EXTENSION):
+                os.remove(path.join(self.cache_dir, name))
+
+        self.size = 0
@@ -0,0 +1,295 @@
+"""
+SHARDS : Config of the actions split into one file per verb namespace
+
+Large catalogs can move their actions out of 'loganrc.default' into the
+'loganrc.d' directory of the logan root, one YAML file per verb:
+
+    loganrc.d/list.yml
+    --
+    "list:files":
+        context: usr
+        path: ls
+        help: |
+            NAME
+                ls - list directory contents
+    "list:servers":
+        ...
+    --
+
+Finding an action only parses (or unpickles, once cached) the shard of
+its verb. The 'help' bodies are cached apart from the actions: they are
+only read by 'logan help <action>'. Actions of another verb found in a
+shard are ignored.
+
+The YAML config files and the discovered actions override the actions
+of the shards.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from utils import load_file, file_fingerprint, FileTypes
+from exceptions import LoganCacheError, LoganLoadConfigError
+from dispatch import DISPATCH_TOKEN_SEPARATOR
+from tracing import traced
+from os import path
+import os
+
+
+# Extension of the shard files
+SHARD_EXTENSION = ".yml"
+
+# Cache keys of the actions and of the help bodies of a shard
+SHARD_CACHE_KEY      = "logan.cache.shard.{}"
+SHARD_HELP_CACHE_KEY = "logan.cache.help.{}"
+
+
+# ================
+# HELPERS
+# ================
+
+def shard_name(key):
+    """ Shard of an action key: its verb. Eg: 'list:files' => 'list'
+    """
+
+    return key.split(DISPATCH_TOKEN_SEPARATOR, 1)[0]
+
+# ------------------------------------------------------------------------------
+
+def list_shards(shards_path):
+    """ Lists the shard files
+
+        Returns:
+            Dict mapping shard names to file paths
+    """
+
+    try:
+        file_names = os.listdir(shards_path)
+    except OSError:
+        return {}
+
+    return dict(
+        (file_name[:-len(SHARD_EXTENSION)], path.join(shards_path, file_name))
+        for file_name in file_names
+        if file_name.endswith(SHARD_EXTENSION) and not file_name.startswith(".")
+    )
+
+# ------------------------------------------------------------------------------
+
+def shards_fingerprint(shards_path, content_hash=False):
+    """ Fingerprints every shard file (one 'stat' call per file)
+
+        Returns:
+            Tuple of (shard name, file fingerprint) or None when there is
+            no shard. @see utils.file_fingerprint
+    """
+
+    shards = list_shards(shards_path)
+
+    if not shards:
+        return None
+
+    return tuple(sorted(
+        (name, file_fingerprint(file_path, content_hash)) for name, file_path in shards.iteritems()
+    ))
+
+# ------------------------------------------------------------------------------
+
+@traced("shards.parse_shard", "config")
+def parse_shard(name, file_path):
+    """ Reads the actions of a shard file
+
+        Returns:
+            Tuple as (actions, helps): the actions without their 'help'
+            and the 'help' of every action having one
+
+        Raises:
+            LoganLoadConfigError: The shard is not a mapping of actions
+    """
+
+    content = load_file(file_path, type=FileTypes.YAML) or {}
+
+    if not isinstance(content, dict):
+        raise LoganLoadConfigError("Logan : The shard %s is not a mapping of actions" % file_path)
+
+    actions = {}
+    helps   = {}
+
+    for key, action in content.iteritems():
+
+        if not isinstance(action, dict) or shard_name(key) != name:
+            continue
+
+        action = dict(action)
+        help   = action.pop("help", None)
+
+        if help is not None:
+            helps[key] = help
+
+        actions[key] = action
+
+    return actions, helps
+
+
+# ================
+# CLASSES
+# ================
+
+class ShardStore(object):
+    """ Actions of the shard files, read one shard at a time
+
+        Args:
+            shards_path:    Directory of the shard files ('<root>/loganrc.d')
+            cache:          ConfigCache the parsed shards are kept in
+            content_hash:   Whether fingerprints also hash the file contents
+    """
+
+    def __init__(self, shards_path, cache, content_hash=False):
+
+        self.shards_path  = shards_path
+        self.cache        = cache
+        self.content_hash = content_hash
+
+        # Shards already read by this process: name => (fingerprint, actions)
+        self.shards = {}
+
+        self.stats = {
+            "hits"  : 0,
+            "parsed": 0
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def get_shard_path(self, name):
+
+        return path.join(self.shards_path, name + SHARD_EXTENSION)
+
+    # ------------------------------------------------------------------------------
+
+    def store(self, key, value):
+        """ Caches a parsed shard, reading it again next time when it fails
+        """
+
+        try:
+            self.cache.put(key, value)
+        except LoganCacheError as e:
+            print e
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ShardStore.get_shard", "config")
+    def get_shard(self, name, fingerprint=None):
+        """ Gets the actions of a shard, without their 'help'
+
+            Args:
+                name:           Shard name. Eg: 'list'
+                fingerprint:    Fingerprint of the shard file when already known
+
+            Returns:
+                Dict mapping action keys to actions (empty when there is
+                no such shard)
+        """
+
+        file_path = self.get_shard_path(name)
+
+        if fingerprint is None:
+            fingerprint = file_fingerprint(file_path, self.content_hash)
+
+        if fingerprint is None:
+            return {}
+
+        known = self.shards.get(name)
+
+        if known is not None and known[0] == fingerprint:
+            self.stats["hits"] += 1
+            return known[1]
+
+        cached = self.cache.get(SHARD_CACHE_KEY.format(name))
+
+        if cached and cached.get("fingerprint") == fingerprint:
+            self.stats["hits"] += 1
+            actions = cached["actions"]
+
+        else:
+            actions, helps = parse_shard(name, file_path)
+
+            self.stats["parsed"] += 1
+
+            # Help bodies are stored first: a fresh shard entry implies fresh help
+            self.store(SHARD_HELP_CACHE_KEY.format(name), {"fingerprint": fingerprint, "helps": helps})
+            self.store(SHARD_CACHE_KEY.format(name), {"fingerprint": fingerprint, "actions": actions})
+
+        self.shards[name] = (fingerprint, actions)
+
+        return actions
+
+    # ------------------------------------------------------------------------------
+
+    def get_action(self, key, fingerprints=None):
+        """ Gets an action of the shards, without its 'help'
+
+            Args:
+                key:            Action key. Eg: 'list:files'
+                fingerprints:   Fingerprints of the shards when already known
+                                @see shards_fingerprint
+
+            Returns:
+                Dict or None
+        """
+
+        name = shard_name(key)
+
+        if fingerprints is None:
+            return self.get_shard(name).get(key)
+
+        fingerprint = dict(fingerprints).get(name)
+
+        if fingerprint is None:
+            return None
+
+        return self.get_shard(name, fingerprint).get(key)
+
+    # ------------------------------------------------------------------------------
+
+    @traced("ShardStore.get_help", "config")
+    def get_help(self, key):
+        """ Gets the 'help' body of an action of the shards
+
+            Returns:
+                String or None
+        """
+
+        name        = shard_name(key)
+        fingerprint = file_fingerprint(self.get_shard_path(name), self.content_hash)
+
+        if fingerprint is None:
+            return None
+
+        cached = self.cache.get(SHARD_HELP_CACHE_KEY.format(name))
+
+        if not cached or cached.get("fingerprint") != fingerprint:
+            # Parsed and cached again with the actions
+            self.shards.pop(name, None)
+            self.cache.delete(SHARD_CACHE_KEY.format(name))
+            self.get_shard(name, fingerprint)
+
+            cached = self.cache.get(SHARD_HELP_CACHE_KEY.format(name)) or {}
+
+        return cached.get("helps", {}).get(key)
+
+    # ------------------------------------------------------------------------------
+
+    def get_actions(self):
+        """ Gets the actions of every shard, without their 'help'
+
+            Returns:
+                Dict mapping action keys to actions
+        """
+
+        actions = {}
+
+        for name in sorted(list_shards(self.shards_path)):
+            actions.update(self.get_shard(name))
+
+        return actions
@@ -0,0 +1,144 @@
+"""
+STREAMS : Forwards the output of a running action as it arrives
+
+Both pipes of the child process are multiplexed with 'poll' and every
+chunk read is written to its destination before the next read: when the
+destination is slow, the pipe fills up and the child blocks (backpressure)
+instead of having its output buffered in memory. Only a bounded tail of
+each stream is kept for the summary.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from collections import deque
+import select
+import errno
+import os
+
+
+# Bytes read from a pipe at once
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bytes of each stream kept for the summary
+STREAM_TAIL_SIZE  = 4 * 1024
+
+
+# ================
+# CLASSES
+# ================
+
+class StreamTail(object):
+    """ Keeps the last 'size' bytes written to it and counts them all
+    """
+
+    def __init__(self, size=STREAM_TAIL_SIZE):
+
+        self.size   = size
+        self.chunks = deque()
+        self.length = 0
+        self.total  = 0
+
+    # ------------------------------------------------------------------------------
+
+    def write(self, chunk):
+
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        self.total  += len(chunk)
+
+        # Drops whole chunks that are not needed anymore
+        while self.chunks and self.length - len(self.chunks[0]) >= self.size:
+            self.length -= len(self.chunks.popleft())
+
+    # ------------------------------------------------------------------------------
+
+    def getvalue(self):
+
+        data = "".join(self.chunks)
+
+        return data[-self.size:] if self.size else ""
+
+
+# ================
+# HELPERS
+# ================
+
+def forward_chunk(chunk, destination):
+    """ Writes a chunk to its destination (file object or None to drop it)
+    """
+
+    if destination is not None:
+        destination.write(chunk)
+        destination.flush()
+
+# ------------------------------------------------------------------------------
+
+def stream_process(process, stdout=None, stderr=None, tail_size=STREAM_TAIL_SIZE, chunk_size=STREAM_CHUNK_SIZE):
+    """ Forwards the output of a process started with both pipes until it exits
+
+        Args:
+            process:    subprocess.Popen started with stdout=PIPE and stderr=PIPE
+            stdout:     File object receiving the process stdout (None drops it)
+            stderr:     File object receiving the process stderr (None drops it)
+            tail_size:  Bytes of each stream kept in the result
+            chunk_size: Bytes read from a pipe at once
+
+        Returns:
+            Dict as the result of action performing:
+            output = {
+                "out"      : "...",     (last 'tail_size' bytes)
+                "err"      : "...",     (last 'tail_size' bytes)
+                "code"     : 0/1,
+                "out_bytes": 1234,
+                "err_bytes": 0
+            }
+    """
+
+    out_tail = StreamTail(tail_size)
+    err_tail = StreamTail(tail_size)
+
+    streams = {
+        process.stdout.fileno(): (stdout, out_tail),
+        process.stderr.fileno(): (stderr, err_tail)
+    }
+
+    poller = select.poll()
+    for fd in streams:
+        poller.register(fd, select.POLLIN | select.POLLPRI)
+
+    while streams:
+
+        try:
+            events = poller.poll()
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for fd, event in events:
+
+            chunk = os.read(fd, chunk_size)
+
+            # End of file: the process closed this stream
+            if not chunk:
+                poller.unregister(fd)
+                del streams[fd]
+                continue
+
+            destination, tail = streams[fd]
+
+            forward_chunk(chunk, destination)
+            tail.write(chunk)
+
+    process.stdout.close()
+    process.stderr.close()
+
+    return {
+        "out"      : out_tail.getvalue(),
+        "err"      : err_tail.getvalue(),
+        "code"     : process.wait(),
+        "out_bytes": out_tail.total,
+        "err_bytes": err_tail.total
+    }
@@ -0,0 +1,287 @@
+"""
+TRACING : Spans of the agent pipeline as Chrome trace events
+
+    LOGAN_TRACE=/tmp/logan.trace.json logan list:files:usr -ltr
+
+records a span around every traced function (config loading, cache
+accesses, action lookup, child process wait...) and writes them when
+the process exits, in the Chrome trace-event JSON format that
+chrome://tracing and Perfetto (https://ui.perfetto.dev) open.
+
+'{pid}' in the path is replaced by the process id, so that every process
+of a daemon or a batch writes its own trace. Processes leaving with
+'os._exit' (forked daemon children, background job workers) skip the
+exit handlers: they write their trace with 'write_trace' first.
+
+Tracing is decided when the modules are imported: when $LOGAN_TRACE is
+not set, 'traced' returns the functions undecorated and 'span' a shared
+no-op context, so that it costs nothing. A process starting to trace
+later ('start_tracing', eg: the daemon tracing a command forwarded with
+$LOGAN_TRACE) sets $LOGAN_TRACE_HOOKS before importing logan: the
+functions are then decorated and only record spans once tracing started.
+
+Repository and issue-tracker: https://github.com/first-developer/logan
+Licensed under terms of MIT license (see LICENSE)
+Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
+"""
+
+from functools import wraps
+from thread import get_ident
+import atexit
+import time
+import sys
+import os
+
+
+# Environment variable holding the path of the trace file
+TRACE_ENV_VARIABLE = "LOGAN_TRACE"
+
+# Environment variable decorating the traced functions even when tracing
+# is disabled, so that it can be started later
+TRACE_HOOKS_ENV_VARIABLE = "LOGAN_TRACE_HOOKS"
+
+
+# ================
+# CLASSES
+# ================
+
+class Tracer(object):
+    """ Collects spans and writes them as Chrome trace events
+
+        Args:
+            trace_path: Path of the trace file ('{pid}' is replaced by the process id)
+    """
+
+    def __init__(self, trace_path):
+
+        self.trace_path = trace_path
+        self.events     = []
+
+    # ------------------------------------------------------------------------------
+
+    def add_span(self, name, category, start, end, args=None):
+        """ Records a complete span
+
+            Args:
+                name:       Eg: 'Agent.load_config'
+                category:   Eg: 'agent'
+                start, end: Times as returned by 'time.time'
+                args:       Dict shown along with the span
+        """
+
+        event = {
+            "name": name,
+            "cat" : category,
+            "ph"  : "X",
+            "ts"  : start * 1000000,
+            "dur" : (end - start) * 1000000,
+            "pid" : os.getpid(),
+            "tid" : get_ident()
+        }
+
+        if args:
+            event["args"] = args
+
+        self.events.append(event)
+
+    # ------------------------------------------------------------------------------
+
+    def get_trace_path(self):
+
+        return self.trace_path.replace("{pid}", str(os.getpid()))
+
+    # ------------------------------------------------------------------------------
+
+    def write(self):
+        """ Writes the spans recorded by this process
+
+            Returns:
+                The path of the trace file or None if nothing has been recorded
+        """
+
+        import json
+
+        pid    = os.getpid()
+        events = [event for event in self.events if event["pid"] == pid]
+
+        if not events:
+            return None
+
+        metadata = {
+            "name": "process_name",
+            "ph"  : "M",
+            "pid" : pid,
+            "args": {"name": "logan " + " ".join(sys.argv[1:])}
+        }
+
+        trace_path = self.get_trace_path()
+
+        try:
+            with open(trace_path, "w") as trace_file:
+                json.dump({"traceEvents": [metadata] + events, "displayTimeUnit": "ms"}, trace_file)
+        except IOError as e:
+            sys.stderr.write("[LOGAN] : Unable to write the trace ({})\n".format(e))
+            return None
+
+        return trace_path
+
+# ------------------------------------------------------------------------------
+
+class Span(object):
+    """ Context recording a span with the tracer
+
+        Eg: with span("child wait", "process"):
+                process.wait()
+    """
+
+    def __init__(self, tracer, name, category, args=None):
+
+        self.tracer   = tracer
+        self.name     = name
+        self.category = category
+        self.args     = args
+
+    # ------------------------------------------------------------------------------
+
+    def __enter__(self):
+
+        self.start = time.time()
+
+        return self
+
+    # ------------------------------------------------------------------------------
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.tracer.add_span(self.name, self.category, self.start, time.time(), self.args)
+
+        return False
+
+# ------------------------------------------------------------------------------
+
+class NullSpan(object):
+    """ Context doing nothing, used when tracing is disabled
+    """
+
+    def __enter__(self):
+
+        return self
+
+    # ------------------------------------------------------------------------------
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+# ================
+# HELPERS
+# ================
+
+def create_tracer(trace_path):
+    """ Creates a tracer whose spans are written when the process exits
+    """
+
+    tracer = Tracer(trace_path)
+
+    atexit.register(tracer.write)
+
+    return tracer
+
+
+# Tracer of the process, None when tracing is disabled
+tracer = create_tracer(os.environ[TRACE_ENV_VARIABLE]) if os.environ.get(TRACE_ENV_VARIABLE) else None
+
+# Whether the traced functions are decorated
+hooked = tracer is not None or bool(os.environ.get(TRACE_HOOKS_ENV_VARIABLE))
+
+# ------------------------------------------------------------------------------
+
+def start_tracing(trace_path):
+    """ Records the spans of the current process into a new trace file
+
+        Only the functions decorated when the modules have been imported
+        are traced, @see TRACE_HOOKS_ENV_VARIABLE
+
+        Returns:
+            The Tracer
+    """
+
+    global tracer
+
+    tracer = create_tracer(trace_path)
+
+    return tracer
+
+# ------------------------------------------------------------------------------
+
+def write_trace():
+    """ Writes the spans of the current process now, for processes
+        leaving with 'os._exit'
+
+        Returns:
+            @see Tracer.write
+    """
+
+    if tracer is None:
+        return None
+
+    return tracer.write()
+
+# ------------------------------------------------------------------------------
+
+def span(name, category="logan", args=None):
+    """ Context recording a span
+
+        Args:
+            name:       Eg: 'child wait'
+            category:   Eg: 'process'
+            args:       Dict shown along with the span
+    """
+
+    if tracer is None:
+        return NULL_SPAN
+
+    return Span(tracer, name, category, args)
+
+# ------------------------------------------------------------------------------
+
+def traced(name=None, category="logan"):
+    """ Decorator recording a span around every call of a function
+
+        Args:
+            name:       Name of the span, default to the function name.
+                        Eg: 'Agent.load_config'
+            category:   Eg: 'agent'
+
+        Returns:
+            The function itself when tracing is disabled
+    """
+
+    def decorator(function):
+
+        if not hooked:
+            return function
+
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def traced_function(*args, **kwargs):
+
+            # Tracing may start later
+            if tracer is None:
+                return function(*args, **kwargs)
+
+            start = time.time()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.add_span(span_name, category, start, time.time())
+
+        return traced_function
+
+    return decorator
@@ -9,6 +9,7 @@ Copyright (c) 2013 first-developer <lionel.firstdeveloper@gmail.com>
 
 from exceptions import LoganLoadFileError,\
                         LoganFileNotExistsError
+from tracing import traced
 from os import path
 
 
@@ -27,13 +28,23 @@ class FileTypes():
 
     YAML        = "yaml"
     JSON        = "json"
+    MARSHAL     = "marshal"
+    PICKLE      = "pickle"
     PLAIN_TEXT  = "text"
 
+# ------------------------------------------------------------------------------
+
+class YamlBackends():
+
+    LIBYAML     = "libyaml"
+    PYTHON      = "python"
+
 
 # ================
 # HELPERS
 # ================
 
+@traced("utils.dict_merge", "config")
 def dict_merge(a, b):
     """
     @author: Ross McFarland
@@ -58,6 +69,39 @@ def dict_merge(a, b):
 
 # ------------------------------------------------------------------------------
 
+@traced("utils.file_fingerprint", "stat")
+def file_fingerprint(file_path, content_hash=False):
+    """ Fingerprints a file with a single 'stat' call
+
+        Args:
+            file_path:      The file to fingerprint
+            content_hash:   Also hashes the file content (catches edits
+                            that keep the same mtime and size)
+
+        Returns:
+            Tuple as (mtime, size, inode[, sha1]) or None when the file
+            doesn't exist
+    """
+
+    from os import stat
+
+    try:
+        stats = stat(file_path)
+    except OSError:
+        return None
+
+    fingerprint = (stats.st_mtime, stats.st_size, stats.st_ino)
+
+    if content_hash:
+        from hashlib import sha1
+
+        with open(file_path, "rb") as file:
+            fingerprint += (sha1(file.read()).hexdigest(),)
+
+    return fingerprint
+
+# ------------------------------------------------------------------------------
+
 def random_string_in(collection):
     """ Return a random text in the given collection
 
@@ -75,15 +119,97 @@ def random_string_in(collection):
 
 # ------------------------------------------------------------------------------
 
+@traced("utils.load_file", "config")
 def load_file(path, type=None):
+    """ Loads data from the file located at the given path
+
+        Only the loader registered for the given type is called.
+        @see register_file_loader
+
+            Args:
+                path: The file path from where we want to get the content
+                type: One of 'FileTypes'. Default to 'FileTypes.PLAIN_TEXT'
+
+            Returns:
+                data: What the loader got from the file
+
+            Raises:
+                LoganLoadFileError:         Error occurred when there is no
+                                            loader for the given type
+    """
 
     type = type or FileTypes.PLAIN_TEXT
 
-    # Switch like
-    return {
-        FileTypes.YAML      : load_yaml_file(path),
-        FileTypes.PLAIN_TEXT: load_text_file(path)
-    }[type]
+    loader = FILE_LOADERS.get(type)
+
+    if loader is None:
+        raise LoganLoadFileError("Logan : Unable to load '%s' files" % type)
+
+    return loader(path)
+
+# ------------------------------------------------------------------------------
+
+def register_file_loader(type, loader):
+    """ Registers the function used by 'load_file' to load files of the given type
+
+            Args:
+                type:   File type. Eg: FileTypes.YAML
+                loader: Function taking the file path and returning its data
+    """
+
+    FILE_LOADERS[type] = loader
+
+# ------------------------------------------------------------------------------
+
+def get_yaml_loader():
+    """ Gets the fastest safe YAML loader available
+
+        The libyaml based 'CSafeLoader' is used when PyYAML has been
+        built with it, the pure python 'SafeLoader' otherwise.
+
+            Returns:
+                Tuple as (loader_class, backend). Eg: (CSafeLoader, "libyaml")
+    """
+
+    global YAML_LOADER
+
+    if YAML_LOADER is None:
+        try:
+            from yaml import CSafeLoader
+            YAML_LOADER = (CSafeLoader, YamlBackends.LIBYAML)
+        except ImportError:
+            from yaml import SafeLoader
+            YAML_LOADER = (SafeLoader, YamlBackends.PYTHON)
+
+    return YAML_LOADER
+
+# ------------------------------------------------------------------------------
+
+def get_yaml_backend():
+    """ Tells which YAML backend is used to load YAML files
+
+            Returns:
+                One of 'YamlBackends'
+    """
+
+    return get_yaml_loader()[1]
+
+# ------------------------------------------------------------------------------
+
+def open_existing_file(file_path, mode="r"):
+    """ Opens the file located at the given path
+
+            Raises:
+                LoganFileNotExistsError:    Error occurred when the file
+                                            linked to the given file path
+                                            doesn't exist
+    """
+
+    # Check if the file exist before trying to read it
+    if not path.exists(file_path):
+        raise LoganFileNotExistsError("Logan : Unable to open the file specified at %s " % file_path)
+
+    return open(file_path, mode)
 
 # ------------------------------------------------------------------------------
 
@@ -107,22 +233,64 @@ def load_yaml_file(file_path):
     from yaml import load
     from yaml import YAMLError
 
-    data = None
+    loader, backend = get_yaml_loader()
 
-    # Check if the file exist before trying to read it
-    if path.exists(file_path):
-        with open(file_path) as file:
-            data_content = file.read()
-            try:
-                data = load(data_content)
-            except YAMLError as e:
-                raise LoganLoadFileError("Logan : Unable to load file from %s" % file_path)
-
-            file.close()
-
-        return data
-    else:
-        raise LoganFileNotExistsError("Logan : Unable to open the file specified at %s " % file_path)
+    with open_existing_file(file_path) as file:
+        try:
+            return load(file.read(), Loader=loader)
+        except YAMLError as e:
+            raise LoganLoadFileError("Logan : Unable to load file from %s" % file_path)
+
+# ------------------------------------------------------------------------------
+
+def load_json_file(file_path):
+    """ Loads data from a JSON file located a the given path
+
+            @see load_yaml_file
+    """
+
+    from json import load
+
+    with open_existing_file(file_path) as file:
+        try:
+            return load(file)
+        except ValueError as e:
+            raise LoganLoadFileError("Logan : Unable to load file from %s" % file_path)
+
+# ------------------------------------------------------------------------------
+
+def load_marshal_file(file_path):
+    """ Loads data from a snapshot written with 'marshal.dump'
+
+        Marshal snapshots are the fastest to load but only hold
+        builtin types and are bound to the python version.
+
+            @see load_yaml_file
+    """
+
+    from marshal import load
+
+    with open_existing_file(file_path, "rb") as file:
+        try:
+            return load(file)
+        except (EOFError, ValueError, TypeError) as e:
+            raise LoganLoadFileError("Logan : Unable to load file from %s" % file_path)
+
+# ------------------------------------------------------------------------------
+
+def load_pickle_file(file_path):
+    """ Loads data from a snapshot written with 'pickle.dump'
+
+            @see load_yaml_file
+    """
+
+    from cPickle import load, UnpicklingError
+
+    with open_existing_file(file_path, "rb") as file:
+        try:
+            return load(file)
+        except (EOFError, ValueError, UnpicklingError) as e:
+            raise LoganLoadFileError("Logan : Unable to load file from %s" % file_path)
 
 # ------------------------------------------------------------------------------
 
@@ -143,12 +311,20 @@ def load_text_file(file_path):
                                             doesn't exist
     """
 
-    # Check if the file exist before trying to read it
-    if path.exists(file_path):
-        with open(file_path) as file:
-            data = file.read()
-            file.close()
+    with open_existing_file(file_path) as file:
+        return file.read()
 
-        return data
-    else:
-        raise LoganFileNotExistsError("Logan : Unable to open the file specified at %s " % file_path)
+
+# ================
+# LOADERS
+# ================
+
+FILE_LOADERS = {}
+
+YAML_LOADER  = None
+
+register_file_loader(FileTypes.YAML,        load_yaml_file)
+register_file_loader(FileTypes.JSON,        load_json_file)
+register_file_loader(FileTypes.MARSHAL,     load_marshal_file)
+register_file_loader(FileTypes.PICKLE,      load_pickle_file)
+register_file_loader(FileTypes.PLAIN_TEXT,  load_text_file)
@@ -0,0 +1,49 @@
+""" Helpers shared by the tests that run real actions
+"""
+
+import tempfile
+import yaml
+import os
+
+
+def build_logan_root(actions):
+    """ Creates a temporary logan root directory with shell script actions
+
+        Args:
+            actions: Dict mapping action keys to (context, name, script[, attributes])
+                     Eg: {"say:hello": ("usr", "hello", "echo hello $1")}
+                     'attributes' are added to the action config
+
+        Returns:
+            The path of the logan root directory
+    """
+
+    root_dir = tempfile.mkdtemp()
+    config   = {"logan": {"options": None}, "actions": {}}
+
+    for key, action in actions.iteritems():
+
+        context, name, script = action[:3]
+
+        action_dir = os.path.join(root_dir, "actions", context or "")
+
+        if not os.path.isdir(action_dir):
+            os.makedirs(action_dir)
+
+        action_path = os.path.join(action_dir, name)
+
+        with open(action_path, "w") as action_file:
+            action_file.write("#!/bin/sh\n{}\n".format(script))
+
+        os.chmod(action_path, 0755)
+
+        config["actions"][key] = {"scope": key.split(":")[0], "context": context, "path": name}
+        config["actions"][key].update(action[3] if len(action) > 3 else {})
+
+    with open(os.path.join(root_dir, "loganrc.default"), "w") as default_config:
+        yaml.safe_dump(config, default_config, default_flow_style=False)
+
+    with open(os.path.join(root_dir, "loganrc"), "w") as user_config:
+        yaml.safe_dump({"logan": {"options": None}}, user_config, default_flow_style=False)
+
+    return root_dir
@@ -3,6 +3,9 @@ from logan import Agent
 from logan import LoganConfigFileNotExistsError,\
                   LoganFileNotExistsError,\
                   LoganLoadFileError
+import tempfile
+import shutil
+import glob
 import os.path
 
 
@@ -35,12 +38,16 @@ class TestAgent(TestCase):
     def tearDown(self):
 
 
-        # Try to remove cache file if exist
-        # The file is named : logan.cache.db
-        try:
-            os.remove(self.agent.logan_cache_path + ".db")
-        except:
-            pass
+        # Try to remove the cache files if exist
+        # The files are named : logan.cache.<entry>
+        if self.agent is None:
+            return
+
+        for cache_path in glob.glob(self.agent.logan_cache_path + ".*"):
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
 
 
     # ------------------------------------------------------------------------------
@@ -386,3 +393,53 @@ class TestAgent(TestCase):
 
     def test_logan_executes_action_command_entered_by_user(self): pass
 
+    # ------------------------------------------------------------------------------
+
+    def build_agent_on_a_copy_of_fixtures(self):
+        """ Creates an agent working on a copy of the fixtures config files
+        """
+
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir)
+
+        shutil.copy(self.DEFAULT_CONFIG_FILEPATH, root_dir)
+        shutil.copy(self.USER_CONFIG_FILEPATH,    root_dir)
+
+        return Agent(root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_cached_config_is_used_while_config_files_are_unchanged(self):
+        """ A second agent gets the config from the cache """
+
+        self.agent = self.build_agent_on_a_copy_of_fixtures()
+        self.agent.load_config()
+
+        agent = Agent(self.agent.root_dir)
+        agent.load_config()
+        agent.load_config()
+
+        self.assertEqual(self.agent.cache_stats.get("misses"), 1, "The first load must miss the cache")
+        self.assertEqual(agent.cache_stats.get("hits"),        2, "Unchanged config must hit the cache")
+        self.assertEqual(agent.cache_stats.get("rebuilds"),    0, "Unchanged config must not be rebuilt")
+
+    # ------------------------------------------------------------------------------
+
+    def test_cached_config_is_rebuilt_when_a_config_file_changes(self):
+        """ Editing the user config invalidates the cached config """
+
+        self.agent = self.build_agent_on_a_copy_of_fixtures()
+        self.agent.load_config()
+
+        with open(self.agent.user_config_file_path) as user_config:
+            content = user_config.read()
+
+        with open(self.agent.user_config_file_path, "w") as user_config:
+            user_config.write(content.replace("path: create", "path: dir"))
+
+        config = self.agent.load_config()
+
+        self.assertEqual(self.agent.cache_stats.get("rebuilds"), 1, "The changed config must be rebuilt")
+        self.assertEqual(config.get("actions").get(self.LOGAN_TEST_ACTION).get("path"), "dir",
+                         "The cached config has not been invalidated")
+
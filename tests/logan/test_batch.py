@@ -0,0 +1,153 @@
+from unittest import TestCase
+from logan import Agent
+from logan.batch import BatchRunner, ChildExits, read_batch_commands, wait_any
+from helpers import build_logan_root
+from StringIO import StringIO
+import subprocess
+import threading
+import signal
+import shutil
+import json
+import time
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1"),
+            "take:time": ("usr", "sleep", "sleep $1; echo slept $1"),
+            "fail:now" : ("usr", "fail",  "echo failed >&2; exit 2")
+        })
+
+        self.SUCCESS_CODE = 0
+        self.FAILURE_CODE = 1
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_read_batch_commands_from_text_and_jsonl(self):
+
+        lines = [
+            "say:hello:usr world\n",
+            "\n",
+            "# comment\n",
+            '{"command": "fail:now:usr x"}\n',
+            '{"argv": ["take:time:usr", "0"]}\n'
+        ]
+
+        self.assertEqual(read_batch_commands(lines),
+                         ["say:hello:usr world", "fail:now:usr x", "take:time:usr 0"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_jsonl_entries_without_a_command_are_rejected(self):
+
+        for entry in ('{"comand": "say:hello:usr"}', '{"argv": []}', '{"command": ""}'):
+            with self.assertRaisesRegexp(ValueError, "line 2"):
+                read_batch_commands(["say:hello:usr world\n", entry + "\n"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_runs_every_command_and_aggregates_return_codes(self):
+
+        runner = BatchRunner(Agent(self.root_dir), jobs=2, output=None)
+
+        return_code, records = runner.run(["say:hello:usr world", "fail:now:usr x", "wrong syntax"])
+
+        self.assertEqual(return_code, self.FAILURE_CODE)
+        self.assertEqual([record["code"] for record in records], [0, 2, self.FAILURE_CODE])
+        self.assertEqual(records[0]["out"], "hello world\n")
+        self.assertEqual(records[1]["err"], "failed\n")
+        self.assertIsNotNone(records[2]["error"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_succeeds_when_every_command_succeeds(self):
+
+        runner = BatchRunner(Agent(self.root_dir), output=None)
+
+        return_code, records = runner.run(["say:hello:usr a", "say:hello:usr b"])
+
+        self.assertEqual(return_code, self.SUCCESS_CODE)
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_shows_results_in_order_or_as_completed(self):
+
+        commands = ["take:time:usr 0.3", "say:hello:usr fast"]
+
+        ordered, as_completed = StringIO(), StringIO()
+
+        BatchRunner(Agent(self.root_dir), jobs=2, output=ordered, format="json").run(commands)
+        BatchRunner(Agent(self.root_dir), jobs=2, output=as_completed, format="json", ordered=False).run(commands)
+
+        ordered_indexes      = [json.loads(line)["index"] for line in ordered.getvalue().splitlines()]
+        as_completed_indexes = [json.loads(line)["index"] for line in as_completed.getvalue().splitlines()]
+
+        self.assertEqual(ordered_indexes,      [0, 1])
+        self.assertEqual(as_completed_indexes, [1, 0])
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_runs_actions_concurrently(self):
+
+        runner = BatchRunner(Agent(self.root_dir), jobs=4, output=None)
+
+        start = time.time()
+        return_code, records = runner.run(["take:time:usr 0.3"] * 4)
+
+        self.assertEqual(return_code, self.SUCCESS_CODE)
+        self.assertTrue(time.time() - start < 4 * 0.3, "Actions must run concurrently")
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_leaves_other_children_to_their_owner(self):
+
+        other = subprocess.Popen(["sh", "-c", "exit 5"])
+
+        return_code, records = BatchRunner(Agent(self.root_dir), output=None).run(["take:time:usr 0.2"])
+
+        self.assertEqual(return_code, self.SUCCESS_CODE)
+        self.assertEqual(other.wait(), 5, "The batch reaped a process it didn't start")
+
+    # ------------------------------------------------------------------------------
+
+    def test_exits_are_waited_for_without_polling(self):
+
+        process = subprocess.Popen(["sleep", "0.3"])
+        polls   = []
+        poll    = process.poll
+
+        def counting_poll():
+            polls.append(1)
+            return poll()
+
+        process.poll = counting_poll
+
+        self.assertEqual(wait_any({process.pid: process}), process.pid)
+        self.assertEqual(process.returncode, 0)
+        self.assertLess(len(polls), 5, "The process must not be polled in a loop")
+        self.assertEqual(signal.getsignal(signal.SIGCHLD), signal.SIG_DFL, "The SIGCHLD handler is restored")
+
+    # ------------------------------------------------------------------------------
+
+    def test_exits_are_waited_for_outside_of_the_main_thread(self):
+
+        process = subprocess.Popen(["sleep", "0.1"])
+        pids    = []
+
+        def wait():
+            with ChildExits() as child_exits:
+                pids.append(child_exits.pipe)
+            pids.append(wait_any({process.pid: process}))
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        thread.join(5)
+
+        self.assertEqual(pids, [None, process.pid])
@@ -0,0 +1,172 @@
+from unittest import TestCase
+from logan import Agent, LoganCacheError
+from logan.cache import ConfigCache
+from helpers import build_logan_root
+import multiprocessing
+import tempfile
+import shutil
+import os
+
+
+class TestCache(TestCase):
+
+    def setUp(self):
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache     = ConfigCache(self.cache_dir)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.cache_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_values_are_stored_and_read_back(self):
+
+        self.assertIsNone(self.cache.get("logan.cache.layers"))
+        self.assertFalse(self.cache.has_key("logan.cache.layers"))
+
+        self.cache["logan.cache.layers"] = {"user": {"fingerprint": (1, 2), "config": {}}}
+
+        self.assertTrue(self.cache.has_key("logan.cache.layers"))
+        self.assertEqual(self.cache["logan.cache.layers"], {"user": {"fingerprint": (1, 2), "config": {}}})
+
+        del self.cache["logan.cache.layers"]
+
+        self.assertRaises(KeyError, self.cache.__getitem__, "logan.cache.layers")
+
+        # Nothing is left behind but the entries
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_unreadable_entries_are_missing(self):
+
+        with open(self.cache.get_entry_path("logan.cache.layers"), "wb") as entry_file:
+            entry_file.write("\x80\x02}q\x01(U")
+
+        self.assertIsNone(self.cache.get("logan.cache.layers"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_write_errors_are_raised(self):
+
+        cache = ConfigCache(os.path.join(self.cache_dir, "missing"))
+
+        self.assertRaises(LoganCacheError, cache.put, "logan.cache.layers", {})
+        self.assertRaises(LoganCacheError, self.cache.put, "logan.cache.layers", {"function": lambda: None})
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_a_key_is_locked_by_a_single_holder(self):
+
+        with self.cache.locked("logan.cache.layers") as acquired:
+
+            self.assertTrue(acquired)
+
+            with self.cache.locked("logan.cache.layers", timeout=0.05) as acquired:
+                self.assertFalse(acquired)
+
+            with self.cache.locked("logan.cache.dispatcher", timeout=0.05) as acquired:
+                self.assertTrue(acquired)
+
+        with self.cache.locked("logan.cache.layers", timeout=0.05) as acquired:
+            self.assertTrue(acquired)
+
+# ------------------------------------------------------------------------------
+
+def write_and_read(cache_dir, writer, start, errors):
+    """ Publishes and reads back large values, counts the partial ones
+    """
+
+    cache = ConfigCache(cache_dir)
+    start.wait()
+
+    for i in xrange(30):
+
+        if writer:
+            cache.put("logan.cache.layers", {"writer": os.getpid(), "data": range(20000)})
+
+        value = cache.get("logan.cache.layers")
+
+        if value is not None and len(value.get("data", [])) != 20000:
+            errors.put(os.getpid())
+
+# ------------------------------------------------------------------------------
+
+def load_config(root_dir, start, results):
+    """ Loads the config once every process has started
+    """
+
+    agent = Agent(root_dir)
+    start.wait()
+
+    config = agent.load_config()
+
+    results.put((agent.cache_stats, config["actions"]["say:hello"]["help"]))
+
+# ------------------------------------------------------------------------------
+
+class TestCacheContention(TestCase):
+
+    LOGAN_TEST_PROCESSES = 16
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1", {"help": "says hello"})
+        })
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def run_processes(self, target, arguments):
+
+        start     = multiprocessing.Event()
+        processes = [
+            multiprocessing.Process(target=target, args=arguments(i) + (start,) + (self.queue,))
+            for i in xrange(self.LOGAN_TEST_PROCESSES)
+        ]
+
+        for process in processes:
+            process.start()
+
+        start.set()
+
+        for process in processes:
+            process.join(60)
+
+        self.assertEqual([process.exitcode for process in processes], [0] * self.LOGAN_TEST_PROCESSES)
+
+    # ------------------------------------------------------------------------------
+
+    def test_readers_never_get_partial_entries(self):
+
+        self.queue = multiprocessing.Queue()
+
+        self.run_processes(write_and_read, lambda i: (self.root_dir, i % 2 == 0))
+
+        self.assertTrue(self.queue.empty(), "partial entries have been read")
+        self.assertEqual([name for name in os.listdir(self.root_dir) if name.endswith(".tmp")], [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_a_single_process_rebuilds_the_config(self):
+
+        Agent(self.root_dir).load_config()
+
+        with open(os.path.join(self.root_dir, "loganrc"), "a") as user_config:
+            user_config.write("actions:\n  say:hello:\n    help: says hello again\n")
+
+        self.queue = multiprocessing.Queue()
+
+        self.run_processes(load_config, lambda i: (self.root_dir,))
+
+        results = [self.queue.get(timeout=10) for i in xrange(self.LOGAN_TEST_PROCESSES)]
+
+        self.assertEqual(sum(stats["rebuilds"] + stats["misses"] for stats, help in results), 1)
+        self.assertEqual(set(help for stats, help in results), set(["says hello again"]))
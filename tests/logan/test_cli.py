@@ -0,0 +1,171 @@
+from unittest import TestCase
+from logan.cli import sh, run, get_command, show_action_help, compile_index, check_counts
+import logan.cli
+from helpers import build_logan_root
+from StringIO import StringIO
+import tempfile
+import shutil
+import sys
+import os
+
+
+class TestCli(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1 from $PPID; exit 3"),
+            "say:cache": ("usr", "cache", "echo no cache: [$LOGAN_NO_CACHE]")
+        })
+
+        self.LOGAN_TEST_ARGUMENTS = {"<action>": "say:hello:usr", "<params>": "world"}
+
+        # No daemon must answer the '--subprocess' logan process
+        self.environment = dict(os.environ)
+        os.environ["LOGAN_ROOT"]   = self.root_dir
+        os.environ["LOGAN_SOCKET"] = os.path.join(self.root_dir, "no-daemon.sock")
+
+    def tearDown(self):
+
+        os.environ.clear()
+        os.environ.update(self.environment)
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_command_is_built_from_arguments(self):
+
+        self.assertEqual(get_command(self.LOGAN_TEST_ARGUMENTS), "say:hello:usr world")
+        self.assertEqual(get_command({"<action>": "say:hello:usr", "<params>": None}), "say:hello:usr")
+
+    # ------------------------------------------------------------------------------
+
+    def test_command_is_processed_in_the_current_process(self):
+
+        output = StringIO()
+
+        return_code = sh(self.LOGAN_TEST_ARGUMENTS, output)
+
+        self.assertEqual(return_code, 3)
+        self.assertIn("hello world from {}".format(os.getpid()), output.getvalue())
+
+    # ------------------------------------------------------------------------------
+
+    def test_command_can_be_processed_by_a_new_logan_process(self):
+
+        arguments = dict(self.LOGAN_TEST_ARGUMENTS, **{"--subprocess": True})
+
+        with tempfile.TemporaryFile() as output:
+
+            return_code = sh(arguments, output)
+
+            output.seek(0)
+            out = output.read()
+
+        self.assertEqual(return_code, 3)
+        self.assertIn("hello world from", out)
+        self.assertNotIn("hello world from {}\n".format(os.getpid()), out)
+
+    # ------------------------------------------------------------------------------
+
+    def test_logan_runs_from_any_directory(self):
+
+        package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        install_dir = tempfile.mkdtemp(suffix=" it's $HOME; (x)")
+        logan_bin   = logan.cli.__LOGAN_BIN__
+
+        for name in ("bin", "lib", "logan"):
+            os.symlink(os.path.join(package_dir, name), os.path.join(install_dir, name))
+
+        logan.cli.__LOGAN_BIN__ = [sys.executable, os.path.join(install_dir, "bin", "logan")]
+
+        try:
+            with tempfile.TemporaryFile() as output:
+
+                return_code = sh(dict(self.LOGAN_TEST_ARGUMENTS, **{"--subprocess": True}), output)
+
+                output.seek(0)
+                out = output.read()
+        finally:
+            logan.cli.__LOGAN_BIN__ = logan_bin
+            shutil.rmtree(install_dir)
+
+        self.assertEqual(return_code, 3)
+        self.assertIn("hello world from", out)
+
+    # ------------------------------------------------------------------------------
+
+    def test_no_cache_is_not_seen_by_the_actions(self):
+
+        argv, sys.argv = sys.argv, ["logan", "--no-cache", "say:cache:usr", "now"]
+        output = StringIO()
+
+        try:
+            run(output=output)
+        except SystemExit as e:
+            return_code = e.code
+        finally:
+            sys.argv = argv
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("no cache: []", output.getvalue())
+        self.assertNotIn("LOGAN_NO_CACHE", os.environ)
+
+    # ------------------------------------------------------------------------------
+
+    def test_failures_are_reported(self):
+
+        output = StringIO()
+
+        return_code = sh({"<action>": "say:nothing:usr", "<params>": "world"}, output)
+
+        self.assertEqual(return_code, 1)
+        self.assertIn("[LOGAN] :", output.getvalue())
+
+    # ------------------------------------------------------------------------------
+
+    def test_help_of_an_action_is_shown(self):
+
+        with open(os.path.join(self.root_dir, "loganrc"), "a") as user_config:
+            user_config.write("actions:\n  say:hello:\n    help: says hello\n")
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_codes = [show_action_help({"<action>": "s:h:usr"}), show_action_help({"<action>": "s:x:usr"})]
+            output       = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_codes, [0, 1])
+        self.assertIn("says hello", output)
+
+    # ------------------------------------------------------------------------------
+
+    def test_index_is_compiled_into_the_logan_root(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = compile_index()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.root_dir, "logan.index")), "$LOGAN_ROOT ignored")
+
+    # ------------------------------------------------------------------------------
+
+    def test_counts_must_be_positive_numbers(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            checks = [check_counts({"--jobs": jobs, "--workers": "1"}) for jobs in ("8", "eight", "0", "-2")]
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(checks, [True, False, False, False])
+        self.assertIn("[LOGAN] : --jobs must be a positive number", output)
@@ -0,0 +1,144 @@
+from unittest import TestCase
+from logan.engine import AsyncAgent
+from logan.cluster import BatchCoordinator, BatchWorker, parse_address
+from logan.daemon import send_message, recv_message
+from helpers import build_logan_root
+from StringIO import StringIO
+import socket
+import shutil
+import signal
+import time
+import os
+
+
+class TestCluster(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1"),
+            "take:time": ("usr", "sleep", "sleep $1; echo slept $1"),
+            "fail:now" : ("usr", "fail",  "echo failed >&2; exit 2")
+        })
+
+        self.output      = StringIO()
+        self.coordinator = BatchCoordinator("127.0.0.1:0", workers=2, output=self.output, heartbeat_timeout=1.0)
+        self.pids        = []
+
+    def tearDown(self):
+
+        self.coordinator.close()
+
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            os.waitpid(pid, 0)
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def start_worker(self, name, concurrency=2, silent=False, token=None):
+        """ Starts a worker process, a 'silent' one takes commands and never answers
+        """
+
+        token = token or self.coordinator.token
+
+        pid = os.fork()
+
+        if pid:
+            self.pids.append(pid)
+            return
+
+        try:
+            if silent:
+                sock = socket.create_connection(self.coordinator.address)
+                send_message(sock, {"type": "hello", "name": name, "slots": concurrency, "token": token})
+                recv_message(sock)
+                time.sleep(30)
+            else:
+                agent = AsyncAgent(self.root_dir, concurrency=concurrency)
+                BatchWorker(agent, self.coordinator.address, name, heartbeat_interval=0.2, token=token).run()
+        finally:
+            os._exit(0)
+
+    # ------------------------------------------------------------------------------
+
+    def test_addresses(self):
+
+        self.assertEqual(parse_address("host-a:7070"), ("host-a", 7070))
+        self.assertEqual(parse_address(":7070"), ("127.0.0.1", 7070))
+        self.assertRaises(ValueError, parse_address, "host-a")
+
+    # ------------------------------------------------------------------------------
+
+    def test_batch_runs_on_every_worker(self):
+
+        self.start_worker("one")
+        self.start_worker("two")
+
+        commands = ["take:time:usr 0.2"] * 8 + ["say:hello:usr world", "fail:now:usr x", "wrong:action:usr"]
+
+        return_code, records = self.coordinator.run(commands, timeout=20)
+
+        self.assertEqual(return_code, 1)
+        self.assertEqual([record["code"] for record in records], [0] * 9 + [2, 1])
+        self.assertEqual(records[8]["out"], "hello world\n")
+        self.assertEqual(records[9]["err"], "failed\n")
+        self.assertIn("not found", records[10]["error"])
+
+        self.assertEqual(set(record["worker"] for record in records), set(["one", "two"]))
+
+        # Shown like a local batch
+        self.assertIn("[8] say:hello:usr world => 0", self.output.getvalue())
+
+    # ------------------------------------------------------------------------------
+
+    def test_only_workers_with_the_token_get_commands(self):
+
+        # Never says hello: the others don't wait for it
+        silent = socket.create_connection(self.coordinator.address)
+
+        self.start_worker("intruder", token="wrong")
+        self.start_worker("one")
+        self.start_worker("two")
+
+        try:
+            start = time.time()
+            return_code, records = self.coordinator.run(["say:hello:usr {}".format(index) for index in range(6)],
+                                                        timeout=20)
+        finally:
+            silent.close()
+
+        self.assertEqual(return_code, 0)
+        self.assertEqual(set(record["worker"] for record in records), set(["one", "two"]))
+        self.assertTrue(time.time() - start < 5, "A silent connection must not hold the coordinator")
+
+    # ------------------------------------------------------------------------------
+
+    def test_fast_workers_steal_commands(self):
+
+        self.start_worker("slow", concurrency=1)
+        self.start_worker("fast", concurrency=4)
+
+        return_code, records = self.coordinator.run(["take:time:usr 0.2"] * 12, timeout=20)
+
+        self.assertEqual(return_code, 0)
+        self.assertTrue(sum(record["worker"] == "fast" for record in records) > 6,
+                        "The fast worker must steal commands of the slow one")
+
+    # ------------------------------------------------------------------------------
+
+    def test_commands_of_silent_workers_go_to_the_others(self):
+
+        self.start_worker("silent", silent=True)
+        self.start_worker("alive")
+
+        return_code, records = self.coordinator.run(["say:hello:usr {}".format(index) for index in range(6)],
+                                                    timeout=20)
+
+        self.assertEqual(return_code, 0)
+        self.assertEqual([record["worker"] for record in records], ["alive"] * 6)
+        self.assertEqual(records[0]["out"], "hello 0\n")
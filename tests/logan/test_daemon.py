@@ -0,0 +1,208 @@
+from unittest import TestCase
+from logan import Agent
+from logan.daemon import LoganDaemon, send_message, recv_message, DAEMON_REQUEST_TIMEOUT
+from helpers import build_logan_root
+from threading import Thread
+import subprocess
+import tempfile
+import base64
+import socket
+import signal
+import shutil
+import glob
+import time
+import sys
+import os
+
+
+class TestDaemon(TestCase):
+
+    def setUp(self):
+
+        self.LOGAN_ROOT             = os.path.join("..", "fixtures")
+        self.LOGAN_TEST_BAD_COMMAND = ["restart", "server wwinf9301"]
+
+        self.FAILURE_CODE = 1
+
+        self.socket_dir  = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.socket_dir, "logand.sock")
+
+        self.daemon = LoganDaemon(Agent(os.path.abspath(self.LOGAN_ROOT)), self.socket_path)
+
+    def tearDown(self):
+
+        self.daemon.server_close()
+        shutil.rmtree(self.socket_dir)
+
+        for cache_file in glob.glob(os.path.join(self.LOGAN_ROOT, "logan.cache*")):
+            os.remove(cache_file)
+
+    # ------------------------------------------------------------------------------
+
+    def send(self, request, daemon=None):
+        """ Sends one request to the daemon and returns its response,
+            output decoded
+        """
+
+        daemon = daemon or self.daemon
+
+        # Already there when the daemon accepts it, like the thin client's
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(daemon.socket_path)
+
+        send_message(client, request)
+
+        server = Thread(target=daemon.handle_request)
+        server.start()
+
+        response = recv_message(client)
+
+        client.close()
+        server.join()
+
+        for stream in ("out", "err"):
+            response[stream] = base64.b64decode(response[stream])
+
+        return response
+
+    # ------------------------------------------------------------------------------
+
+    def run_command(self, argv, daemon=None):
+
+        return self.send({"argv": argv, "env": dict(os.environ), "cwd": os.getcwd()}, daemon)
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_keeps_a_warm_config(self):
+        """ The config is loaded when the daemon starts, not per request """
+
+        self.assertIsNotNone(self.daemon.agent.config, "The daemon config is not loaded")
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_listens_on_the_given_socket(self):
+        """ The daemon socket is created where requested """
+
+        self.assertTrue(os.path.exists(self.socket_path), "The daemon socket does not exist")
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_relays_output_and_return_code(self):
+        """ A wrong command returns the failure code and the agent output """
+
+        response = self.send({
+            "argv": self.LOGAN_TEST_BAD_COMMAND,
+            "env" : dict(os.environ),
+            "cwd" : os.getcwd()
+        })
+
+        self.assertEqual(response.get("code"), self.FAILURE_CODE, "Wrong command must fail")
+        self.assertIn("Wrong syntax", response.get("out"), "Agent output not relayed")
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_parses_the_command_line_like_the_cli(self):
+        """ Commands and options are not taken for actions """
+
+        version = self.run_command(["--version"])
+        help    = self.run_command(["help", "create:file"])
+
+        self.assertEqual(version.get("code"), 0)
+        self.assertIn("0.1.0", version.get("out"))
+        self.assertEqual(help.get("code"), 0)
+        self.assertIn("copy files and directories", help.get("out"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_relays_any_byte_of_the_output(self):
+        """ Output that is not UTF-8 is relayed as is """
+
+        root_dir = build_logan_root({"say:bytes": ("usr", "bytes", "printf '\\377'")})
+        daemon   = LoganDaemon(Agent(root_dir), os.path.join(self.socket_dir, "bytes.sock"))
+
+        try:
+            response = self.run_command(["say:bytes:usr", "now"], daemon)
+        finally:
+            daemon.server_close()
+            shutil.rmtree(root_dir)
+
+        self.assertEqual(response.get("code"), 0)
+        self.assertIn("\xff", response.get("out"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_warm_config_is_the_one_of_the_client_directory(self):
+        """ The project config layer of the client is loaded before forking """
+
+        project_dir = tempfile.mkdtemp()
+
+        with open(os.path.join(project_dir, ".loganrc"), "w") as project_config:
+            project_config.write("logan:\n  options: null\n")
+
+        try:
+            self.send({"argv": ["--version"], "env": dict(os.environ), "cwd": project_dir})
+        finally:
+            shutil.rmtree(project_dir)
+
+        self.assertEqual(self.daemon.agent.project_dir, project_dir)
+        self.assertIsNotNone(self.daemon.agent.config_fingerprints["project"], "Project layer not loaded")
+
+    # ------------------------------------------------------------------------------
+
+    def test_silent_clients_do_not_hold_the_daemon(self):
+        """ The request is read by the forked child """
+
+        silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        silent.connect(self.socket_path)
+
+        try:
+            start = time.time()
+            self.daemon.handle_request()
+
+            response = self.run_command(["--version"])
+        finally:
+            silent.close()
+
+        self.assertEqual(response.get("code"), 0)
+        self.assertLess(time.time() - start, DAEMON_REQUEST_TIMEOUT, "The silent client held the daemon")
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_removes_its_socket_on_sigterm(self):
+
+        socket_path = os.path.join(self.socket_dir, "term.sock")
+        logand      = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                   "bin", "logand")
+
+        process  = subprocess.Popen([sys.executable, logand, os.path.abspath(self.LOGAN_ROOT), socket_path])
+        deadline = time.time() + 10
+
+        while not os.path.exists(socket_path) and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.assertTrue(os.path.exists(socket_path), "The daemon did not start")
+
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+        self.assertFalse(os.path.exists(socket_path), "The daemon left its socket behind")
+
+    # ------------------------------------------------------------------------------
+
+    def test_daemon_traces_the_commands_forwarded_with_logan_trace(self):
+        """ The forked child writes the trace before answering """
+
+        trace_path = os.path.join(self.socket_dir, "trace.json")
+
+        root_dir = build_logan_root({"say:hello": ("usr", "hello", "echo hello $1")})
+        daemon   = LoganDaemon(Agent(root_dir), os.path.join(self.socket_dir, "trace.sock"))
+
+        try:
+            response = self.send({"argv": ["say:hello:usr", "world"], "env": dict(os.environ, LOGAN_TRACE=trace_path),
+                                  "cwd" : os.getcwd()}, daemon)
+        finally:
+            daemon.server_close()
+            shutil.rmtree(root_dir)
+
+        self.assertEqual(response.get("code"), 0)
+        self.assertTrue(os.path.exists(trace_path), "The trace of the command is not written")
@@ -0,0 +1,175 @@
+from unittest import TestCase
+from logan import Agent, LoganActionSyntaxError, LoganActionNotFoundError, LoganActionAmbiguousError
+from logan.dispatch import ActionDispatcher, split_command
+from helpers import build_logan_root
+from StringIO import StringIO
+import cPickle
+import shutil
+import sys
+import os
+
+
+class TestDispatch(TestCase):
+
+    def setUp(self):
+
+        self.LOGAN_TEST_ACTIONS = {
+            "create:file"  : {"context": "usr"},
+            "create:folder": {"context": "usr"},
+            "crop:image"   : {"context": "usr"},
+            "list:files"   : {"context": "usr"},
+            "list:filesets": {"context": "usr"},
+            "goto:server"  : {"context": "aws"},
+            "show:help"    : {"context": None}
+        }
+
+        self.dispatcher = ActionDispatcher(self.LOGAN_TEST_ACTIONS)
+
+    # ------------------------------------------------------------------------------
+
+    def test_commands_are_split_into_tokens_and_params(self):
+
+        self.assertEqual(split_command("create:file:usr  notes.txt -f"), ("create", "file", "usr", "notes.txt -f"))
+        self.assertEqual(split_command("show:help"), ("show", "help", None, ""))
+        self.assertEqual(split_command("show:help: all"), ("show", "help", None, "all"))
+
+        for command in ("restart server wwinf9301", ":: anything", "create:", "a:b:c:d x", "cre-ate:file"):
+            self.assertRaises(LoganActionSyntaxError, split_command, command)
+
+    # ------------------------------------------------------------------------------
+
+    def test_actions_are_resolved(self):
+
+        self.assertEqual(self.dispatcher.resolve("create:file:usr notes.txt"),
+                         ("create", "file", "usr", "notes.txt", "create:file"))
+        self.assertEqual(self.dispatcher.resolve("show:help"), ("show", "help", None, "", "show:help"))
+
+        self.assertRaises(LoganActionNotFoundError, self.dispatcher.resolve, "create:file:aws notes.txt")
+        self.assertRaises(LoganActionNotFoundError, self.dispatcher.resolve, "create:file notes.txt")
+        self.assertRaises(LoganActionNotFoundError, self.dispatcher.resolve, "delete:file:usr notes.txt")
+
+    # ------------------------------------------------------------------------------
+
+    def test_unambiguous_abbreviations_are_expanded(self):
+
+        self.assertEqual(self.dispatcher.resolve("cre:fi:u notes.txt"),
+                         ("create", "file", "usr", "notes.txt", "create:file"))
+        self.assertEqual(self.dispatcher.resolve("g:s:a host"), ("goto", "server", "aws", "host", "goto:server"))
+
+        # An exact token wins over the longer ones it is a prefix of
+        self.assertEqual(self.dispatcher.resolve("li:files:usr")[4], "list:files")
+
+    # ------------------------------------------------------------------------------
+
+    def test_ambiguous_abbreviations_list_every_candidate(self):
+
+        try:
+            self.dispatcher.resolve("cr:f:usr notes.txt")
+        except LoganActionAmbiguousError as e:
+            self.assertIn("create:file:usr", str(e))
+            self.assertIn("create:folder:usr", str(e))
+            self.assertNotIn("crop", str(e))
+        else:
+            self.fail("'cr:f:usr' should be ambiguous")
+
+        self.assertEqual(len(self.dispatcher.candidates("c", "", "usr")), 3)
+
+    # ------------------------------------------------------------------------------
+
+    def test_dispatcher_can_be_pickled(self):
+
+        dispatcher = cPickle.loads(cPickle.dumps(self.dispatcher, cPickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(dispatcher.resolve("cre:fi:u notes.txt"), self.dispatcher.resolve("cre:fi:u notes.txt"))
+        self.assertEqual(dispatcher.count, len(self.LOGAN_TEST_ACTIONS))
+
+# ------------------------------------------------------------------------------
+
+class TestAgentDispatch(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello"  : ("usr", "hello",   "echo hello $1"),
+            "say:hi"     : ("usr", "hi",      "echo hi $1"),
+            "say:goodbye": ("usr", "goodbye", "echo goodbye $1")
+        })
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def process(self, command):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = Agent(self.root_dir).process(command), sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        return return_code
+
+    # ------------------------------------------------------------------------------
+
+    def test_abbreviated_commands_are_processed(self):
+
+        return_code, output = self.process("s:hel:u world")
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("hello world", output)
+
+    # ------------------------------------------------------------------------------
+
+    def test_ambiguous_commands_fail_with_their_candidates(self):
+
+        return_code, output = self.process("s:h:usr world")
+
+        self.assertEqual(return_code, 1)
+        self.assertIn("say:hello:usr", output)
+        self.assertIn("say:hi:usr", output)
+
+        self.assertRaises(LoganActionAmbiguousError, Agent(self.root_dir).resolve_command, "s:h:usr")
+
+    # ------------------------------------------------------------------------------
+
+    def test_dispatcher_is_cached_and_compiled_again_when_the_config_changes(self):
+
+        agent = Agent(self.root_dir)
+        agent.get_dispatcher()
+
+        self.assertTrue(agent.check_cache(Agent.LOGAN_CACHE_DISPATCHER_KEY))
+
+        # A new agent uses the cached dispatcher without loading the config
+        agent = Agent(self.root_dir)
+
+        self.assertEqual(agent.get_dispatcher().count, 3)
+        self.assertIsNone(agent.config)
+
+        with open(os.path.join(self.root_dir, "loganrc"), "a") as user_config:
+            user_config.write("actions:\n  say:hey:\n    scope: say\n    context: usr\n    path: hello\n")
+
+        self.assertEqual(agent.get_dispatcher().count, 4)
+        self.assertRaises(LoganActionAmbiguousError, agent.resolve_command, "s:he:usr world")
+
+    # ------------------------------------------------------------------------------
+
+    def test_config_files_are_fingerprinted_once_per_command(self):
+
+        agent = Agent(self.root_dir)
+        agent.resolve_command("say:hello:usr world")
+
+        rounds = []
+        fingerprint = agent.get_config_fingerprints
+
+        def counted():
+            if agent.command_fingerprints is None:
+                rounds.append(1)
+            return fingerprint()
+
+        agent.get_config_fingerprints = counted
+        agent.resolve_command("say:hello:usr world")
+
+        self.assertEqual(len(rounds), 1)
@@ -0,0 +1,120 @@
+from unittest import TestCase
+from logan.engine import AsyncAgent, ActionJob
+from helpers import build_logan_root
+import shutil
+import time
+import os
+
+
+class TestEngine(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1"),
+            "take:time": ("usr", "sleep", "sleep $1; echo slept $1"),
+            "spawn:child": ("usr", "spawn", "sleep 30 & echo $! ; wait"),
+            "fail:now" : ("usr", "fail",  "echo failed >&2; exit 2")
+        })
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def is_alive(self, pid):
+        """ Whether or not a process is running (zombies are dead)
+        """
+
+        try:
+            with open("/proc/{}/stat".format(pid)) as stat:
+                return stat.read().split(")")[-1].split()[0] != "Z"
+        except IOError:
+            return False
+
+    # ------------------------------------------------------------------------------
+
+    def test_submitted_actions_run_without_blocking(self):
+
+        agent = AsyncAgent(self.root_dir)
+
+        start = time.time()
+        jobs  = [agent.submit("take:time:usr 1") for i in range(10)]
+
+        self.assertTrue(time.time() - start < 1, "submit must not wait for the action")
+
+        self.assertEqual(agent.run_until_complete(jobs), [])
+        self.assertTrue(time.time() - start < 5, "Actions must run concurrently")
+        self.assertEqual([job.result()["out"] for job in jobs], ["slept 1\n"] * 10)
+
+    # ------------------------------------------------------------------------------
+
+    def test_results_are_like_performs_ones(self):
+
+        agent = AsyncAgent(self.root_dir)
+
+        hello = agent.submit("say:hello:usr world")
+        fail  = agent.submit("fail:now:usr x")
+        wrong = agent.submit("wrong syntax")
+
+        agent.run_until_complete()
+
+        self.assertEqual(hello.result(), {"out": "hello world\n", "err": "", "code": 0, "state": ActionJob.DONE})
+        self.assertEqual(fail.result().get("code"), 2)
+        self.assertEqual(fail.result().get("err"),  "failed\n")
+        self.assertEqual(wrong.state, ActionJob.FAILED)
+
+    # ------------------------------------------------------------------------------
+
+    def test_concurrency_is_limited(self):
+
+        agent = AsyncAgent(self.root_dir, concurrency=2)
+
+        jobs = [agent.submit("take:time:usr 0.2") for i in range(5)]
+
+        self.assertEqual(len(agent.running), 2)
+        self.assertEqual(len(agent.queue),   3)
+
+        agent.run_until_complete(jobs)
+
+        self.assertTrue(all(job.state == ActionJob.DONE for job in jobs))
+
+    # ------------------------------------------------------------------------------
+
+    def test_timeout_kills_the_action_process_group(self):
+
+        agent = AsyncAgent(self.root_dir)
+
+        job = agent.submit("spawn:child:usr", timeout=0.3)
+
+        start = time.time()
+        agent.run_until_complete([job])
+
+        self.assertEqual(job.state, ActionJob.TIMEOUT)
+        self.assertTrue(time.time() - start < 5)
+
+        # The grand child has been killed with its group
+        grand_child = int(job.result()["out"].split()[0])
+        time.sleep(0.1)
+        self.assertFalse(self.is_alive(grand_child), "The grand child must be killed")
+
+    # ------------------------------------------------------------------------------
+
+    def test_cancel_pending_and_running_actions(self):
+
+        agent = AsyncAgent(self.root_dir, concurrency=1)
+
+        running = agent.submit("take:time:usr 10")
+        pending = agent.submit("take:time:usr 10")
+
+        done = []
+        running.add_done_callback(done.append)
+
+        self.assertTrue(pending.cancel())
+        self.assertTrue(running.cancel())
+        self.assertFalse(running.cancel())
+
+        self.assertEqual(pending.state, ActionJob.CANCELLED)
+        self.assertEqual(running.state, ActionJob.CANCELLED)
+        self.assertEqual(done, [running])
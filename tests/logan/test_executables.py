@@ -0,0 +1,158 @@
+from unittest import TestCase
+from logan import Agent, LoganActionPathMissingError
+from logan.executables import ExecutableTable
+from helpers import build_logan_root
+import cPickle
+import shutil
+import os
+
+
+class TestExecutables(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello"  : ("usr", "hello",   "echo hello $1"),
+            "say:goodbye": ("usr", "goodbye", "echo goodbye $1")
+        })
+
+        self.actions_path = os.path.join(self.root_dir, "actions")
+        self.table        = ExecutableTable(self.actions_path)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def action_path(self, *names):
+
+        return os.path.join(self.actions_path, *names)
+
+    # ------------------------------------------------------------------------------
+
+    def test_executables_are_found_once_the_tree_is_walked(self):
+
+        self.assertEqual(self.table.build(), 2)
+
+        self.assertEqual(self.table.lookup(self.action_path("usr", "hello")), self.action_path("usr", "hello"))
+        self.assertIsNone(self.table.lookup(self.action_path("usr", "missing")))
+        self.assertIsNone(self.table.lookup("/bin/ls"))
+
+        self.assertEqual(self.table.stats, {"hits": 1, "misses": 1, "rehashes": 1})
+
+    # ------------------------------------------------------------------------------
+
+    def test_hits_do_not_touch_the_file_system(self):
+
+        self.table.build()
+
+        os.remove(self.action_path("usr", "hello"))
+
+        # Found in the table, the caller forgets it once running it fails
+        self.assertIsNotNone(self.table.lookup(self.action_path("usr", "hello")))
+
+        self.table.forget(self.action_path("usr", "hello"))
+
+        self.assertIsNone(self.table.lookup(self.action_path("usr", "hello")))
+        self.assertEqual(self.table.stats["rehashes"], 2)
+
+    # ------------------------------------------------------------------------------
+
+    def test_misses_walk_the_tree_again_when_a_directory_has_changed(self):
+
+        self.table.build()
+
+        self.assertIsNone(self.table.lookup(self.action_path("usr", "missing")))
+        self.assertEqual(self.table.stats["rehashes"], 1)
+
+        os.makedirs(self.action_path("aws"))
+
+        with open(self.action_path("aws", "deploy"), "w") as action_file:
+            action_file.write("#!/bin/sh\ntrue\n")
+
+        os.chmod(self.action_path("aws", "deploy"), 0755)
+
+        self.assertIsNotNone(self.table.lookup(self.action_path("aws", "deploy")))
+        self.assertEqual(self.table.stats["rehashes"], 2)
+        self.assertTrue(self.table.changed)
+
+    # ------------------------------------------------------------------------------
+
+    def test_files_without_execute_bit_are_not_executables(self):
+
+        os.chmod(self.action_path("usr", "goodbye"), 0644)
+
+        self.table.build()
+
+        self.assertIsNone(self.table.lookup(self.action_path("usr", "goodbye")))
+        self.assertFalse(self.table.is_executable(self.action_path("usr", "goodbye")))
+        self.assertTrue(self.table.is_executable(self.action_path("usr", "hello")))
+
+    # ------------------------------------------------------------------------------
+
+    def test_table_can_be_pickled(self):
+
+        self.table.build()
+
+        table = cPickle.loads(cPickle.dumps(self.table, cPickle.HIGHEST_PROTOCOL))
+
+        self.assertFalse(table.changed)
+        self.assertEqual(table.executables, self.table.executables)
+        self.assertFalse(table.is_stale())
+
+# ------------------------------------------------------------------------------
+
+class TestAgentExecutables(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello"  : ("usr", "hello",   "echo hello $1"),
+            "say:goodbye": ("usr", "goodbye", "echo goodbye $1")
+        })
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_executables_table_is_cached(self):
+
+        agent = Agent(self.root_dir)
+        agent.resolve_command("say:hello:usr world")
+
+        self.assertTrue(agent.check_cache(Agent.LOGAN_CACHE_EXECUTABLES_KEY))
+
+        agent = Agent(self.root_dir)
+        agent.resolve_command("say:hello:usr world")
+
+        self.assertEqual(agent.get_executables().stats["rehashes"], 0)
+
+    # ------------------------------------------------------------------------------
+
+    def test_actions_without_execute_bit_are_reported(self):
+
+        os.chmod(os.path.join(self.root_dir, "actions", "usr", "goodbye"), 0644)
+
+        try:
+            Agent(self.root_dir).resolve_command("say:goodbye:usr world")
+        except LoganActionPathMissingError as e:
+            self.assertIn("not executable", str(e))
+        else:
+            self.fail("a file without execute bit is not an action")
+
+    # ------------------------------------------------------------------------------
+
+    def test_stale_executables_are_forgotten_when_run(self):
+
+        agent  = Agent(self.root_dir)
+        action = agent.dispatch_command("say:hello:usr world")
+
+        agent.build_command_from_action(action)
+
+        os.remove(os.path.join(self.root_dir, "actions", "usr", "hello"))
+
+        self.assertRaises(LoganActionPathMissingError, agent.performs, action)
+        self.assertEqual(agent.get_executables().stats["rehashes"], 2)
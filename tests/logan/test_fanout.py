@@ -0,0 +1,163 @@
+from unittest import TestCase
+from logan import Agent
+from logan.engine import AsyncAgent, ActionJob
+from logan.exceptions import LoganActionSyntaxError
+from logan.fanout import FanOut, split_fanout, FANOUT_FIRST_SUCCESS, FANOUT_FAIL_FAST
+from helpers import build_logan_root
+from StringIO import StringIO
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+
+class TestFanOut(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "restart:server": ("aws", "restart", "echo restarted aws $1"),
+            "take:time"     : ("usr", "sleep",   "sleep $1; echo slept $1")
+        })
+
+        # Contexts of the action found from the actions directory
+        self.add_action("gcp",    "restart", "echo restarted gcp $1")
+        self.add_action("onprem", "restart", "echo onprem is down >&2; exit 3")
+
+        self.add_action("fast", "sleep", "echo fast")
+        self.add_action("slow", "sleep", "sleep 10; echo slow")
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def add_action(self, context, name, script):
+
+        action_dir = os.path.join(self.root_dir, "actions", context)
+
+        if not os.path.isdir(action_dir):
+            os.makedirs(action_dir)
+
+        with open(os.path.join(action_dir, name), "w") as action_file:
+            action_file.write("#!/bin/sh\n{}\n".format(script))
+
+        os.chmod(os.path.join(action_dir, name), 0755)
+
+    # ------------------------------------------------------------------------------
+
+    def test_fanout_syntax(self):
+
+        self.assertEqual(split_fanout("restart:server:{aws,gcp} now"), ("restart", "server", ["aws", "gcp"], "now"))
+        self.assertEqual(split_fanout("restart:server:*"), ("restart", "server", None, ""))
+        self.assertIsNone(split_fanout("restart:server:aws now"))
+        self.assertRaises(LoganActionSyntaxError, split_fanout, "restart:server:{aws,} now")
+
+    # ------------------------------------------------------------------------------
+
+    def test_action_runs_in_every_context(self):
+
+        output = StringIO()
+
+        return_code, results = FanOut(AsyncAgent(self.root_dir), output=output).run("rest:serv:* now")
+
+        self.assertEqual(return_code, 1)
+        self.assertEqual([result["context"] for result in results], ["aws", "gcp", "onprem"])
+        self.assertEqual([result["code"] for result in results], [0, 0, 3])
+        self.assertEqual(results[1]["out"], "restarted gcp now\n")
+        self.assertEqual(results[2]["err"], "onprem is down\n")
+
+        self.assertIn("[gcp] restart:server:gcp now => 0", output.getvalue())
+
+    # ------------------------------------------------------------------------------
+
+    def test_listed_contexts_only(self):
+
+        return_code, results = FanOut(AsyncAgent(self.root_dir)).run("restart:server:{gcp,azure} now")
+
+        self.assertEqual(return_code, 1)
+        self.assertEqual([result["state"] for result in results], [ActionJob.DONE, ActionJob.FAILED])
+        self.assertIn("not found", results[1]["err"])
+
+        return_code, results = FanOut(AsyncAgent(self.root_dir)).run("restart:server:{aws,gcp} now")
+
+        self.assertEqual(return_code, 0)
+
+    # ------------------------------------------------------------------------------
+
+    def test_first_success_cancels_the_stragglers(self):
+
+        start = time.time()
+
+        return_code, results = FanOut(AsyncAgent(self.root_dir), FANOUT_FIRST_SUCCESS).run("take:time:{slow,fast}")
+
+        self.assertTrue(time.time() - start < 5, "The slow action must be cancelled")
+        self.assertEqual(return_code, 0)
+        self.assertEqual([result["state"] for result in results], [ActionJob.CANCELLED, ActionJob.DONE])
+
+    # ------------------------------------------------------------------------------
+
+    def test_fail_fast_cancels_the_stragglers(self):
+
+        self.add_action("broken", "sleep", "exit 1")
+
+        return_code, results = FanOut(AsyncAgent(self.root_dir, concurrency=1), FANOUT_FAIL_FAST).run(
+            "take:time:{broken,slow,usr} 10"
+        )
+
+        self.assertEqual(return_code, 1)
+        self.assertEqual([result["state"] for result in results],
+                         [ActionJob.DONE, ActionJob.CANCELLED, ActionJob.CANCELLED])
+
+    # ------------------------------------------------------------------------------
+
+    def test_fanout_commands_are_processed(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = Agent(self.root_dir).process("restart:server:{aws,gcp} now")
+            output      = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("restarted aws now", output)
+        self.assertIn("restarted gcp now", output)
+
+    # ------------------------------------------------------------------------------
+
+    def test_fanout_uses_the_project_and_the_config_of_the_agent(self):
+
+        project_dir = tempfile.mkdtemp()
+
+        with open(os.path.join(project_dir, ".loganrc"), "w") as project_config:
+            project_config.write("actions:\n  greet:team:\n    scope: greet\n    context: aws\n    path: restart\n")
+
+        agent = Agent(self.root_dir)
+        agent.project_dir = project_dir
+        agent.load_config()
+
+        loads = []
+        get_layers_from_cache = Agent.get_layers_from_cache
+
+        def counting_get_layers_from_cache(agent):
+            loads.append(agent)
+            return get_layers_from_cache(agent)
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+        Agent.get_layers_from_cache = counting_get_layers_from_cache
+
+        try:
+            return_code = agent.process("greet:team:{aws} now")
+            output      = sys.stdout.getvalue()
+        finally:
+            Agent.get_layers_from_cache = get_layers_from_cache
+            sys.stdout = stdout
+            shutil.rmtree(project_dir)
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("restarted aws now", output)
+        self.assertEqual(loads, [], "The config is not loaded again for the fan-out")
@@ -0,0 +1,120 @@
+from unittest import TestCase
+from logan import __usage__, __version__, grammar
+from lib.docopt import docopt, DocoptExit
+import tempfile
+import shutil
+import os
+
+
+class TestGrammar(TestCase):
+
+    def setUp(self):
+
+        self.grammar_dir  = tempfile.mkdtemp()
+        self.grammar_path = os.path.join(self.grammar_dir, "logan.grammar")
+
+        self.LOGAN_TEST_ARGVS = [
+            ["create:file", "file.txt"],
+            ["--no-cache", "create:file", "file.txt"],
+            ["batch", "commands.txt"],
+            ["batch", "-", "--jobs=8", "--json"],
+            ["--fail-fast", "--jobs=8", "restart:server:*", "now"],
+            ["--all-contexts", "--first-success", "restart:server", "now"],
+            ["compile"],
+            ["wait", "12"],
+            ["create:file", "compile"]
+        ]
+        self.LOGAN_TEST_BAD_ARGVS = [
+            [],
+            ["create:file"],
+            ["create:file", "-ltr"],
+            ["--no-cache", "--no-cache", "create:file", "file.txt"]
+        ]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.grammar_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_parsing_matches_docopt(self):
+
+        grammar.load_grammar(__usage__, self.grammar_path)
+
+        for argv in self.LOGAN_TEST_ARGVS:
+            self.assertEqual(grammar.parse(__usage__, argv, __version__, grammar_path=self.grammar_path),
+                             docopt(__usage__, argv, version=__version__))
+
+        for argv in self.LOGAN_TEST_BAD_ARGVS:
+            self.assertRaises(DocoptExit, grammar.parse, __usage__, argv, __version__, grammar_path=self.grammar_path)
+
+    # ------------------------------------------------------------------------------
+
+    def test_commands_win_over_actions(self):
+
+        grammar.load_grammar(__usage__, self.grammar_path)
+
+        for argv in (["help", "list:files"], ["job", "12"], ["wait", "12"]):
+            arguments = grammar.parse(__usage__, argv, __version__, grammar_path=self.grammar_path)
+
+            self.assertTrue(arguments[argv[0]])
+            self.assertIsNone(arguments["<params>"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_documented_options_are_in_the_usage_patterns(self):
+
+        from lib.docopt import Option, parse_section, parse_defaults, parse_pattern, formal_usage
+
+        options = parse_defaults(__usage__)
+        pattern = parse_pattern(formal_usage(parse_section("usage:", __usage__)[0]), options)
+
+        self.assertEqual(sorted(option.long for option in options),
+                         sorted(set(option.long for option in pattern.flat(Option))))
+
+    # ------------------------------------------------------------------------------
+
+    def test_common_form_skips_docopt(self):
+
+        compiled = grammar.load_grammar(__usage__, self.grammar_path)
+
+        arguments = grammar.parse_fast(["--no-cache", "create:file", "file.txt"], compiled)
+
+        self.assertEqual(arguments["<action>"], "create:file")
+        self.assertEqual(arguments["<params>"], "file.txt")
+        self.assertTrue(arguments["--no-cache"])
+
+        for argv in (["batch", "commands.txt"], ["compile"], ["create:file", "-ltr"], ["--version"]):
+            self.assertIsNone(grammar.parse_fast(argv, compiled))
+
+    # ------------------------------------------------------------------------------
+
+    def test_grammar_is_stored_and_compiled_again_when_usage_changes(self):
+
+        compiled = grammar.load_grammar(__usage__, self.grammar_path)
+
+        self.assertTrue(os.path.exists(self.grammar_path))
+        self.assertEqual(grammar.load_grammar(__usage__, self.grammar_path), compiled)
+
+        usage = __usage__.replace("logan compile", "logan compile [--force]")
+
+        recompiled = grammar.load_grammar(usage, self.grammar_path)
+
+        self.assertNotEqual(recompiled["key"], compiled["key"])
+        self.assertIn("--force", recompiled["defaults"])
+        self.assertEqual(grammar.load_grammar(usage, self.grammar_path)["key"], recompiled["key"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_grammar_is_stored_in_the_logan_root(self):
+
+        environment = dict(os.environ)
+        os.environ["LOGAN_ROOT"] = self.grammar_dir
+
+        try:
+            grammar.parse(__usage__, ["create:file", "file.txt"], __version__)
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+
+        self.assertTrue(os.path.exists(self.grammar_path))
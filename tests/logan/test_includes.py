@@ -0,0 +1,145 @@
+from unittest import TestCase
+from logan import Agent
+from logan import includes
+from logan.includes import expand_includes, parse_files
+from helpers import build_logan_root
+from StringIO import StringIO
+import shutil
+import sys
+import os
+
+
+class TestIncludes(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello"  : ("usr", "hello",   "echo hello $1"),
+            "say:goodbye": ("usr", "goodbye", "echo goodbye $1")
+        })
+
+        self.user_config_path = os.path.join(self.root_dir, "loganrc")
+        self.conf_dir         = os.path.join(self.root_dir, "conf.d")
+
+        with open(self.user_config_path, "w") as user_config:
+            user_config.write("logan:\n  options: null\ninclude: [\"conf.d/*.yaml\"]\n")
+
+        os.makedirs(self.conf_dir)
+
+        self.write_include("10-hello.yaml", "say:hello", "goodbye")
+
+        # Records the files parsed by the agent
+        self.parsed      = []
+        self.parse_files = includes.parse_files
+
+        def recording_parse_files(file_paths, jobs=None):
+            self.parsed.extend(os.path.basename(file_path) for file_path in file_paths)
+            return self.parse_files(file_paths, jobs)
+
+        includes.parse_files = recording_parse_files
+
+    def tearDown(self):
+
+        includes.parse_files = self.parse_files
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def write_include(self, name, key, action_path):
+
+        with open(os.path.join(self.conf_dir, name), "w") as include_file:
+            include_file.write("actions:\n  \"{}\":\n    scope: say\n    context: usr\n    path: {}\n".format(
+                key, action_path
+            ))
+
+        # Makes the change visible to mtime based fingerprints
+        os.utime(os.path.join(self.conf_dir, name), (1400000000 + len(self.conf_dir) + len(action_path),) * 2)
+
+    # ------------------------------------------------------------------------------
+
+    def process(self, command):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = Agent(self.root_dir).process(command)
+            output      = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+
+        return output
+
+    # ------------------------------------------------------------------------------
+
+    def test_includes_are_expanded_in_order(self):
+
+        self.write_include("20-hello.yaml", "say:hello", "hello")
+
+        with open(os.path.join(self.conf_dir, "notes.txt"), "w") as notes:
+            notes.write("not included\n")
+
+        self.assertEqual(
+            [os.path.basename(include_path) for include_path in
+             expand_includes(self.user_config_path, ["conf.d/*.yaml", "conf.d/10-*.yaml"])],
+            ["10-hello.yaml", "20-hello.yaml"]
+        )
+
+    # ------------------------------------------------------------------------------
+
+    def test_included_files_override_the_including_one(self):
+
+        self.assertIn("goodbye world", self.process("say:hello:usr world"))
+
+        self.write_include("20-hello.yaml", "say:hello", "hello")
+
+        self.assertIn("hello world", self.process("say:hello:usr world"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_only_changed_files_are_parsed_again(self):
+
+        self.write_include("20-goodbye.yaml", "say:goodbye", "goodbye")
+        self.process("say:goodbye:usr world")
+
+        self.assertEqual(sorted(self.parsed), ["10-hello.yaml", "20-goodbye.yaml"])
+
+        del self.parsed[:]
+        self.process("say:goodbye:usr world")
+
+        self.assertEqual(self.parsed, [])
+
+        # Edited drop-in
+        self.write_include("10-hello.yaml", "say:hello", "hello")
+        self.assertIn("hello world", self.process("say:hello:usr world"))
+
+        self.assertEqual(self.parsed, ["10-hello.yaml"])
+
+        # New drop-in
+        del self.parsed[:]
+        self.write_include("30-hello.yaml", "say:hello", "goodbye")
+        self.assertIn("goodbye world", self.process("say:hello:usr world"))
+
+        self.assertEqual(self.parsed, ["30-hello.yaml"])
+
+        # Removed drop-in
+        del self.parsed[:]
+        os.remove(os.path.join(self.conf_dir, "30-hello.yaml"))
+        self.assertIn("hello world", self.process("say:hello:usr world"))
+
+        self.assertEqual(self.parsed, [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_files_are_parsed_in_parallel(self):
+
+        file_paths = []
+
+        for index in range(8):
+            name = "{:02d}-hello.yaml".format(index)
+            self.write_include(name, "say:hello", "hello{}".format(index))
+            file_paths.append(os.path.join(self.conf_dir, name))
+
+        self.assertEqual(parse_files(file_paths, jobs=4), parse_files(file_paths, jobs=1))
+        self.assertEqual(parse_files(file_paths, jobs=4)[3]["actions"]["say:hello"]["path"], "hello3")
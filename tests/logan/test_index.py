@@ -0,0 +1,110 @@
+from unittest import TestCase
+from logan import Agent
+from logan.index import ActionIndex, compile_index, action_index_key
+import datetime
+import tempfile
+import shutil
+import os
+
+
+class TestIndex(TestCase):
+
+    def setUp(self):
+
+        self.LOGAN_ROOT              = os.path.join("..", "fixtures")
+        self.DEFAULT_CONFIG_FILEPATH = os.path.join(self.LOGAN_ROOT, "loganrc.default")
+        self.USER_CONFIG_FILEPATH    = os.path.join(self.LOGAN_ROOT, "loganrc")
+
+        self.LOGAN_TEST_COMMAND       = "list:files:usr -ltr"
+        self.LOGAN_TEST_ACTION        = "list:files"
+        self.LOGAN_TEST_ACTIONS       = dict(
+            ("do:thing{}".format(i), {"scope": "do", "context": "ctx{}".format(i % 3), "path": "thing{}".format(i)})
+            for i in range(1000)
+        )
+
+        self.root_dir   = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.root_dir, "logan.index")
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_index_finds_every_compiled_action(self):
+        """ Every action is found with its '<verb>:<object>:<context>' key """
+
+        count = compile_index(self.LOGAN_TEST_ACTIONS, self.index_path)
+        index = ActionIndex(self.index_path)
+
+        self.assertEqual(count, len(self.LOGAN_TEST_ACTIONS))
+
+        for key, action in self.LOGAN_TEST_ACTIONS.iteritems():
+            self.assertEqual(index.get(action_index_key(key, action.get("context"))), action)
+
+        index.close()
+
+    # ------------------------------------------------------------------------------
+
+    def test_index_does_not_find_an_action_in_another_context(self):
+        """ The context is part of the key """
+
+        compile_index(self.LOGAN_TEST_ACTIONS, self.index_path)
+        index = ActionIndex(self.index_path)
+
+        self.assertIsNone(index.get("do:thing1"))
+        self.assertIsNone(index.get("do:thing1:ctx0"))
+        self.assertIsNone(index.get("undo:thing1:ctx1"))
+
+        index.close()
+
+    # ------------------------------------------------------------------------------
+
+    def test_index_keeps_actions_marshal_can_not_serialize(self):
+        """ Actions holding dates are indexed along with the others """
+
+        actions = dict(self.LOGAN_TEST_ACTIONS)
+        actions["release:notes"] = {"scope": "release", "path": "notes", "since": datetime.date(2013, 1, 1)}
+
+        count = compile_index(actions, self.index_path)
+        index = ActionIndex(self.index_path)
+
+        self.assertEqual(count, len(actions))
+        self.assertEqual(index.get("release:notes"), actions["release:notes"])
+        self.assertEqual(index.get("do:thing1:ctx1"), actions["do:thing1"])
+
+        index.close()
+
+    # ------------------------------------------------------------------------------
+
+    def test_agent_finds_actions_without_loading_the_config(self):
+        """ Once compiled, the agent reads actions from the index """
+
+        shutil.copy(self.DEFAULT_CONFIG_FILEPATH, self.root_dir)
+        shutil.copy(self.USER_CONFIG_FILEPATH,    self.root_dir)
+
+        Agent(self.root_dir).compile_index()
+
+        agent = Agent(self.root_dir)
+        agent.get_actions_inputs_from_command(self.LOGAN_TEST_COMMAND)
+
+        action = agent.find_action_by_key(self.LOGAN_TEST_ACTION)
+
+        self.assertEqual(action.get("path"), "ls", "Action not found in the index")
+        self.assertIsNone(agent.config, "The config must not be loaded")
+
+    # ------------------------------------------------------------------------------
+
+    def test_agent_ignores_an_outdated_index(self):
+        """ The index is not used anymore once a config file has changed """
+
+        shutil.copy(self.DEFAULT_CONFIG_FILEPATH, self.root_dir)
+        shutil.copy(self.USER_CONFIG_FILEPATH,    self.root_dir)
+
+        agent = Agent(self.root_dir)
+        agent.compile_index()
+
+        with open(agent.user_config_file_path, "a") as user_config:
+            user_config.write("\n")
+
+        self.assertIsNone(agent.get_action_index(), "An outdated index must not be used")
@@ -0,0 +1,251 @@
+from unittest import TestCase
+from logan import Agent
+from logan.cli import wait_job
+from logan.exceptions import LoganJobNotFoundError
+from logan.jobs import JobQueue, JobWorker, close_sockets, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_HEARTBEAT_TIMEOUT
+from helpers import build_logan_root
+from StringIO import StringIO
+import subprocess
+import socket
+import signal
+import shutil
+import time
+import sys
+import os
+
+
+class TestJobs(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1; echo bye >&2"),
+            "take:time": ("usr", "sleep", "sleep $1; echo slept $1")
+        })
+
+        self.agent = Agent(self.root_dir)
+        self.queue = self.agent.get_job_queue()
+
+        self.environment = dict(os.environ)
+        os.environ["LOGAN_ROOT"] = self.root_dir
+
+    def tearDown(self):
+
+        os.environ.clear()
+        os.environ.update(self.environment)
+
+        # Lets a background worker see its queue empty and exit
+        self.queue.close()
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def dead_pid(self):
+
+        process = subprocess.Popen(["true"])
+        process.wait()
+
+        return process.pid
+
+    # ------------------------------------------------------------------------------
+
+    def wait_until_finished(self, job_id, timeout=10):
+
+        deadline = time.time() + timeout
+
+        while self.queue.get(job_id)["state"] not in (JOB_DONE, JOB_FAILED):
+            self.assertTrue(time.time() < deadline, "The job must be run by a background worker")
+            time.sleep(0.05)
+
+        return self.queue.get(job_id)
+
+    # ------------------------------------------------------------------------------
+
+    def test_jobs_are_claimed_once(self):
+
+        first  = self.queue.enqueue("say:hello:usr one")
+        second = self.queue.enqueue("say:hello:usr two")
+
+        # Another connection, like another worker
+        other = JobQueue(self.queue.jobs_dir)
+
+        self.assertEqual(self.queue.claim(os.getpid())["id"], first)
+        self.assertEqual(other.claim(os.getpid())["id"], second)
+        self.assertIsNone(self.queue.claim(os.getpid()))
+
+        self.assertEqual(self.queue.get(first)["state"], JOB_RUNNING)
+        self.assertEqual([job["id"] for job in self.queue.list()], [second, first])
+        self.assertRaises(LoganJobNotFoundError, self.queue.get, 1000)
+
+        other.close()
+
+    # ------------------------------------------------------------------------------
+
+    def test_jobs_of_dead_workers_are_resumed_then_failed(self):
+
+        job_id = self.queue.enqueue("say:hello:usr world")
+
+        self.queue.claim(self.dead_pid())
+        self.assertEqual(self.queue.recover(), ([job_id], []))
+        self.assertEqual(self.queue.get(job_id)["state"], JOB_QUEUED)
+
+        self.queue.claim(self.dead_pid())
+        self.assertEqual(self.queue.recover(), ([], [job_id]))
+        self.assertEqual(self.queue.get(job_id)["state"], JOB_FAILED)
+
+        # Alive workers keep their jobs
+        running = self.queue.enqueue("say:hello:usr world")
+        self.queue.register(os.getpid())
+        self.queue.claim(os.getpid())
+        self.assertEqual(self.queue.recover(), ([], []))
+        self.assertEqual(self.queue.get(running)["state"], JOB_RUNNING)
+
+    # ------------------------------------------------------------------------------
+
+    def test_workers_without_heartbeat_are_dead(self):
+
+        job_id = self.queue.enqueue("say:hello:usr world")
+
+        # Its pid is alive, but belongs to another process now
+        self.queue.register(os.getpid())
+        self.queue.claim(os.getpid())
+        self.queue.connect().execute("UPDATE workers SET heartbeat = ?", (time.time() - JOB_HEARTBEAT_TIMEOUT - 1,))
+
+        self.assertEqual(self.queue.recover(), ([job_id], []))
+        self.assertEqual(self.queue.get_workers(), [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_jobs_whose_action_outlived_its_worker_are_failed(self):
+
+        job_id = self.queue.enqueue("take:time:usr 30")
+        action = subprocess.Popen(["sleep", "30"])
+
+        try:
+            self.queue.claim(self.dead_pid())
+            self.queue.set_pid(job_id, action.pid)
+
+            self.assertEqual(self.queue.recover(), ([], [job_id]))
+            self.assertIn("left running", self.queue.get(job_id)["error"])
+        finally:
+            action.kill()
+            action.wait()
+
+    # ------------------------------------------------------------------------------
+
+    def test_detached_workers_close_the_inherited_sockets(self):
+
+        sock, peer = socket.socketpair()
+        ready, closed = os.pipe()
+
+        pid = os.fork()
+
+        if not pid:
+            try:
+                close_sockets()
+                # Pipes are not sockets, they stay open
+                os.write(closed, "x")
+                time.sleep(5)
+            finally:
+                os._exit(0)
+
+        try:
+            sock.close()
+            os.read(ready, 1)
+
+            # No process has the socket open anymore
+            peer.settimeout(5)
+            self.assertEqual(peer.recv(1), "")
+        finally:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+            for fd in (ready, closed):
+                os.close(fd)
+            peer.close()
+
+    # ------------------------------------------------------------------------------
+
+    def test_worker_drains_the_queue(self):
+
+        job_ids = [self.queue.enqueue("take:time:usr 0.3") for index in range(4)]
+        wrong   = self.queue.enqueue("wrong:action:usr")
+
+        start = time.time()
+        count = JobWorker(self.agent, self.queue, concurrency=4, idle_timeout=0).run()
+
+        self.assertEqual(count, 5)
+        self.assertTrue(time.time() - start < 1.2, "Jobs must run concurrently")
+
+        for job_id in job_ids:
+            self.assertEqual(self.queue.get(job_id)["state"], JOB_DONE)
+            self.assertEqual(self.queue.read_output(job_id), ("slept 0.3\n", ""))
+
+        self.assertEqual(self.queue.get(wrong)["state"], JOB_FAILED)
+        self.assertIn("not found", self.queue.get(wrong)["error"])
+        self.assertEqual(self.queue.get_workers(), [])
+
+    # ------------------------------------------------------------------------------
+
+    def test_background_jobs_are_run_and_waited_for(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = self.agent.process_background("say:hello:usr world")
+            output      = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+
+        job_id = int(output.split()[3])
+        job    = self.wait_until_finished(job_id)
+
+        self.assertEqual((job["state"], job["code"]), (JOB_DONE, 0))
+
+        stdout, stderr, sys.stdout, sys.stderr = sys.stdout, sys.stderr, StringIO(), StringIO()
+
+        try:
+            return_code = wait_job({"<id>": str(job_id)})
+            output      = sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        self.assertEqual(return_code, 0)
+        self.assertEqual(output, ("hello world\n", "bye\n"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_output_written_right_after_the_claim_is_shown_once(self):
+
+        job_id = self.queue.enqueue("say:hello:usr world")
+        get    = JobQueue.get
+
+        def claimed_after_get(queue, job_id):
+            """ The job is seen queued, then claimed and run before its output is read
+            """
+
+            job = get(queue, job_id)
+
+            if job["state"] == JOB_QUEUED:
+                self.queue.claim(self.dead_pid())
+
+                with open(self.queue.get_output_path(job_id), "wb") as out:
+                    out.write("hello world\n")
+
+                self.queue.finish(job_id, 0)
+
+            return job
+
+        JobQueue.get = claimed_after_get
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = wait_job({"<id>": str(job_id)})
+            output      = sys.stdout.getvalue()
+        finally:
+            JobQueue.get, sys.stdout = get, stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertEqual(output, "hello world\n")
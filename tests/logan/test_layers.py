@@ -0,0 +1,85 @@
+from unittest import TestCase
+from logan.layers import LayeredConfig
+from logan.utils import dict_merge
+import cPickle
+
+
+class TestLayers(TestCase):
+
+    def setUp(self):
+
+        self.DEFAULT_CONFIG = {
+            "logan"  : {"options": None},
+            "actions": {
+                "create:file": {"scope": "create", "context": None,  "path": "create"},
+                "list:files" : {"scope": "list",   "context": "usr", "path": "ls"}
+            }
+        }
+        self.USER_CONFIG = {
+            "actions": {
+                "create:file": {"path": "touch"}
+            }
+        }
+        self.PROJECT_CONFIG = {
+            "logan"  : "disabled",
+            "actions": {
+                "goto:server": {"scope": "goto", "context": "aws", "path": "ssh"}
+            }
+        }
+
+    # ------------------------------------------------------------------------------
+
+    def test_layered_config_merges_like_dict_merge(self):
+        """ The view gives the same result as the recursive merge """
+
+        config = LayeredConfig([self.DEFAULT_CONFIG, self.USER_CONFIG, self.PROJECT_CONFIG])
+
+        merged = dict_merge(dict_merge(self.DEFAULT_CONFIG, self.USER_CONFIG), self.PROJECT_CONFIG)
+
+        self.assertEqual(config.to_dict(), merged)
+        self.assertEqual(config.get("actions").get("create:file").get("path"), "touch")
+        self.assertEqual(config.get("actions").get("create:file").get("scope"), "create")
+        self.assertEqual(config.get("logan"), "disabled")
+
+    # ------------------------------------------------------------------------------
+
+    def test_layered_config_shares_nodes_that_are_not_overridden(self):
+        """ A node defined by a single layer is not copied """
+
+        config = LayeredConfig([self.DEFAULT_CONFIG, self.USER_CONFIG])
+
+        list_files = config["actions"]["list:files"]
+
+        self.assertIs(list_files.layers[0], self.DEFAULT_CONFIG["actions"]["list:files"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_layered_config_writes_do_not_touch_the_layers(self):
+        """ Writes go to the view overlay (copy-on-write) """
+
+        config = LayeredConfig([self.DEFAULT_CONFIG, self.USER_CONFIG])
+
+        config["actions"]["list:files"]["path"] = "dir"
+        config["logan"] = None
+
+        self.assertEqual(config["actions"]["list:files"]["path"], "dir")
+        self.assertIsNone(config["logan"])
+        self.assertEqual(self.DEFAULT_CONFIG["actions"]["list:files"]["path"], "ls")
+        self.assertEqual(self.DEFAULT_CONFIG["logan"], {"options": None})
+
+    # ------------------------------------------------------------------------------
+
+    def test_layered_config_ignores_empty_layers(self):
+        """ Empty config files are loaded as None """
+
+        config = LayeredConfig([None, self.DEFAULT_CONFIG, None])
+
+        self.assertEqual(config.to_dict(), self.DEFAULT_CONFIG)
+
+    # ------------------------------------------------------------------------------
+
+    def test_layered_config_can_be_pickled(self):
+
+        config = LayeredConfig([self.DEFAULT_CONFIG, self.USER_CONFIG])
+
+        self.assertEqual(cPickle.loads(cPickle.dumps(config)), config)
@@ -0,0 +1,207 @@
+from unittest import TestCase
+from logan import Agent
+from logan.manifest import ActionManifest, action_key_from_name, manifest_fingerprint, describe
+from helpers import build_logan_root
+from StringIO import StringIO
+import shutil
+import time
+import sys
+import os
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1")
+        })
+
+        self.actions_path = os.path.join(self.root_dir, "actions")
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def write_action(self, context, name, script="true", sidecar=None, mode=0755):
+
+        dir_path = os.path.join(self.actions_path, context)
+
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+
+        file_path = os.path.join(dir_path, name)
+
+        with open(file_path, "w") as action_file:
+            action_file.write("#!/bin/sh\n{}\n".format(script))
+
+        os.chmod(file_path, mode)
+
+        if sidecar is not None:
+            with open(file_path + ".logan", "w") as sidecar_file:
+                sidecar_file.write(sidecar)
+
+    # ------------------------------------------------------------------------------
+
+    def test_action_keys_are_read_from_names(self):
+
+        self.assertEqual(action_key_from_name("list-files"), "list:files")
+        self.assertEqual(action_key_from_name("list-files.sh"), "list:files")
+        self.assertIsNone(action_key_from_name("ls"))
+        self.assertIsNone(action_key_from_name("list-all-files"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_actions_are_discovered(self):
+
+        self.write_action("usr", "list-files")
+        self.write_action("usr", "ls", sidecar="key: 'show:files'\nhelp: shows files\n")
+        self.write_action("aws", "describe", script="# --logan-describe\necho \"key: 'describe:server'\"")
+        self.write_action("", "create-folder")
+        self.write_action("usr", "remove-files", mode=0644)
+
+        manifest = ActionManifest(self.actions_path)
+        manifest.refresh()
+
+        actions = manifest.get_actions()
+
+        self.assertEqual(sorted(actions), ["create:folder", "describe:server", "list:files", "show:files"])
+
+        self.assertEqual(actions["list:files"], {"scope": "list", "context": "usr", "path": "list-files", "help": None})
+        self.assertEqual(actions["show:files"]["help"], "shows files")
+        self.assertEqual(actions["describe:server"]["context"], "aws")
+        self.assertIsNone(actions["create:folder"]["context"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_executables_describing_themselves_too_long_are_killed(self):
+
+        self.write_action("aws", "describe", script="# --logan-describe\nsleep 30\necho \"key: 'describe:server'\"")
+
+        started = time.time()
+
+        self.assertIsNone(describe(os.path.join(self.actions_path, "aws", "describe"), timeout=0.2))
+        self.assertLess(time.time() - started, 5)
+
+    # ------------------------------------------------------------------------------
+
+    def test_only_changed_directories_are_scanned_again(self):
+
+        self.write_action("aws", "deploy-server")
+
+        manifest = ActionManifest(self.actions_path)
+
+        self.assertEqual(manifest.refresh(), 3)
+        self.assertEqual(manifest.refresh(), 0)
+
+        fingerprint = manifest_fingerprint(self.actions_path)
+
+        self.write_action("usr", "list-files")
+
+        self.assertNotEqual(manifest_fingerprint(self.actions_path), fingerprint)
+        self.assertEqual(manifest.refresh(), 1)
+        self.assertIn("list:files", manifest.get_actions())
+
+        shutil.rmtree(os.path.join(self.actions_path, "aws"))
+
+        manifest.refresh()
+
+        self.assertNotIn("deploy:server", manifest.get_actions())
+        self.assertEqual(manifest.refresh(rescan=True), 2)
+
+# ------------------------------------------------------------------------------
+
+class TestAgentManifest(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello": ("usr", "hello", "echo hello $1", {"help": "says hello"})
+        })
+
+        self.actions_path = os.path.join(self.root_dir, "actions")
+
+        with open(os.path.join(self.actions_path, "usr", "say-goodbye"), "w") as action_file:
+            action_file.write("#!/bin/sh\necho goodbye $1\n")
+
+        os.chmod(os.path.join(self.actions_path, "usr", "say-goodbye"), 0755)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_discovered_actions_are_processed(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = Agent(self.root_dir).process("say:goodbye:usr world")
+            output      = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("goodbye world", output)
+
+    # ------------------------------------------------------------------------------
+
+    def test_config_files_override_discovered_actions(self):
+
+        with open(os.path.join(self.actions_path, "usr", "hello.logan"), "w") as sidecar_file:
+            sidecar_file.write("key: 'say:hello'\nhelp: discovered help\ncacheable: true\n")
+
+        action = Agent(self.root_dir).load_config()["actions"]["say:hello"]
+
+        self.assertEqual(action["help"], "says hello")
+        self.assertTrue(action["cacheable"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_manifest_is_cached_and_refreshed(self):
+
+        agent = Agent(self.root_dir)
+        agent.load_config()
+
+        self.assertTrue(agent.check_cache(Agent.LOGAN_CACHE_MANIFEST_KEY))
+
+        agent = Agent(self.root_dir)
+
+        self.assertEqual(agent.get_manifest().stats["scanned"], 0)
+
+        with open(os.path.join(self.actions_path, "usr", "say-hi"), "w") as action_file:
+            action_file.write("#!/bin/sh\necho hi $1\n")
+
+        os.chmod(os.path.join(self.actions_path, "usr", "say-hi"), 0755)
+
+        self.assertIn("say:hi", Agent(self.root_dir).load_config()["actions"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_sidecars_edited_in_place_are_seen_by_a_rescan(self):
+
+        agent = Agent(self.root_dir)
+        agent.load_config()
+
+        with open(os.path.join(self.actions_path, "usr", "say-goodbye.logan"), "w") as sidecar_file:
+            sidecar_file.write("help: says goodbye\n")
+
+        os.utime(os.path.join(self.actions_path, "usr"), (1400000000, 1400000000))
+
+        # A new sidecar changes the directory: seen without rescan
+        self.assertEqual(Agent(self.root_dir).load_config()["actions"]["say:goodbye"]["help"], "says goodbye")
+
+        with open(os.path.join(self.actions_path, "usr", "say-goodbye.logan"), "w") as sidecar_file:
+            sidecar_file.write("help: says goodbye again\n")
+
+        os.utime(os.path.join(self.actions_path, "usr"), (1400000000, 1400000000))
+
+        self.assertEqual(Agent(self.root_dir).load_config()["actions"]["say:goodbye"]["help"], "says goodbye")
+
+        agent = Agent(self.root_dir)
+        agent.rescan_actions()
+
+        self.assertEqual(agent.load_config()["actions"]["say:goodbye"]["help"], "says goodbye again")
@@ -0,0 +1,120 @@
+from unittest import TestCase
+from logan import Agent
+from logan.pipeline import Pipeline, split_pipeline, is_pipeline, stage_command
+from logan.cli import run
+from helpers import build_logan_root
+from StringIO import StringIO
+import shutil
+import sys
+import os
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello" : ("usr", "hello", "echo hello $1"),
+            "upper:case": ("usr", "upper", "tr a-z A-Z"),
+            "count:bytes": ("usr", "count", "wc -c | tr -d ' '"),
+            "big:output": ("usr", "big",   "head -c 10000000 /dev/zero"),
+            "fail:now"  : ("usr", "fail",  "cat > /dev/null; echo failed >&2; exit 2")
+        })
+
+        self.LOGAN_TEST_PIPELINE = ["say:hello:usr world", "upper:case:usr"]
+
+        self.environment = dict(os.environ)
+        os.environ["LOGAN_ROOT"] = self.root_dir
+
+    def tearDown(self):
+
+        os.environ.clear()
+        os.environ.update(self.environment)
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def run_cli(self, argv):
+
+        argv_, sys.argv = sys.argv, ["logan"] + argv
+        output = StringIO()
+
+        try:
+            run(output=output)
+        except SystemExit as e:
+            return_code = e.code
+        finally:
+            sys.argv = argv_
+
+        return return_code, output.getvalue()
+
+    # ------------------------------------------------------------------------------
+
+    def test_split_pipeline_into_stages(self):
+
+        argv = ["say:hello:usr", "world", "|", "upper:case:usr", "a  |  b"]
+
+        self.assertTrue(is_pipeline(argv))
+        self.assertFalse(is_pipeline(["say:hello:usr", "a | b"]))
+        self.assertEqual(split_pipeline(argv), [["say:hello:usr", "world"], ["upper:case:usr", "a  |  b"]])
+        self.assertEqual(stage_command(["upper:case:usr", "a  |  b"]), "upper:case:usr a  |  b")
+
+    # ------------------------------------------------------------------------------
+
+    def test_pipeline_connects_stages(self):
+
+        output = Pipeline(Agent(self.root_dir), self.LOGAN_TEST_PIPELINE).run()
+
+        self.assertEqual(output.get("out"),  "HELLO WORLD\n")
+        self.assertEqual(output.get("code"), 0)
+        self.assertEqual([stage["code"] for stage in output.get("stages")], [0, 0])
+        self.assertTrue(all(stage["duration"] >= 0 for stage in output.get("stages")))
+
+    # ------------------------------------------------------------------------------
+
+    def test_pipeline_streams_large_outputs_between_stages(self):
+
+        output = Pipeline(Agent(self.root_dir), ["big:output:usr", "count:bytes:usr"]).run()
+
+        self.assertEqual(output.get("out"), "10000000\n")
+
+    # ------------------------------------------------------------------------------
+
+    def test_pipeline_reports_every_stage_return_code(self):
+
+        output = Pipeline(Agent(self.root_dir), ["say:hello:usr x", "fail:now:usr", "upper:case:usr"]).run()
+
+        self.assertEqual([stage["code"] for stage in output.get("stages")], [0, 2, 0])
+        self.assertEqual(output.get("err"), "failed\n")
+
+    # ------------------------------------------------------------------------------
+
+    def test_agent_processes_pipelines(self):
+
+        agent = Agent(self.root_dir)
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            return_code = agent.process_pipeline(self.LOGAN_TEST_PIPELINE)
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertEqual(agent.output.get("out"), "HELLO WORLD\n")
+
+    # ------------------------------------------------------------------------------
+
+    def test_pipelines_are_split_from_the_command_line(self):
+
+        return_code, output = self.run_cli(["say:hello:usr", "world", "|", "upper:case:usr", "x"])
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("HELLO WORLD", output)
+
+        # A quoted '|' is a param: 'hello' prints its first word only
+        return_code, output = self.run_cli(["say:hello:usr", "world | upper:case:usr"])
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("hello world", output)
+        self.assertNotIn("HELLO", output)
@@ -0,0 +1,156 @@
+from unittest import TestCase
+from logan import Agent
+from logan.results import ResultCache
+from helpers import build_logan_root
+import tempfile
+import shutil
+import time
+import os
+
+
+class TestResults(TestCase):
+
+    def setUp(self):
+
+        self.data_dir = tempfile.mkdtemp()
+        self.counter  = os.path.join(self.data_dir, "counter")
+        self.depends  = os.path.join(self.data_dir, "depends")
+
+        with open(self.depends, "w") as depends:
+            depends.write("v1")
+
+        count = "echo run >> {}; wc -l < {}".format(self.counter, self.counter)
+
+        self.root_dir = build_logan_root({
+            "count:runs"   : ("usr", "count",   count, {"cacheable": True}),
+            "count:expired": ("usr", "expired", count, {"cacheable": True, "ttl": 0}),
+            "count:depends": ("usr", "depends", count, {"cacheable": True, "depends": [self.depends]}),
+            "count:always" : ("usr", "always",  count)
+        })
+
+        self.LOGAN_TEST_RESULT = {"out": "x" * 1000, "err": "", "code": 0}
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+        shutil.rmtree(self.data_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def perform(self, command, agent=None):
+
+        agent = agent or Agent(self.root_dir)
+
+        action, args = agent.resolve_command(command)
+
+        return agent.performs(action)
+
+    # ------------------------------------------------------------------------------
+
+    def test_cacheable_actions_results_are_served_from_the_cache(self):
+
+        first  = self.perform("count:runs:usr")
+        second = self.perform("count:runs:usr")
+
+        self.assertEqual(first.get("out").strip(),  "1")
+        self.assertEqual(second.get("out").strip(), "1")
+        self.assertTrue(second.get("cached"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_other_actions_and_params_are_not_served_from_the_cache(self):
+
+        self.perform("count:runs:usr a")
+        self.perform("count:always:usr")
+
+        self.assertEqual(self.perform("count:runs:usr b").get("out").strip(), "3")
+        self.assertEqual(self.perform("count:always:usr").get("out").strip(), "4")
+
+    # ------------------------------------------------------------------------------
+
+    def test_results_expire_after_their_ttl(self):
+
+        self.perform("count:expired:usr")
+        time.sleep(0.01)
+
+        self.assertEqual(self.perform("count:expired:usr").get("out").strip(), "2")
+
+    # ------------------------------------------------------------------------------
+
+    def test_results_are_invalidated_when_a_dependency_changes(self):
+
+        self.perform("count:depends:usr")
+        self.perform("count:depends:usr")
+
+        with open(self.depends, "w") as depends:
+            depends.write("version 2")
+
+        self.assertEqual(self.perform("count:depends:usr").get("out").strip(), "2")
+
+    # ------------------------------------------------------------------------------
+
+    def test_the_cache_can_be_bypassed(self):
+
+        self.perform("count:runs:usr")
+
+        agent = Agent(self.root_dir)
+        agent.use_result_cache = False
+
+        self.assertEqual(self.perform("count:runs:usr", agent).get("out").strip(), "2")
+
+    # ------------------------------------------------------------------------------
+
+    def test_least_recently_used_results_are_evicted(self):
+
+        cache = ResultCache(self.data_dir, max_size=3500)
+
+        for key in ("a", "b", "c"):
+            cache.put(key, self.LOGAN_TEST_RESULT)
+            os.utime(cache.get_entry_path(key), (time.time(), time.time() - {"a": 30, "b": 20, "c": 10}[key]))
+
+        # Uses 'a' so that 'b' becomes the least recently used one
+        self.assertIsNotNone(cache.get("a"))
+
+        cache.put("d", self.LOGAN_TEST_RESULT)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("d"))
+
+    # ------------------------------------------------------------------------------
+
+    def test_the_directory_is_listed_only_when_the_cache_is_full(self):
+
+        cache  = ResultCache(self.data_dir, max_size=3500)
+        evict  = cache.evict
+        counts = []
+
+        def counting_evict():
+            counts.append(1)
+            evict()
+
+        cache.evict = counting_evict
+
+        cache.put("a", self.LOGAN_TEST_RESULT)
+        cache.put("b", self.LOGAN_TEST_RESULT)
+        cache.put("b", self.LOGAN_TEST_RESULT)
+        cache.put("c", self.LOGAN_TEST_RESULT)
+
+        self.assertEqual(len(counts), 1, "Only the first store lists the directory")
+
+        cache.put("d", self.LOGAN_TEST_RESULT)
+
+        self.assertEqual(len(counts), 2, "Passing the limit evicts")
+        self.assertLessEqual(cache.size, cache.max_size)
+
+    # ------------------------------------------------------------------------------
+
+    def test_no_temporary_file_is_left_when_a_store_fails(self):
+
+        cache = ResultCache(self.data_dir)
+
+        # A directory can not be replaced by the entry file
+        os.mkdir(cache.get_entry_path("a"))
+
+        self.assertFalse(cache.put("a", self.LOGAN_TEST_RESULT))
+        self.assertEqual([name for name in os.listdir(self.data_dir) if name.endswith(".tmp")], [])
@@ -0,0 +1,156 @@
+from unittest import TestCase
+from logan import Agent
+from logan.cache import ConfigCache
+from logan.shards import ShardStore, parse_shard, shards_fingerprint
+from logan.exceptions import LoganLoadConfigError
+from helpers import build_logan_root
+from StringIO import StringIO
+import shutil
+import sys
+import os
+
+
+LOGAN_TEST_SHARDS = {
+    "say": """
+"say:hello":
+    context: usr
+    path: hello
+    help: |
+        NAME
+            hello - says hello
+"say:goodbye":
+    context: usr
+    path: goodbye
+"list:files":
+    context: usr
+    path: ls
+""",
+    "show": """
+"show:date":
+    context: usr
+    path: date
+    help: shows the date
+"""
+}
+
+
+class TestShards(TestCase):
+
+    def setUp(self):
+
+        self.root_dir = build_logan_root({
+            "say:hello"  : ("usr", "hello",   "echo hello $1"),
+            "say:goodbye": ("usr", "goodbye", "echo goodbye $1")
+        })
+
+        # Every action moves to the shards
+        with open(os.path.join(self.root_dir, "loganrc.default"), "w") as default_config:
+            default_config.write("logan:\n  options: null\n")
+
+        self.shards_path = os.path.join(self.root_dir, "loganrc.d")
+
+        os.makedirs(self.shards_path)
+
+        for name, content in LOGAN_TEST_SHARDS.iteritems():
+            with open(os.path.join(self.shards_path, name + ".yml"), "w") as shard_file:
+                shard_file.write(content)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def test_help_is_read_apart_from_the_actions(self):
+
+        actions, helps = parse_shard("say", os.path.join(self.shards_path, "say.yml"))
+
+        self.assertEqual(sorted(actions), ["say:goodbye", "say:hello"])
+        self.assertNotIn("help", actions["say:hello"])
+        self.assertEqual(helps, {"say:hello": "NAME\n    hello - says hello\n"})
+
+    # ------------------------------------------------------------------------------
+
+    def test_shards_must_be_mappings_of_actions(self):
+
+        shard_path = os.path.join(self.shards_path, "list.yml")
+
+        with open(shard_path, "w") as shard_file:
+            shard_file.write("- list:files\n- list:dirs\n")
+
+        with self.assertRaisesRegexp(LoganLoadConfigError, shard_path):
+            parse_shard("list", shard_path)
+
+    # ------------------------------------------------------------------------------
+
+    def test_only_the_shard_of_the_action_is_read(self):
+
+        store = ShardStore(self.shards_path, ConfigCache(self.root_dir))
+
+        self.assertEqual(store.get_action("show:date"), {"context": "usr", "path": "date"})
+        self.assertEqual(store.get_action("show:date", shards_fingerprint(self.shards_path))["path"], "date")
+        self.assertIsNone(store.get_action("list:files", shards_fingerprint(self.shards_path)))
+
+        self.assertEqual(store.shards.keys(), ["show"])
+        self.assertEqual(store.stats, {"hits": 1, "parsed": 1})
+
+        # Another process unpickles the cached shard
+        store = ShardStore(self.shards_path, ConfigCache(self.root_dir))
+
+        self.assertEqual(store.get_help("show:date"), "shows the date")
+        self.assertEqual(store.get_action("show:date")["path"], "date")
+        self.assertEqual(store.stats, {"hits": 1, "parsed": 0})
+
+    # ------------------------------------------------------------------------------
+
+    def test_edited_shards_are_read_again(self):
+
+        store = ShardStore(self.shards_path, ConfigCache(self.root_dir))
+        store.get_action("show:date")
+
+        with open(os.path.join(self.shards_path, "show.yml"), "w") as shard_file:
+            shard_file.write("\"show:date\":\n    context: usr\n    path: clock\n    help: shows the time\n")
+
+        store = ShardStore(self.shards_path, ConfigCache(self.root_dir))
+
+        self.assertEqual(store.get_help("show:date"), "shows the time")
+        self.assertEqual(store.get_action("show:date")["path"], "clock")
+
+    # ------------------------------------------------------------------------------
+
+    def test_sharded_actions_are_processed(self):
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+
+        try:
+            return_code = Agent(self.root_dir).process("s:hel:usr world")
+            output      = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(return_code, 0)
+        self.assertIn("hello world", output)
+
+        agent  = Agent(self.root_dir)
+        action = agent.dispatch_command("say:goodbye:usr world")
+
+        self.assertEqual(action.get("path"), "goodbye")
+        self.assertEqual(agent.get_shards().shards.keys(), ["say"])
+        self.assertEqual(agent.get_shards().stats["parsed"], 0)
+
+    # ------------------------------------------------------------------------------
+
+    def test_config_files_override_the_shards(self):
+
+        with open(os.path.join(self.root_dir, "loganrc"), "a") as user_config:
+            user_config.write("actions:\n  say:hello:\n    cacheable: true\n    help: overridden help\n")
+
+        agent  = Agent(self.root_dir)
+        action = agent.dispatch_command("say:hello:usr world")
+
+        self.assertEqual(action.get("path"), "hello")
+        self.assertTrue(action.get("cacheable"))
+
+        self.assertEqual(agent.get_action_help("say:hello:usr"), ("say:hello", "overridden help"))
+        self.assertEqual(agent.get_action_help("sh:d:u"), ("show:date", "shows the date"))
+        self.assertEqual(agent.get_action_help("say:goodbye:usr"), ("say:goodbye", None))
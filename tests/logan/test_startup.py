@@ -0,0 +1,73 @@
+from unittest import TestCase
+import subprocess
+import sys
+import os
+
+
+class TestStartup(TestCase):
+
+    def setUp(self):
+
+        self.LOGAN_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.LOGAN_BIN         = os.path.join(self.LOGAN_PACKAGE_DIR, "bin", "logan")
+
+        # Modules only some commands need
+        self.LOGAN_LAZY_MODULES = ["logan.cache", "subprocess", "yaml", "json", "tempfile", "threading",
+                                   "logan.pipeline", "logan.results", "logan.index", "logan.streams"]
+
+        # No daemon must answer
+        self.environment = dict(os.environ, LOGAN_SOCKET=os.path.join(self.LOGAN_PACKAGE_DIR, "no-daemon.sock"))
+
+    # ------------------------------------------------------------------------------
+
+    def run_python(self, *args):
+
+        process = subprocess.Popen([sys.executable] + list(args), cwd=self.LOGAN_PACKAGE_DIR, env=self.environment,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate()
+
+        return process.returncode, out, err
+
+    # ------------------------------------------------------------------------------
+
+    def test_importing_logan_does_not_import_heavy_modules(self):
+
+        code, out, err = self.run_python("-c", "import logan, sys; print ' '.join(m for m in {!r} if sys.modules.get(m))"
+                                               .format(self.LOGAN_LAZY_MODULES))
+
+        self.assertEqual(code, 0, err)
+        self.assertEqual(out.strip(), "")
+
+    # ------------------------------------------------------------------------------
+
+    def test_version_is_shown(self):
+
+        code, out, err = self.run_python(self.LOGAN_BIN, "-v")
+
+        self.assertEqual(out.strip(), "0.1.0")
+
+    # ------------------------------------------------------------------------------
+
+    def test_streaming_commands_are_never_forwarded(self):
+
+        import imp
+
+        client = imp.load_source("logan_client", self.LOGAN_BIN)
+
+        for argv in (["wait", "12"], ["worker", "host:4000"], ["drain"], ["batch", "-"],
+                     ["batch", "commands.txt", "--listen=:4000"]):
+            self.assertTrue(client.runs_locally(argv), argv)
+
+        for argv in ([], ["jobs"], ["batch", "commands.txt"], ["say:hello", "world"]):
+            self.assertFalse(client.runs_locally(argv), argv)
+
+    # ------------------------------------------------------------------------------
+
+    def test_import_times_are_reported(self):
+
+        code, out, err = self.run_python(self.LOGAN_BIN, "--profile-imports", "--version")
+
+        self.assertEqual(out.strip(), "0.1.0")
+        self.assertIn("logan.agent", err)
+        self.assertIn("logan.grammar", err)
+        self.assertRegexpMatches(err.splitlines()[-1], r"import time: +[\d.]+ \| total of \d+ modules")
@@ -0,0 +1,56 @@
+from unittest import TestCase
+from logan.streams import stream_process, StreamTail
+from StringIO import StringIO
+import subprocess
+
+
+class TestStreams(TestCase):
+
+    def setUp(self):
+
+        # Writes 1 MB on stdout and a short message on stderr
+        self.LOGAN_TEST_SCRIPT = "head -c 1048576 /dev/zero | tr '\\0' x; echo oops >&2; exit 3"
+        self.LOGAN_TEST_SIZE   = 1048576
+
+    # ------------------------------------------------------------------------------
+
+    def start(self):
+
+        return subprocess.Popen(["/bin/sh", "-c", self.LOGAN_TEST_SCRIPT],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # ------------------------------------------------------------------------------
+
+    def test_stream_process_forwards_both_streams(self):
+
+        out, err = StringIO(), StringIO()
+
+        output = stream_process(self.start(), out, err)
+
+        self.assertEqual(len(out.getvalue()), self.LOGAN_TEST_SIZE)
+        self.assertEqual(err.getvalue(), "oops\n")
+        self.assertEqual(output.get("code"), 3)
+
+    # ------------------------------------------------------------------------------
+
+    def test_stream_process_counts_bytes_and_keeps_a_bounded_tail(self):
+
+        output = stream_process(self.start(), tail_size=100)
+
+        self.assertEqual(output.get("out_bytes"), self.LOGAN_TEST_SIZE)
+        self.assertEqual(output.get("err_bytes"), 5)
+        self.assertEqual(output.get("out"), "x" * 100)
+        self.assertEqual(output.get("err"), "oops\n")
+
+    # ------------------------------------------------------------------------------
+
+    def test_stream_tail_keeps_the_last_bytes(self):
+
+        tail = StreamTail(4)
+
+        for chunk in ("abc", "def", "gh"):
+            tail.write(chunk)
+
+        self.assertEqual(tail.getvalue(), "efgh")
+        self.assertEqual(tail.total, 8)
+        self.assertTrue(tail.length < 4 + 3, "The tail must stay bounded")
@@ -0,0 +1,113 @@
+from unittest import TestCase
+from logan import tracing
+from helpers import build_logan_root
+import subprocess
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+
+        self.root_dir  = build_logan_root({"say:hello": ("usr", "hello", "echo hello $1")})
+        self.trace_dir = tempfile.mkdtemp()
+
+        self.LOGAN_TEST_SCRIPT = "from logan import Agent; import sys; sys.exit(Agent({!r}).process('say:hello:usr world'))"
+        self.LOGAN_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root_dir)
+        shutil.rmtree(self.trace_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def run_traced(self, trace_path):
+
+        environment = dict(os.environ, LOGAN_TRACE=trace_path)
+        environment["PYTHONPATH"] = os.pathsep.join([self.LOGAN_PACKAGE_DIR, environment.get("PYTHONPATH", "")])
+
+        with open(os.devnull, "w") as devnull:
+            return subprocess.call([sys.executable, "-c", self.LOGAN_TEST_SCRIPT.format(self.root_dir)],
+                                   env=environment, stdout=devnull)
+
+    # ------------------------------------------------------------------------------
+
+    def test_spans_of_a_command_are_written_as_chrome_trace_events(self):
+
+        trace_path = os.path.join(self.trace_dir, "trace.json")
+
+        self.assertEqual(self.run_traced(trace_path), 0)
+
+        with open(trace_path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+
+        spans = [event for event in events if event["ph"] == "X"]
+        names = set(event["name"] for event in spans)
+
+        for name in ("Agent.process", "Agent.load_config", "Agent.get_config_from_filepath", "Agent.add_layers_to_cache",
+                     "Agent.performs", "utils.load_file", "utils.file_fingerprint", "child wait"):
+            self.assertIn(name, names)
+
+        for event in spans:
+            self.assertGreaterEqual(event["dur"], 0)
+
+        # Spans are nested in time
+        process = [event for event in spans if event["name"] == "Agent.process"][0]
+        wait    = [event for event in spans if event["name"] == "child wait"][0]
+
+        self.assertLessEqual(process["ts"], wait["ts"])
+        self.assertGreaterEqual(process["ts"] + process["dur"], wait["ts"] + wait["dur"])
+
+    # ------------------------------------------------------------------------------
+
+    def test_pid_placeholder_is_replaced_in_the_trace_path(self):
+
+        self.run_traced(os.path.join(self.trace_dir, "trace.{pid}.json"))
+
+        traces = os.listdir(self.trace_dir)
+
+        self.assertEqual(len(traces), 1)
+        self.assertRegexpMatches(traces[0], r"^trace\.\d+\.json$")
+
+    # ------------------------------------------------------------------------------
+
+    def test_functions_are_left_undecorated_when_tracing_is_disabled(self):
+
+        def function():
+            pass
+
+        self.assertIsNone(tracing.tracer)
+        self.assertIs(tracing.traced("function")(function), function)
+        self.assertIs(tracing.span("nothing"), tracing.NULL_SPAN)
+
+    # ------------------------------------------------------------------------------
+
+    def test_tracing_can_start_after_the_import_and_before_os_exit(self):
+
+        trace_path = os.path.join(self.trace_dir, "trace.json")
+        script     = "; ".join([
+            "import os",
+            "from logan import Agent, tracing",
+            "tracing.start_tracing({!r})".format(trace_path),
+            "Agent({!r}).process('say:hello:usr world')".format(self.root_dir),
+            "tracing.write_trace()",
+            "os._exit(0)"
+        ])
+
+        environment = dict(os.environ, LOGAN_TRACE_HOOKS="1")
+        environment.pop("LOGAN_TRACE", None)
+        environment["PYTHONPATH"] = os.pathsep.join([self.LOGAN_PACKAGE_DIR, environment.get("PYTHONPATH", "")])
+
+        with open(os.devnull, "w") as devnull:
+            self.assertEqual(subprocess.call([sys.executable, "-c", script], env=environment, stdout=devnull), 0)
+
+        with open(trace_path) as trace_file:
+            names = set(event["name"] for event in json.load(trace_file)["traceEvents"])
+
+        self.assertIn("Agent.process", names)
+        self.assertIn("child wait", names)
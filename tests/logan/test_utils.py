@@ -0,0 +1,88 @@
+from unittest import TestCase
+from logan.utils import load_file, register_file_loader, get_yaml_backend,\
+                        FileTypes, YamlBackends, FILE_LOADERS
+from logan import LoganFileNotExistsError,\
+                  LoganLoadFileError
+import tempfile
+import cPickle
+import marshal
+import shutil
+import json
+import os
+
+
+class TestUtils(TestCase):
+
+    def setUp(self):
+
+        self.LOGAN_ROOT              = os.path.join("..", "fixtures")
+        self.DEFAULT_CONFIG_FILEPATH = os.path.join(self.LOGAN_ROOT, "loganrc.default")
+        self.MISSING_FILEPATH        = os.path.join(self.LOGAN_ROOT, "missing.yaml")
+
+        self.LOGAN_TEST_DATA = {"actions": {"list:files": {"context": "usr", "path": "ls"}}}
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    # ------------------------------------------------------------------------------
+
+    def write_snapshot(self, name, dump, mode="wb"):
+        """ Writes the test data in a temporary file with the given 'dump' function
+        """
+
+        file_path = os.path.join(self.tmp_dir, name)
+
+        with open(file_path, mode) as snapshot:
+            dump(self.LOGAN_TEST_DATA, snapshot)
+
+        return file_path
+
+    # ------------------------------------------------------------------------------
+
+    def test_load_file_only_calls_the_loader_of_the_given_type(self):
+        """ Loading a YAML file doesn't read it as plain text too """
+
+        calls = []
+
+        text_loader = FILE_LOADERS[FileTypes.PLAIN_TEXT]
+        self.addCleanup(register_file_loader, FileTypes.PLAIN_TEXT, text_loader)
+
+        register_file_loader(FileTypes.PLAIN_TEXT, calls.append)
+
+        load_file(self.DEFAULT_CONFIG_FILEPATH, type=FileTypes.YAML)
+
+        self.assertEqual(calls, [], "The plain text loader must not be called")
+
+    # ------------------------------------------------------------------------------
+
+    def test_load_file_raises_for_unknown_types(self):
+
+        self.failUnlessRaises(LoganLoadFileError, load_file, self.DEFAULT_CONFIG_FILEPATH, "xml")
+
+    # ------------------------------------------------------------------------------
+
+    def test_load_file_raises_when_the_file_doesnt_exist(self):
+
+        for type in (FileTypes.YAML, FileTypes.JSON, FileTypes.MARSHAL, FileTypes.PICKLE, FileTypes.PLAIN_TEXT):
+            self.failUnlessRaises(LoganFileNotExistsError, load_file, self.MISSING_FILEPATH, type)
+
+    # ------------------------------------------------------------------------------
+
+    def test_load_json_and_snapshot_files(self):
+
+        json_path    = self.write_snapshot("loganrc.json",    json.dump, "w")
+        marshal_path = self.write_snapshot("loganrc.marshal", marshal.dump)
+        pickle_path  = self.write_snapshot("loganrc.pickle",  cPickle.dump)
+
+        self.assertEqual(load_file(json_path,    FileTypes.JSON),    self.LOGAN_TEST_DATA)
+        self.assertEqual(load_file(marshal_path, FileTypes.MARSHAL), self.LOGAN_TEST_DATA)
+        self.assertEqual(load_file(pickle_path,  FileTypes.PICKLE),  self.LOGAN_TEST_DATA)
+
+    # ------------------------------------------------------------------------------
+
+    def test_yaml_backend_is_reported(self):
+
+        self.assertIn(get_yaml_backend(), (YamlBackends.LIBYAML, YamlBackends.PYTHON))